@@ -24,44 +24,71 @@
 '''
 # python3 style print function
 from __future__ import print_function
+import os     # for path.isfile
 import sys    # for argv
-import gtk    # user interface main() loop
 
+# Startup profiler, started before anything else is imported so the
+# imports are timed. It is a no-op unless --profile-startup is used.
+import aliasmgr_profile
+profiler = aliasmgr_profile.from_args(sys.argv)
 
-# local utilities
-import aliasmgr_integrator
-integrator = aliasmgr_integrator.am_integrator()
+with profiler.phase('imports'):
+    # local utilities (gtk is only imported when needed, see: load_gui())
+    import aliasmgr_integrator
+    import aliasmgr_core as amcore
+    # Settings/integrator are shared by all modules, config is read once.
+    settings = amcore.settings
 
-import aliasmgr_util as amutil
-settings = amutil.settings
+    from aliasmgr_cmdline import CmdLine
 
-from aliasmgr_gui import winMain
-from aliasmgr_cmdline import CmdLine
+
+def load_gui():
+    """ Import the gtk utilities, the command line doesn't need them
+        unless a dialog has to be shown.
+        Returns the aliasmgr_util module.
+    """
+    import aliasmgr_util
+    return aliasmgr_util
 
 
 def main():
     """ Main entry point for Alias Manager """
-    # get user info
-    integrator.get_userinfo()
+    with profiler.phase('user info'):
+        # user info is loaded when the shared integrator is created.
+        integrator = aliasmgr_integrator.get_integrator()
     # get bash file
     aliasfile = settings.get("aliasfile")
     # force file picker if setting does not exist or bad file
-    amutil.pick_aliasfile(aliasfile)
+    if not os.path.isfile(aliasfile):
+        with profiler.phase('pick aliasfile'):
+            load_gui().pick_aliasfile(aliasfile)
     # self integration
-    if (not integrator.is_integrated() and
-            settings.get("integration") != "false"):
-        amutil.integration_choice()
+    with profiler.phase('is integrated'):
+        integrated = integrator.is_integrated()
+    if (not integrated) and (settings.get("integration") != "false"):
+        with profiler.phase('integration choice'):
+            load_gui().integration_choice()
 
     largs = sys.argv[1:]
     try:
         if len(largs) == 0:
             # No Args, Load GUI
-            appMain = winMain()  # noqa
+            with profiler.phase('gui'):
+                import gtk
+                from aliasmgr_gui import winMain
+                dlg = load_gui().Dialogs()
+                if settings.get("dlglastpath") != "":
+                    dlg.lastpath = settings.get("dlglastpath")
+                appMain = winMain()  # noqa
+            # Startup is done once the main window is built.
+            profiler.finish()
             gtk.main()
         else:
             # Args, send to command line
-            appcmdline = CmdLine()
-            ret = appcmdline.main(largs)
+            with profiler.phase('cmdline'):
+                appcmdline = CmdLine()
+                ret = appcmdline.main(largs)
+            profiler.finish()
             sys.exit(ret)
     except KeyboardInterrupt:
         print('\nUser Cancelled, goodbye.\n')
@@ -70,7 +97,4 @@ def main():
 
 # Start.of.script -------------------------------------------------------------
 if __name__ == '__main__':
-    dlg = amutil.Dialogs()
-    if settings.get("dlglastpath") != "":
-        dlg.lastpath = settings.get("dlglastpath")
     main()
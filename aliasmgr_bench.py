@@ -0,0 +1,824 @@
+#!/usr/bin/env python
+'''
+    aliasmgr_bench.py
+    Benchmarks for Alias Manager internals.
+    Run it directly, like: ./aliasmgr_bench.py parse [file] [-n 20000]
+                           ./aliasmgr_bench.py rss [file] [-n 20000]
+                           ./aliasmgr_bench.py startup [-r 5]
+                           ./aliasmgr_bench.py shell [files...] [-r 30]
+                           ./aliasmgr_bench.py save [-n 2000] [-r 20]
+                           ./aliasmgr_bench.py serialize [-n 100000] [-r 5]
+                           ./aliasmgr_bench.py splice [-n 100000] [-r 5]
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import aliasmgr_core as amcore
+import aliasmgr_fileops
+import aliasmgr_integrator
+import aliasmgr_settings
+from aliasmgr_trace import percentile
+
+# Default number of definitions for generated alias files.
+DEFAULT_COUNT = 20000
+# Default number of runs for each benchmark.
+DEFAULT_RUNS = 5
+# Default number of runs for each shell startup benchmark.
+DEFAULT_SHELL_RUNS = 30
+# Default number of definitions/runs for the save benchmark.
+DEFAULT_SAVE_COUNT = 2000
+DEFAULT_SAVE_RUNS = 20
+# Default number of definitions for the serialize benchmark.
+DEFAULT_SERIALIZE_COUNT = 100000
+# Integration script modes for the shell benchmark: (name, settings).
+SHELL_MODES = (
+    ('plain', {'bundle': 'false', 'autoload': 'false'}),
+    ('bundle', {'bundle': 'true', 'autoload': 'false'}),
+    ('autoload', {'bundle': 'false', 'autoload': 'true'}),
+    ('autoload+bundle', {'bundle': 'true', 'autoload': 'true'}),
+)
+# Modules timed by the startup benchmark, in a fresh interpreter each.
+STARTUP_MODULES = ('aliasmgr_core', 'aliasmgr_cmdline', 'aliasmgr_util')
+# Code run in the child interpreter, prints the import time and gtk usage.
+STARTUP_CODE = '''
+import sys, time
+start = time.time()
+import {module}
+print('{{}} {{}}'.format(time.time() - start, int('gtk' in sys.modules)))
+'''
+
+
+def generate_contents(count=DEFAULT_COUNT):
+    """ Generate alias file contents with 'count' definitions,
+        half aliases and half functions (every other function exported).
+    """
+    lines = ['#!/bin/bash', '# Generated for benchmarking.', '', '# Aliases:']
+    aliascount = count // 2
+    for i in range(aliascount):
+        lines.append(
+            'alias bench{0}="ls -a --color {0}" # alias {0}'.format(i))
+    lines.extend(('', '# Functions:'))
+    functionnames = []
+    for i in range(count - aliascount):
+        name = 'benchfunc{}'.format(i)
+        functionnames.append(name)
+        lines.extend((
+            'function {}()'.format(name),
+            '{',
+            '\t# function {}'.format(i),
+            '\tif [ "${1}" == "" ] ; then',
+            '\t\techo "Usage: {} arg"'.format(name),
+            '\telse',
+            '\t\techo "${1}" | grep -c "' + str(i) + '"',
+            '\tfi',
+            '}',
+            ''))
+    lines.append('# Exports:')
+    lines.extend('export {}'.format(n) for n in functionnames[::2])
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def parse_old(filecontents):
+    """ Parse contents the way readfile() used to (multiple passes). """
+    aliascount = amcore.get_def_count(filecontents, 'alias')
+    functioncount = amcore.get_def_count(filecontents, 'function')
+    aliases = amcore.parse_aliases(filecontents)
+    functions = amcore.parse_functions(filecontents)
+    return aliases + functions, aliascount, functioncount
+
+
+def parse_new(filecontents):
+    """ Parse contents the way readfile() does now (single pass). """
+    parsed = amcore.parse_contents(filecontents)
+    return parsed.commands(), parsed.aliascount, parsed.functioncount
+
+
+def command_info(commands):
+    """ Return comparable info for a list of Command() objects. """
+    return [(c.name, list(c.cmd), c.comment, c.exported) for c in commands]
+
+
+def timeit(func, args, runs=DEFAULT_RUNS):
+    """ Run func(*args) 'runs' times, return (best time, last result). """
+    best = None
+    result = None
+    for _ in range(runs):
+        start = time.time()
+        result = func(*args)
+        duration = time.time() - start
+        if (best is None) or (duration < best):
+            best = duration
+    return best, result
+
+
+def bench_parse(filename=None, count=DEFAULT_COUNT, runs=DEFAULT_RUNS):
+    """ Compare parsing throughput for the old and new readfile() parsers.
+        Returns 0 if both produced the same results, otherwise 1.
+    """
+    if filename:
+        with open(filename, 'r') as f:
+            contents = f.read()
+        desc = filename
+    else:
+        contents = generate_contents(count)
+        desc = 'generated ({} definitions)'.format(count)
+
+    linecount = contents.count('\n') + 1
+    megabytes = len(contents) / (1024.0 * 1024.0)
+    print('Parsing: {}'.format(desc))
+    print('  {} lines, {:0.2f} MB, best of {} runs\n'.format(
+        linecount, megabytes, runs))
+
+    results = []
+    for name, func in (('multi-pass', parse_old), ('single-pass', parse_new)):
+        duration, result = timeit(func, (contents,), runs=runs)
+        results.append((duration, result))
+        print('{:>12}: {:0.4f}s, {:>10.0f} lines/s, {:0.2f} MB/s'.format(
+            name,
+            duration,
+            linecount / duration,
+            megabytes / duration))
+
+    (oldtime, oldresult), (newtime, newresult) = results
+    print('\n     speedup: {:0.2f}x'.format(oldtime / newtime))
+    same = (
+        (command_info(oldresult[0]) == command_info(newresult[0])) and
+        (oldresult[1:] == newresult[1:]))
+    print('     results: {}'.format('identical' if same else 'DIFFERENT!'))
+    return 0 if same else 1
+
+
+def measure_rss(func, args):
+    """ Run func(*args) in a child process, and return the child's peak
+        resident set size in kilobytes, or None if it failed.
+    """
+    pid = os.fork()
+    if pid == 0:
+        # Child process, never returns.
+        exitcode = 0
+        try:
+            func(*args)
+        except Exception as ex:
+            print('Child failed: {}'.format(ex))
+            exitcode = 1
+        os._exit(exitcode)
+    _, status, rusage = os.wait4(pid, 0)
+    if status != 0:
+        return None
+    return rusage.ru_maxrss
+
+
+def rss_baseline(filename):
+    """ Nothing is parsed, to measure the interpreter itself. """
+    return None
+
+
+def rss_string_old(filename):
+    """ Multi-pass parsers, reading the file into a string. """
+    with open(filename, 'r') as f:
+        return parse_old(f.read())
+
+
+def rss_mapped_old(filename):
+    """ Multi-pass parsers, reading lines from a memory map. """
+    with amcore.MappedFile(filename) as mapped:
+        return parse_old(mapped)
+
+
+def rss_string_new(filename):
+    """ Single-pass parser, reading the file into a string. """
+    with open(filename, 'r') as f:
+        return amcore.AliasParser().parse(f.read().split('\n'))
+
+
+def rss_mapped_new(filename):
+    """ Single-pass parser, reading lines from a memory map. """
+    with amcore.MappedFile(filename) as mapped:
+        return amcore.AliasParser().parse(mapped)
+
+
+def rss_stream(filename):
+    """ Streaming parser, commands are not kept. """
+    for cmd in amcore.iter_commands(aliasfile=filename, usecache=False):
+        pass
+
+
+def bench_rss(filename=None, count=DEFAULT_COUNT):
+    """ Report peak memory use while parsing, for string and memory-mapped
+        reading. Each parse runs in a fresh child process.
+        Returns 0 if both reading methods produced the same results,
+        otherwise 1.
+    """
+    tmpname = None
+    if filename:
+        desc = filename
+    else:
+        fd, tmpname = tempfile.mkstemp(prefix='aliasmgr_bench.', suffix='.sh')
+        with os.fdopen(fd, 'w') as f:
+            f.write(generate_contents(count))
+        filename = tmpname
+        desc = 'generated ({} definitions)'.format(count)
+
+    try:
+        size = os.path.getsize(filename)
+        print('Parsing: {}'.format(desc))
+        print('  {:0.2f} MB, peak RSS of a child process for each\n'.format(
+            size / (1024.0 * 1024.0)))
+        baseline = measure_rss(rss_baseline, (filename,))
+        print('{:>20}: {:>8.1f} MB'.format('baseline', baseline / 1024.0))
+        for name, func in (
+                ('multi-pass string', rss_string_old),
+                ('multi-pass mapped', rss_mapped_old),
+                ('single-pass string', rss_string_new),
+                ('single-pass mapped', rss_mapped_new),
+                ('streaming', rss_stream)):
+            peak = measure_rss(func, (filename,))
+            if peak is None:
+                print('{:>20}: failed'.format(name))
+                continue
+            print('{:>20}: {:>8.1f} MB, {:>8.1f} MB over baseline'.format(
+                name,
+                peak / 1024.0,
+                (peak - baseline) / 1024.0))
+
+        # Both reading methods must give the same results.
+        stringresult = rss_string_old(filename)
+        mappedresult = rss_mapped_old(filename)
+        same = (
+            (command_info(stringresult[0]) ==
+             command_info(mappedresult[0])) and
+            (stringresult[1:] == mappedresult[1:]))
+        newsame = (
+            command_info(rss_string_new(filename).commands()) ==
+            command_info(rss_mapped_new(filename).commands()))
+        same = same and newsame
+        print('\n             results: {}'.format(
+            'identical' if same else 'DIFFERENT!'))
+    finally:
+        if tmpname:
+            os.remove(tmpname)
+    return 0 if same else 1
+
+
+def measure_import(module):
+    """ Import a module in a fresh interpreter.
+        Returns (import time, whether gtk was imported), or None if the
+        import failed.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-c', STARTUP_CODE.format(module=module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+    stdout, _ = proc.communicate()
+    if proc.returncode != 0:
+        return None
+    duration, usesgtk = stdout.split()
+    return float(duration), usesgtk == b'1'
+
+
+def bench_startup(runs=DEFAULT_RUNS):
+    """ Report cold import times for the command line and GUI modules,
+        and whether each one pulls in gtk. Returns 0 if the command line
+        modules don't need gtk, otherwise 1.
+    """
+    print('Cold import time, best of {} runs\n'.format(runs))
+    exitcode = 0
+    for module in STARTUP_MODULES:
+        best = None
+        usesgtk = False
+        for _ in range(runs):
+            result = measure_import(module)
+            if result is None:
+                break
+            duration, usesgtk = result
+            if (best is None) or (duration < best):
+                best = duration
+        if best is None:
+            print('{:>20}: failed'.format(module))
+            continue
+        print('{:>20}: {:0.4f}s, gtk: {}'.format(
+            module,
+            best,
+            'yes' if usesgtk else 'no'))
+        if usesgtk and (module != 'aliasmgr_util'):
+            exitcode = 1
+    return exitcode
+
+
+def time_shell(script, interactive=False, runs=DEFAULT_SHELL_RUNS):
+    """ Time a fresh bash sourcing a script (without any rc files).
+        Returns a list of durations in seconds, one for each run.
+    """
+    cmd = ['bash', '--norc', '--noprofile']
+    if interactive:
+        cmd.append('-i')
+    cmd.extend(('-c', 'source "$1"', 'bash', script))
+    durations = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            subprocess.call(cmd, stdout=devnull, stderr=devnull)
+            durations.append(time.time() - start)
+    return durations
+
+
+def bench_integrator(tmpdir, filenames):
+    """ Return an integrator that generates everything in tmpdir, with
+        its own (unsaved) settings, for integrating filenames.
+        The user's real integration files are never touched.
+        Tracing is off and output is quiet whatever the user's settings
+        are, so every mode times the same work (and no benchmark runs
+        end up in the user's traces).
+    """
+    if not os.path.isdir(tmpdir):
+        os.makedirs(tmpdir)
+    integrator = aliasmgr_integrator.am_integrator()
+    integrator.settings = aliasmgr_settings.am_settings()
+    integrator.settings.set('trace', 'false')
+    integrator.settings.set('quiet', 'true')
+    integrator.helperfiles = os.path.join(tmpdir, 'integrated.lst')
+    integrator.helperscript = os.path.join(tmpdir, 'aliasmgr_scripts.sh')
+    integrator.helperbundle = os.path.join(tmpdir, 'aliasmgr_bundle.sh')
+    integrator.helperautoload = os.path.join(tmpdir, 'autoload')
+    integrator.helpernoninteractive = os.path.join(
+        tmpdir,
+        'aliasmgr_noninteractive.sh')
+    with open(integrator.helperfiles, 'w') as f:
+        f.write(integrator.headerlist)
+        f.writelines('{}\n'.format(os.path.abspath(n)) for n in filenames)
+    return integrator
+
+
+def bench_shell(filenames=None, runs=DEFAULT_SHELL_RUNS):
+    """ Report shell startup times (median/p95) for the integration
+        script in each mode, and for each integrated file on its own.
+        Files in integrated.lst are used if none are given.
+        Returns 0 on success, 1 if bash can't be run.
+    """
+    if not filenames:
+        filenames = aliasmgr_integrator.get_integrator().helper_getfiles()
+        filenames = [n for n in filenames if os.path.isfile(n)]
+    if not filenames:
+        print('No integrated files to benchmark.')
+        return 1
+
+    tmpdir = tempfile.mkdtemp(prefix='aliasmgr_bench.')
+    try:
+        emptyscript = os.path.join(tmpdir, 'empty.sh')
+        open(emptyscript, 'w').close()
+        targets = [('baseline (empty)', emptyscript)]
+        for modename, modesettings in SHELL_MODES:
+            integrator = bench_integrator(
+                os.path.join(tmpdir, modename.replace('+', '_')),
+                filenames)
+            for key, val in modesettings.items():
+                integrator.settings.set(key, val)
+            if not integrator.helper_generate_script():
+                print('Unable to generate the {} script.'.format(modename))
+                return 1
+            targets.append((modename, integrator.helperscript))
+        targets.extend(
+            (os.path.basename(n), os.path.abspath(n)) for n in filenames)
+
+        print('\nShell startup: {} {}, {} runs each, times in ms'.format(
+            len(filenames),
+            'file' if len(filenames) == 1 else 'files',
+            runs))
+        print('{:>24}  {:>23}  {:>23}'.format(
+            '', 'non-interactive', 'interactive'))
+        print('{:>24}  {:>7} {:>7} {:>7}  {:>7} {:>7} {:>7}'.format(
+            '', 'median', 'p95', '+base', 'median', 'p95', '+base'))
+        baselines = {}
+        for name, script in targets:
+            columns = []
+            for interactive in (False, True):
+                try:
+                    durations = time_shell(
+                        script,
+                        interactive=interactive,
+                        runs=runs)
+                except OSError as ex:
+                    print('\nUnable to run bash: {}'.format(ex))
+                    return 1
+                median = percentile(durations, 50) * 1000
+                baselines.setdefault(interactive, median)
+                columns.extend((
+                    median,
+                    percentile(durations, 95) * 1000,
+                    median - baselines[interactive]))
+            if name == os.path.basename(filenames[0]):
+                print('\n{:>24}'.format('Each file on its own:'))
+            print('{:>24}  {:>7.2f} {:>7.2f} {:>7.2f}  '
+                  '{:>7.2f} {:>7.2f} {:>7.2f}'.format(name[-24:], *columns))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return 0
+
+
+def save_forked(contents, tmpfile, filename):
+    """ Save contents the way save_file() used to, with 'cp'/'chmod'. """
+    with open(tmpfile, 'w') as f:
+        f.write(contents)
+    backupfile = '{}~'.format(filename)
+    if os.path.isfile(filename) and (not os.path.isfile(backupfile)):
+        os.system('cp {} {}'.format(filename, backupfile))
+    os.system('cp {} {}'.format(tmpfile, filename))
+    if not os.access(filename, os.X_OK):
+        os.system('chmod a+x {}'.format(filename))
+
+
+def save_copied(contents, tmpfile, filename):
+    """ Save contents with a temp file that is copied over the file,
+        the way save_file() did with in-process copies.
+    """
+    with open(tmpfile, 'w') as f:
+        f.write(contents)
+    backupfile = '{}~'.format(filename)
+    if os.path.isfile(filename) and (not os.path.isfile(backupfile)):
+        aliasmgr_fileops.copy_file(filename, backupfile)
+    aliasmgr_fileops.copy_file(tmpfile, filename)
+    if not os.access(filename, os.X_OK):
+        aliasmgr_fileops.make_executable(filename)
+
+
+def save_atomic(contents, tmpfile, filename):
+    """ Save contents the way save_file() does now, written once to a
+        temp file next to the file (synced), and renamed over it.
+        tmpfile is not used.
+    """
+    backupfile = '{}~'.format(filename)
+    if os.path.isfile(filename) and (not os.path.isfile(backupfile)):
+        aliasmgr_fileops.copy_file(filename, backupfile)
+    with aliasmgr_fileops.atomic_write(filename) as f:
+        f.write(contents)
+    if not os.access(filename, os.X_OK):
+        aliasmgr_fileops.make_executable(filename)
+
+
+def time_save(func, contents, tmpdir, firstsave=False, runs=DEFAULT_RUNS):
+    """ Time func(contents, tmpfile, filename) in tmpdir.
+        With firstsave, every run starts with no backup file and a file
+        that isn't executable (the backup/chmod steps run too).
+        Returns (list of durations, True if the saved contents are right).
+    """
+    if not os.path.isdir(tmpdir):
+        os.makedirs(tmpdir)
+    tmpfile = os.path.join(tmpdir, 'aliasmanager.tmp')
+    filename = os.path.join(tmpdir, 'aliases.sh')
+    durations = []
+    for _ in range(runs):
+        if firstsave or (not os.path.isfile(filename)):
+            with open(filename, 'w') as f:
+                f.write(contents)
+            os.chmod(filename, 0o644)
+            if os.path.isfile('{}~'.format(filename)):
+                os.remove('{}~'.format(filename))
+        start = time.time()
+        func(contents, tmpfile, filename)
+        durations.append(time.time() - start)
+    try:
+        with open(filename, 'r') as f:
+            same = (f.read() == contents) and os.access(filename, os.X_OK)
+    except (IOError, OSError):
+        same = False
+    return durations, same
+
+
+def bench_save(count=DEFAULT_SAVE_COUNT, runs=DEFAULT_SAVE_RUNS):
+    """ Compare save_file() file operations with forked 'cp'/'chmod'
+        commands, in-process copies, and atomic writes. Also checks each
+        with a path that has spaces in it.
+        Returns 0 if the in-process saves worked.
+    """
+    contents = generate_contents(count)
+    print('Saving: generated ({} definitions, {:0.2f} MB), {} runs'.format(
+        count,
+        len(contents) / (1024.0 * 1024.0),
+        runs))
+    print('    times in ms, first save includes the backup/chmod\n')
+    print('{:>12}  {:>7} {:>7}  {:>7} {:>7}  {}'.format(
+        '', 'first', 'p95', 'later', 'p95', 'path with spaces'))
+    exitcode = 0
+    tmpdir = tempfile.mkdtemp(prefix='aliasmgr_bench.')
+    try:
+        for name, func in (
+                ('forked', save_forked),
+                ('copied', save_copied),
+                ('atomic', save_atomic)):
+            columns = []
+            for firstsave in (True, False):
+                durations, same = time_save(
+                    func,
+                    contents,
+                    os.path.join(tmpdir, name),
+                    firstsave=firstsave,
+                    runs=runs)
+                if not same:
+                    exitcode = 1
+                columns.extend((
+                    percentile(durations, 50) * 1000,
+                    percentile(durations, 95) * 1000))
+            spacedir = os.path.join(tmpdir, name, 'with spaces')
+            # The forked commands complain about the split paths.
+            stderrfd = os.dup(2)
+            with open(os.devnull, 'w') as devnull:
+                os.dup2(devnull.fileno(), 2)
+            try:
+                _, spaceok = time_save(func, contents, spacedir, runs=1)
+            except aliasmgr_fileops.FileOpError:
+                spaceok = False
+            finally:
+                os.dup2(stderrfd, 2)
+                os.close(stderrfd)
+            if (not spaceok) and (func is not save_forked):
+                exitcode = 1
+            print('{:>12}  {:>7.2f} {:>7.2f}  {:>7.2f} {:>7.2f}  {}'.format(
+                name,
+                *(columns + ['ok' if spaceok else 'FAILED'])))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return exitcode
+
+
+def serialize_old(commands):
+    """ Build alias file contents the way save_file() used to, one
+        tree row (sorted name) at a time, with lists that are joined
+        at the end.
+    """
+    lst_aliases = []
+    lst_functions = []
+    for name in commands.sortednames():
+        for itm in commands.getall(name):
+            scomment = itm.comment
+            if scomment and (not scomment.startswith('#')):
+                scomment = ' '.join(('#', scomment))
+            if len(itm.cmd) > 1:
+                lst_functions.append('\nfunction {}()\n'.format(name))
+                lst_functions.append('{\n')
+                if scomment:
+                    lst_functions.append('\t{}\n'.format(scomment))
+                for scmdline in itm.cmd:
+                    lst_functions.append('\t{}\n'.format(scmdline))
+                lst_functions.append('}\n')
+            else:
+                if '"' in itm.cmd[0]:
+                    scmd = "'" + itm.cmd[0] + "'"
+                else:
+                    scmd = '"' + itm.cmd[0] + '"'
+                if len(scomment) > 0:
+                    scmd = ' '.join((scmd, scomment))
+                lst_aliases.append('alias {}={}\n'.format(name, scmd))
+    lst_exports = [
+        'export {}\n'.format(itm.name) for itm in commands.exported()]
+    return ''.join([
+        amcore.FILE_HEADER.format(settings=amcore.settings),
+        '\n\n# Aliases:\n',
+        ''.join(sorted(set(lst_aliases))),
+        '\n# Functions:',
+        ''.join(lst_functions),
+        '\n# Exports:\n',
+        ''.join(sorted(set(lst_exports))),
+        '\n'])
+
+
+def bench_serialize(count=DEFAULT_SERIALIZE_COUNT, runs=DEFAULT_RUNS):
+    """ Compare building alias file contents the old way (save_file()),
+        and with the Serializer, then time Serializer saves.
+        Returns 0 if both produced the same contents.
+    """
+    commands = amcore.CommandCollection(
+        amcore.parse_contents(generate_contents(count)).commands())
+    print('Serializing: generated ({} definitions), best of {} runs\n'.format(
+        len(commands),
+        runs))
+    # The collection caches its sorted names, like the GUI's does.
+    commands.sortednames()
+    oldtime, oldcontents = timeit(serialize_old, (commands,), runs=runs)
+    newtime, newcontents = timeit(
+        lambda c: amcore.Serializer(c).to_string(),
+        (commands,),
+        runs=runs)
+    tmpdir = tempfile.mkdtemp(prefix='aliasmgr_bench.')
+    try:
+        filename = os.path.join(tmpdir, 'aliases.sh')
+        savetime, _ = timeit(
+            lambda c: amcore.Serializer(c).save(filename, backup=False),
+            (commands,),
+            runs=runs)
+        with open(filename, 'r') as f:
+            savedsame = (f.read() == newcontents)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    megabytes = len(newcontents) / (1024.0 * 1024.0)
+    for name, duration in (
+            ('save_file() lists', oldtime),
+            ('Serializer', newtime),
+            ('Serializer.save()', savetime)):
+        print('{:>18}: {:0.4f}s, {:>9.0f} definitions/s, {:0.2f} MB/s'.format(
+            name,
+            duration,
+            len(commands) / duration,
+            megabytes / duration))
+    same = (oldcontents == newcontents) and savedsame
+    print('\n{:>18}: {:0.2f}x'.format('speedup', oldtime / newtime))
+    print('{:>18}: {}'.format(
+        'results',
+        'identical' if same else 'DIFFERENT!'))
+    return 0 if same else 1
+
+
+def edit_resize(commands):
+    """ Edit one alias in the middle of a collection, changing its size. """
+    aliases = commands.aliases()
+    cmd = aliases[len(aliases) // 2]
+    cmd.cmd = ['{} --edited'.format(cmd.cmd[0])]
+
+
+def edit_samesize(commands):
+    """ Edit one alias in the middle of a collection, keeping its size. """
+    aliases = commands.aliases()
+    cmd = aliases[len(aliases) // 2]
+    cmd.cmd = [cmd.cmd[0].replace('-a', '-A')]
+
+
+def edit_add(commands):
+    """ Add an exported function to a collection. """
+    cmd = amcore.Command(
+        name='benchadded',
+        cmd=['echo "added"', 'echo "${1}"'],
+        comment='added',
+        exported=amcore.Command.EXPORT_NO)
+    cmd.setexport(True)
+    commands.append(cmd)
+
+
+def time_edit(filename, contents, edit, splice=True, inplace=False,
+              runs=DEFAULT_RUNS):
+    """ Time saving a file after one edit, with or without splicing
+        (and patching in place, see: Serializer.save()).
+        The file is restored and parsed before each run (not timed).
+        Returns (best time, save mode, reparsed command info).
+    """
+    best = None
+    savemode = None
+    for _ in range(runs):
+        with open(filename, 'w') as f:
+            f.write(contents)
+        parsed = amcore.parse_file(filename, usecache=False)
+        commands = amcore.CommandCollection(parsed.commands())
+        edit(commands)
+        serializer = amcore.Serializer(commands)
+        start = time.time()
+        serializer.save(
+            filename,
+            backup=False,
+            parsed=parsed if splice else None,
+            inplace=inplace)
+        duration = time.time() - start
+        if (best is None) or (duration < best):
+            best = duration
+        savemode = serializer.savemode
+    reparsed = amcore.parse_file(filename, usecache=False).commands()
+    return best, savemode, sorted(command_info(reparsed))
+
+
+def bench_splice(count=DEFAULT_SERIALIZE_COUNT, runs=DEFAULT_RUNS):
+    """ Compare full saves with spliced saves after small edits.
+        Returns 0 if both saves parse to the same commands.
+    """
+    contents = generate_contents(count)
+    print('Saving one edit: generated ({} definitions, {:0.2f} MB), '
+          'best of {} runs\n'.format(
+              count,
+              len(contents) / (1024.0 * 1024.0),
+              runs))
+    tmpdir = tempfile.mkdtemp(prefix='aliasmgr_bench.')
+    exitcode = 0
+    try:
+        filename = os.path.join(tmpdir, 'aliases.sh')
+        print('{:>16}  {:>10}  {:>10}  {:>9}  {:>8}  {}'.format(
+            'edit', 'full', 'spliced', 'mode', 'speedup', 'results'))
+        for name, edit, inplace in (
+                ('same size alias', edit_samesize, False),
+                ('same size alias', edit_samesize, True),
+                ('resized alias', edit_resize, False),
+                ('added function', edit_add, False)):
+            fulltime, _, fullinfo = time_edit(
+                filename, contents, edit, splice=False, runs=runs)
+            splicetime, savemode, spliceinfo = time_edit(
+                filename, contents, edit, splice=True, inplace=inplace,
+                runs=runs)
+            same = (fullinfo == spliceinfo)
+            if not same:
+                exitcode = 1
+            print('{:>16}  {:>9.4f}s  {:>9.4f}s  {:>9}  {:>7.1f}x  {}'.format(
+                name,
+                fulltime,
+                splicetime,
+                savemode,
+                fulltime / splicetime,
+                'identical' if same else 'DIFFERENT!'))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return exitcode
+
+
+def print_usage():
+    print("""Usage:
+    aliasmgr_bench.py parse [file] [-n count] [-r runs]
+        ...compare the multi-pass and single-pass alias file parsers.
+           A file is generated with 'count' definitions if none is given.
+    aliasmgr_bench.py rss [file] [-n count]
+        ...compare peak memory use for string and memory-mapped reading.
+    aliasmgr_bench.py startup [-r runs]
+        ...report cold import times, and which modules need gtk.
+    aliasmgr_bench.py shell [files...] [-r runs]
+        ...report bash startup times (median/p95) for the integration
+           script in plain/bundle/autoload modes, and for each file.
+           Files in integrated.lst are used if none are given.
+    aliasmgr_bench.py serialize [-n count] [-r runs]
+        ...compare building alias file contents the old save_file() way
+           and with the Serializer, and time Serializer saves.
+    aliasmgr_bench.py splice [-n count] [-r runs]
+        ...compare full saves and spliced saves (only the changed
+           definitions are written) after one edit.
+    aliasmgr_bench.py save [-n count] [-r runs]
+        ...compare alias file saves with forked 'cp'/'chmod' commands,
+           in-process copies, and atomic writes.
+    """)
+
+
+def get_opt(largs, flag, default):
+    """ Remove a flag and its integer value from largs, return the value. """
+    if flag in largs:
+        index = largs.index(flag)
+        try:
+            value = int(largs[index + 1])
+        except (IndexError, ValueError):
+            print('Expecting a number after: {}'.format(flag))
+            sys.exit(1)
+        del largs[index:index + 2]
+        return value
+    return default
+
+
+def main(largs):
+    """ Main entry point for the benchmarks. """
+    if (not largs) or largs[0] in ('-h', '--help'):
+        print_usage()
+        return 0
+
+    count = get_opt(largs, '-n', None)
+    runs = get_opt(largs, '-r', None)
+    benchname = largs.pop(0)
+    if benchname == 'serialize':
+        return bench_serialize(
+            count=count or DEFAULT_SERIALIZE_COUNT,
+            runs=runs or DEFAULT_RUNS)
+    if benchname == 'splice':
+        return bench_splice(
+            count=count or DEFAULT_SERIALIZE_COUNT,
+            runs=runs or DEFAULT_RUNS)
+    if benchname == 'save':
+        return bench_save(
+            count=count or DEFAULT_SAVE_COUNT,
+            runs=runs or DEFAULT_SAVE_RUNS)
+    if benchname == 'shell':
+        for filename in largs:
+            if not os.path.isfile(filename):
+                print('File not found: {}'.format(filename))
+                return 1
+        return bench_shell(filenames=largs, runs=runs or DEFAULT_SHELL_RUNS)
+
+    count = count or DEFAULT_COUNT
+    runs = runs or DEFAULT_RUNS
+    filename = largs[0] if largs else None
+    if filename and (not os.path.isfile(filename)):
+        print('File not found: {}'.format(filename))
+        return 1
+
+    if benchname == 'parse':
+        return bench_parse(filename=filename, count=count, runs=runs)
+    elif benchname == 'rss':
+        return bench_rss(filename=filename, count=count)
+    elif benchname == 'startup':
+        return bench_startup(runs=runs)
+
+    print('Unknown benchmark: {}'.format(benchname))
+    print_usage()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
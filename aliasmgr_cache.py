@@ -0,0 +1,209 @@
+'''
+    aliasmgr_cache.py
+    On-disk cache for parsed alias files.
+    Entries are stored in a per-user cache directory, one file per alias file.
+    Each entry holds a small header (path, mtime, size, content hash) followed
+    by the pickled parse results, so validating an entry only costs one
+    os.stat() call (with a content hash fallback when the stat info changes).
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import hashlib
+import os
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import aliasmgr_settings
+
+# Bump this when the format of cached parse results changes.
+CACHE_VERSION = 5
+# Extension for cache entry files.
+CACHE_EXT = '.cache'
+# Files modified this recently (in seconds) may change again without a
+# visible mtime/size change, entries for them are always hash-checked.
+RACY_SECONDS = 2
+
+
+def printx(sstring):
+    print('aliasmgr_cache: {}'.format(sstring))
+
+
+def get_cachedir():
+    """ Return the per-user cache directory for Alias Manager. """
+    cachehome = os.environ.get('XDG_CACHE_HOME', '')
+    if not cachehome:
+        cachehome = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cachehome, 'aliasmgr')
+
+
+def hash_contents(contents):
+    """ Return the content hash stored with cache entries.
+        contents can be a string, or a buffer like an mmap object.
+    """
+    return hashlib.sha1(contents).hexdigest()
+
+
+class ParseCache(object):
+
+    """ Persistent cache of parse results, keyed by alias file path.
+        usage:
+            cache = ParseCache()
+            st = os.stat(filename)
+            parsed = cache.get(filename, st)
+            if parsed is None:
+                # Hash fallback, when the file contents are available.
+                parsed = cache.get(filename, st, contents=contents)
+            if parsed is None:
+                parsed = parse(contents)
+                cache.put(filename, st, contents, parsed)
+    """
+
+    def __init__(self, cachedir=None):
+        self.cachedir = cachedir or get_cachedir()
+        self.version = (CACHE_VERSION, aliasmgr_settings.__VERSION__)
+
+    def entry_file(self, filename):
+        """ Return the cache entry file path for an alias file. """
+        key = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+        return os.path.join(self.cachedir, '{}{}'.format(key, CACHE_EXT))
+
+    def clear(self):
+        """ Remove all cache entries. Returns the number removed. """
+        removed = 0
+        for entryfile in self.entry_files():
+            try:
+                os.remove(entryfile)
+                removed += 1
+            except (IOError, OSError) as ex:
+                printx('Unable to remove cache file: {}\n{}'.format(
+                    entryfile, ex))
+        return removed
+
+    def entries(self):
+        """ Return a list of header dicts for all readable cache entries,
+            with the entry's 'cachefile' and 'cachesize' added.
+        """
+        headers = []
+        for entryfile in self.entry_files():
+            try:
+                with open(entryfile, 'rb') as f:
+                    header = pickle.load(f)
+                header['cachefile'] = entryfile
+                header['cachesize'] = os.path.getsize(entryfile)
+            except Exception:
+                # Unreadable/corrupt entry, it will be replaced on next parse.
+                continue
+            headers.append(header)
+        return sorted(headers, key=lambda h: h.get('path', ''))
+
+    def entry_files(self):
+        """ Return a list of all cache entry files. """
+        try:
+            names = os.listdir(self.cachedir)
+        except (IOError, OSError):
+            return []
+        return [
+            os.path.join(self.cachedir, name)
+            for name in names
+            if name.endswith(CACHE_EXT)
+        ]
+
+    def get(self, filename, st, contents=None):
+        """ Retrieve cached parse results for an alias file.
+            st is the os.stat() result for the file.
+            If the stat info doesn't match and contents are given,
+            the content hash is checked instead (and the entry is updated
+            with the new stat info on a match).
+            Returns None if there is no valid entry.
+        """
+        entryfile = self.entry_file(filename)
+        try:
+            with open(entryfile, 'rb') as f:
+                # The header is small, the results are only loaded if valid.
+                header = pickle.load(f)
+                if not self.header_valid(header, filename):
+                    return None
+                if self.stat_matches(header, st):
+                    return pickle.load(f)
+                if contents is None:
+                    return None
+                if header['hash'] != hash_contents(contents):
+                    return None
+                parsed = pickle.load(f)
+        except Exception:
+            # Missing, unreadable, or corrupt entry.
+            return None
+        # Contents are the same, stamp the entry with the new stat info.
+        self.put(filename, st, contents, parsed, filehash=header['hash'])
+        return parsed
+
+    def header_valid(self, header, filename):
+        """ Returns True if a header is usable for this filename/version. """
+        return (
+            (header.get('version') == self.version) and
+            (header.get('path') == os.path.abspath(filename)))
+
+    def put(self, filename, st, contents, parsed, filehash=None):
+        """ Store parse results for an alias file.
+            Failure to write the cache is not an error, the file will just
+            be parsed again next time. Returns True on success.
+        """
+        mtime = st.st_mtime
+        if (time.time() - mtime) < RACY_SECONDS:
+            # Don't trust the stat info, force a hash check next time.
+            mtime = None
+        header = {
+            'version': self.version,
+            'path': os.path.abspath(filename),
+            'mtime': mtime,
+            'size': st.st_size,
+            'hash': filehash or hash_contents(contents),
+            'created': time.time(),
+            'aliases': len(parsed.aliases),
+            'functions': len(parsed.functions),
+        }
+        entryfile = self.entry_file(filename)
+        tmpfile = '{}.{}.tmp'.format(entryfile, os.getpid())
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            with open(tmpfile, 'wb') as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(parsed, f, pickle.HIGHEST_PROTOCOL)
+            # Readers (other shells) never see a half-written entry.
+            os.rename(tmpfile, entryfile)
+        except Exception as ex:
+            printx('Unable to write cache file: {}\n{}'.format(entryfile, ex))
+            try:
+                os.remove(tmpfile)
+            except (IOError, OSError):
+                pass
+            return False
+        return True
+
+    def status(self, header):
+        """ Return a short status string for a cache entry header,
+            'valid', 'changed' (stat info differs), 'unverified' (will be
+            hash-checked on next use), or 'missing'.
+        """
+        try:
+            st = os.stat(header['path'])
+        except (IOError, OSError):
+            return 'missing'
+        if header['mtime'] is None:
+            return 'unverified'
+        return 'valid' if self.stat_matches(header, st) else 'changed'
+
+    @staticmethod
+    def stat_matches(header, st):
+        """ Returns True if the header's stat info matches os.stat() info. """
+        return (
+            (header['mtime'] is not None) and
+            (header['mtime'] == st.st_mtime) and
+            (header['size'] == st.st_size))
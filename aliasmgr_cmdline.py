@@ -8,22 +8,31 @@ Created on Sep 24, 2013
 import sys
 import os
 import re
+import time
 
-import aliasmgr_util as amutil
+import aliasmgr_core as amcore
 # settings helper
-settings = amutil.settings
+settings = amcore.settings
 
 
 class CmdLine():
 
     """ alias manager command line tools """
 
+    # Flags for integrate_batch(), and the helper_batch() arg for each.
+    integrate_flags = {
+        '--integrate': 'add',
+        '--deintegrate': 'remove',
+        '--integrate-replace': 'replace',
+    }
+
     def __init__(self, largs=None):
         """ Loads command-line interface, must pass args (largs). """
         # aliasfile can be replaced by arg_handler().
         self.aliasfile = settings.get('aliasfile')
-        # load all aliases/functions (list of amutil.Command() objects)
-        self.commands = amutil.readfile()
+        # all aliases/functions (amcore.CommandCollection()),
+        # loaded when needed. See: load_commands()
+        self.commands = None
 
     def main(self, largs):
         """ runs command line style, accepts args """
@@ -38,27 +47,24 @@ class CmdLine():
     def arg_handler(self, largs):
         """ receives list of args, handles accordingly """
 
-        # scan for alias file to use.
-        for sarg in largs:
+        # Integration args are file names, they aren't alias files to use.
+        if any(sarg in self.integrate_flags for sarg in largs):
+            return self.integrate_batch(largs)
+
+        # scan for alias file to use. Nothing is read until the args are
+        # resolved, and then only by the commands that need it.
+        for sarg in largs[:]:
             if (os.path.isfile(sarg) or
                     os.path.isfile(os.path.join(sys.path[0], sarg))):
                 self.aliasfile = sarg
-                self.commands = amutil.readfile(aliasfile=self.aliasfile)
+                self.commands = None
                 largs.remove(sarg)
 
         # notify user about which alias file is being used.
         print('\nUsing alias file: {}\n'.format(self.aliasfile))
-        # get lower() list of alias names
-        if self.commands:
-            aliasnames = [cmd.name.lower() for cmd in self.commands]
-        else:
-            aliasnames = []
-
-        # scan for normal args.
+        # help/version never need the alias file, wherever they are.
         for sarg in largs:
-            if sarg.lower() in aliasnames:
-                self.printalias(sarg)
-            elif sarg.startswith(('-h', '--help')):
+            if sarg.startswith(('-h', '--help')):
                 # HELP
                 self.printusage()
                 self.printhelp()
@@ -67,6 +73,35 @@ class CmdLine():
                 # VERSION
                 self.printver()
                 return 0
+        # scan for normal args.
+        for sarg in largs:
+            # Flags are never alias names, the file isn't read for them.
+            if not sarg.startswith('-'):
+                # Print an alias/function by name, or search for it.
+                ret = self.printname(sarg)
+                if ret is not None:
+                    return ret
+            elif sarg == '--cache':
+                # Show parse cache info.
+                return self.printcache()
+            elif sarg == '--clearcache':
+                # Remove all parse cache entries.
+                return self.clearcache()
+            elif sarg == '--traces':
+                # Rank integrated files by traced load time.
+                return self.printtraces()
+            elif (sarg == '--save') or sarg.startswith('--save='):
+                # Re-save the alias file (or a copy) in the standard format.
+                return self.savefile(sarg.partition('=')[-1] or None)
+            elif sarg == '--sourcegraph':
+                # Show what bash sources on startup.
+                return self.printsourcegraph()
+            elif sarg == '--cleartraces':
+                # Remove all load time traces.
+                return self.cleartraces()
+            elif sarg.startswith('--trace='):
+                # Enable/disable load time tracing.
+                return self.settrace(sarg.partition('=')[-1])
             elif sarg.startswith(('-e', '--export')):
                 # EXPORTS
                 return self.printexports()
@@ -81,6 +116,25 @@ class CmdLine():
                 # Search automatically ran
                 return self.printsearch(sarg)
 
+    def clearcache(self):
+        """ Remove all parse cache entries. """
+        removed = amcore.parsecache.clear()
+        print('Removed {} cache {} from: {}'.format(
+            removed,
+            'entry' if removed == 1 else 'entries',
+            amcore.parsecache.cachedir))
+        return 0
+
+    def cleartraces(self):
+        """ Remove all load time traces. """
+        import aliasmgr_trace
+        removed = aliasmgr_trace.clear()
+        print('Removed {} trace {} from: {}'.format(
+            removed,
+            'file' if removed == 1 else 'files',
+            aliasmgr_trace.get_tracedir()))
+        return 0
+
     def convert_toscript(self, cmdlineargs):
         """ Convert an alias/function to a script file. """
         args = cmdlineargs[:]
@@ -119,9 +173,260 @@ class CmdLine():
         print('\nUnable to generate script: {}'.format(newfile))
         return 1
 
+    def integrate_batch(self, largs):
+        """ Integrate/de-integrate any number of files in one batch.
+            Files follow the flag for what to do with them, like:
+                --integrate a.sh b.sh --deintegrate c.sh
+        """
+        batch = {}
+        operation = None
+        for sarg in largs:
+            if sarg in self.integrate_flags:
+                operation = self.integrate_flags[sarg]
+                batch.setdefault(operation, [])
+            elif sarg.startswith('-') or (operation is None):
+                print('Unexpected argument with integration flags: {}'.format(
+                    sarg))
+                return 1
+            else:
+                batch[operation].append(sarg)
+        if not any(batch.values()) and ('replace' not in batch):
+            print('No files given to integrate/de-integrate.')
+            return 1
+
+        import aliasmgr_integrator
+        integrator = aliasmgr_integrator.get_integrator()
+        errors = integrator.helper_batch_errors(**batch)
+        if errors:
+            print('\n'.join(errors))
+            print('\nNothing was changed.')
+            return 1
+        if not integrator.helper_batch(**batch):
+            print('Unable to update the integrated files!')
+            return 1
+
+        for operation, verb in (
+                ('replace', 'Integrated files replaced with'),
+                ('add', 'Integrated'),
+                ('remove', 'De-integrated')):
+            if operation in batch:
+                count = len(batch[operation])
+                print('{} {} {}.'.format(
+                    verb,
+                    count,
+                    'file' if count == 1 else 'files'))
+        files = integrator.helper_getfiles()
+        print('\n{} {} integrated, using: {}'.format(
+            len(files),
+            'file is' if len(files) == 1 else 'files are',
+            integrator.helperscript))
+        if not integrator.is_integrated():
+            print('The script is not integrated into bashrc yet.')
+        return 0
+
+    def findname(self, name):
+        """ Find an alias/function by name (ignoring case), searching for
+            name (regex) in the same pass, so the file is only parsed once.
+            Yields (Command(), False) for search matches as they are found,
+            and stops after (Command(), True) for the name itself.
+            Already loaded commands are looked up by name first.
+        """
+        if self.commands is not None:
+            cmd = self.commands.getnocase(name)
+            if cmd is not None:
+                yield cmd, True
+                return
+            for cmd in self.itersearch(name):
+                yield cmd, False
+            return
+
+        lowername = name.lower()
+        try:
+            get_match = self.search_matcher(name)
+        except re.error:
+            get_match = None
+        for cmd in self.iter_commands():
+            if cmd.name.lower() == lowername:
+                yield cmd, True
+                return
+            if (get_match is not None) and get_match(cmd):
+                yield cmd, False
+        if get_match is None:
+            print('\nInvalid alias name given!: {}\n'.format(name))
+
+    def iter_commands(self):
+        """ Yield aliases/functions from the alias file as they are parsed.
+            If they were already loaded, the file isn't parsed again.
+            Errors are printed.
+        """
+        if self.commands is not None:
+            # Same order as parsing, aliases before functions on a line.
+            for cmd in sorted(self.commands, key=lambda c: c.span[1]):
+                yield cmd
+            return
+        try:
+            for cmd in amcore.iter_commands(aliasfile=self.aliasfile):
+                yield cmd
+        except amcore.AliasFileError as ex:
+            print('\n{}\n'.format(ex))
+
+    def load_commands(self):
+        """ Load all aliases/functions from the alias file, if they haven't
+            been loaded yet. Returns a CommandCollection().
+        """
+        if self.commands is None:
+            self.commands = self.readfile()
+        return self.commands
+
+    def readfile(self):
+        """ Read all aliases/functions from the alias file.
+            Errors and warnings are printed.
+            Returns a CommandCollection(), empty on failure.
+        """
+        try:
+            commands = amcore.readfile(aliasfile=self.aliasfile)
+        except amcore.AliasFileError as ex:
+            print('\n{}\n'.format(ex))
+            return amcore.CommandCollection()
+        if commands.warnings:
+            print(
+                '\nreadfile: missing aliases/functions: \n{}'.format(
+                    '\n'.join(commands.warnings)))
+        return commands
+
+    def savefile(self, filename=None):
+        """ Save the alias file in Alias Manager's format (sorted, the same
+            as the GUI saves it), or save it to another file.
+        """
+        import aliasmgr_fileops
+        commands = self.load_commands()
+        if not commands:
+            print('No aliases/functions found, nothing was saved.')
+            return 1
+        filename = filename or self.aliasfile
+        try:
+            backupfile = amcore.Serializer(commands).save(filename)
+            aliasmgr_fileops.make_executable(filename)
+        except aliasmgr_fileops.FileOpError as ex:
+            print('Unable to save file!\n{}'.format(ex))
+            return 1
+        if backupfile:
+            print('Backup created: {}'.format(backupfile))
+        print('Saved {} {} to: {}'.format(
+            len(commands),
+            'definition' if len(commands) == 1 else 'definitions',
+            filename))
+        import aliasmgr_integrator
+        if aliasmgr_integrator.get_integrator().helper_refresh():
+            print('Startup scripts regenerated.')
+        return 0
+
+    def settrace(self, value):
+        """ Enable/disable load time tracing, and regenerate the
+            integration script.
+        """
+        if value not in ('on', 'off'):
+            print('Expecting --trace=on or --trace=off, got: {}'.format(value))
+            return 1
+        import aliasmgr_integrator
+        integrator = aliasmgr_integrator.get_integrator()
+        settings.setsave('trace', 'true' if value == 'on' else 'false')
+        if not integrator.helper_generate_script():
+            print('Unable to generate the integration script!')
+            return 1
+        print('Load time tracing is {}.'.format(value))
+        return 0
+
     def printver(self):
         print('{}\n'.format(settings.versionstr))
 
+    def printsourcegraph(self):
+        """ Print the files bash sources on startup, with their sizes,
+            and any duplicate sources or cycles.
+        """
+        import aliasmgr_integrator
+        import aliasmgr_sourcegraph
+        graph = aliasmgr_sourcegraph.from_integrator(
+            aliasmgr_integrator.get_integrator())
+        notes = {
+            'cycle': 'cycle, not followed',
+            'alternative': 'other branch',
+            'duplicate': 'sourced again',
+            'lazy': 'sourced when a function is called',
+            'missing': 'missing',
+        }
+        print('Files sourced on startup, sizes in bytes:\n')
+        print('{:>8} {:>8}  {}'.format('size', 'total', 'file'))
+        for depth, parent, lineno, filename, note in graph.tree:
+            node = graph.nodes[filename]
+            details = []
+            if parent:
+                details.append('line {}'.format(lineno))
+            if note:
+                details.append(notes[note])
+            print('{size:>8} {total:>8}  {indent}{filename}{details}'.format(
+                size=node['size'],
+                total=node['total'] if note != 'cycle' else '-',
+                indent='    ' * depth,
+                filename=filename,
+                details=' ({})'.format(', '.join(details)) if details else ''))
+        print('\n{} {}, {} bytes ({} bytes read on startup).'.format(
+            len(graph.nodes),
+            'file' if len(graph.nodes) == 1 else 'files',
+            graph.unique_size(),
+            graph.total_size()))
+
+        duplicates = graph.duplicates()
+        if duplicates:
+            print('\nSourced more than once:')
+            for filename in sorted(duplicates):
+                print('    {} ({} times)'.format(
+                    filename,
+                    len(duplicates[filename])))
+                for parent, lineno in duplicates[filename]:
+                    print('        {}:{}'.format(parent, lineno))
+        if graph.cycles:
+            print('\nSource cycles:')
+            for cycle in graph.cycles:
+                print('    {}'.format(' -> '.join(cycle)))
+        if graph.unresolved:
+            print('\nUnable to resolve (not followed):')
+            for parent, lineno, sword in graph.unresolved:
+                print('    {}:{}: {}'.format(parent, lineno, sword))
+        if graph.unreached:
+            print('\nNot sourced from bashrc:')
+            for filename in graph.unreached:
+                print('    {}'.format(filename))
+        print('\nRead {} of {} files, the rest were cached.'.format(
+            graph.rescanned,
+            len(graph.nodes)))
+        return 0
+
+    def printtraces(self):
+        """ Print integrated files ranked by traced load time. """
+        import aliasmgr_trace
+        sessions, infos = aliasmgr_trace.summarize()
+        print('Trace directory: {}\n'.format(aliasmgr_trace.get_tracedir()))
+        if not infos:
+            print('No traces found, enable tracing with: --trace=on\n')
+            return 0
+        print('Load times for {} shell {}, in ms (most expensive first):\n'
+              .format(sessions, 'session' if sessions == 1 else 'sessions'))
+        print('{:>8} {:>8} {:>8} {:>8} {:>6} {:>8}  {}'.format(
+            'mean', 'median', 'p95', 'max', 'share', 'sessions', 'file'))
+        for info in infos:
+            print(
+                '{mean:>8.2f} {median:>8.2f} {p95:>8.2f} {max:>8.2f} '
+                '{share:>5.0%} {sessions:>8}  {filename}'.format(
+                    filename=info['filename'],
+                    sessions=info['sessions'],
+                    share=info['share'],
+                    mean=info['mean'] * 1000,
+                    median=info['median'] * 1000,
+                    p95=info['p95'] * 1000,
+                    max=info['max'] * 1000))
+        return 0
+
     def printusage(self):
         print("""{ver}
          Usage:
@@ -134,6 +439,24 @@ class CmdLine():
              aliasmgr [file] -p | -h | -v | -e
                  ...list info about all aliases/functions.
                     Use a specific alias file if given.
+             aliasmgr --cache | --clearcache
+                 ...show or clear cached alias file parse results.
+             aliasmgr --integrate|--deintegrate|--integrate-replace files...
+                 ...integrate/de-integrate many files at once, or replace
+                    the integrated files. Flags can be mixed, like:
+                    --integrate a.sh b.sh --deintegrate c.sh
+             aliasmgr [file] --save[=target_file]
+                 ...re-save the alias file in Alias Manager's format,
+                    or save a copy of it to target_file.
+             aliasmgr --sourcegraph
+                 ...show the files bash sources on startup, with sizes,
+                    duplicate sources, and cycles.
+             aliasmgr --traces | --cleartraces | --trace=on|off
+                 ...rank integrated files by load time in new shells,
+                    clear the traces, or turn tracing on/off.
+             aliasmgr --profile-startup[=report.json] [args]
+                 ...time imports and startup phases for any command,
+                    print a breakdown or write a json report.
         """.format(ver=settings.versionstr))
 
     def printhelp(self):
@@ -149,7 +472,19 @@ class CmdLine():
                   -e : Print exported names only
                   -C : Convert a function/alias to its own script file.
                   -o : Overwrite existing files when converting to scripts.
-     -p[s|c][f|a]    : Print current aliases/functions.
+             --cache : Show info about cached alias files.
+        --clearcache : Remove all cached alias file parse results.
+         --integrate : Integrate the files that follow (many at once).
+       --deintegrate : De-integrate the files that follow.
+ --integrate-replace : Integrate only the files that follow.
+       --save[=file] : Re-save the alias file (or save it as file).
+       --sourcegraph : Show the files bash sources on startup.
+            --traces : Rank integrated files by traced load time.
+       --cleartraces : Remove all load time traces.
+      --trace=on|off : Record load times when new shells start.
+   --profile-startup : Print startup import/phase times (to stderr).
+ --profile-startup=F : Write startup import/phase times to a json file.
+     -p[s|c][f|a]    : Print current aliases/functions, in file order.
                 -pxf : Print entire functions (with content).
 
     Formatting:
@@ -171,18 +506,49 @@ class CmdLine():
     def printalias(self, aliasname):
         """ Print a single alias (retrieved by name or Command() object) """
 
-        if isinstance(aliasname, amutil.Command):
+        if isinstance(aliasname, amcore.Command):
             self.printcommand(aliasname)
         else:
             # retrieve by name.
-            aliasnames = [cmd.name for cmd in self.commands]
-            if aliasname in aliasnames:
-                self.printcommand(self.commands[aliasnames.index(aliasname)])
+            cmd = self.load_commands().get(aliasname, None)
+            if cmd is not None:
+                self.printcommand(cmd)
             else:
                 print('\nNo alias by that name!: {}'.format(aliasname))
                 return 1
         return 0
 
+    def printcache(self):
+        """ Print info about the parse cache entries. """
+        cache = amcore.parsecache
+        entries = cache.entries()
+        print('Cache directory: {}\n'.format(cache.cachedir))
+        if not entries:
+            print('No cached files.\n')
+            return 0
+
+        for header in entries:
+            print('\n'.join((
+                '{path}',
+                '      Status: {status}',
+                '     Aliases: {aliases}',
+                '   Functions: {functions}',
+                '  Cache size: {cachesize} bytes',
+                '      Cached: {created}\n',
+            )).format(
+                path=header['path'],
+                status=cache.status(header),
+                aliases=header['aliases'],
+                functions=header['functions'],
+                cachesize=header['cachesize'],
+                created=time.ctime(header['created'])))
+        totalsize = sum(h['cachesize'] for h in entries)
+        print('Total: {} cached {}, {} bytes'.format(
+            len(entries),
+            'file' if len(entries) == 1 else 'files',
+            totalsize))
+        return 0
+
     def printcommand(self, cmdobj, showcommand=True):
         """ Print a Command() object, with some formatting. """
         cmdexported = cmdobj.exported.lower()
@@ -200,33 +566,69 @@ class CmdLine():
 
         print('\n'.join(fmtlines).format(cmdobj=cmdobj, exported=exported))
 
+    def printname(self, name):
+        """ Print an alias/function by name (ignoring case). Until it is
+            found, search matches for name (regex) are printed as they are
+            found (see: findname()).
+            Returns None if the name was found, otherwise the exit code
+            for the search (see: printsearch()).
+        """
+        matchcount = 0
+        for cmdinfo, exact in self.findname(name):
+            if matchcount:
+                print('-' * 40)
+            if exact:
+                self.printalias(cmdinfo)
+                return None
+            self.printcommand(cmdinfo, showcommand=False)
+            matchcount += 1
+        return self.printsearch_total(name, matchcount)
+
     def printsearch(self, aliasname):
-        """ Searches aliases for aliasname (regex), and prints results """
-
-        matches = self.searchalias(aliasname)
-        if matches:
-            usedivider = (len(matches) > 1)
-            lastmatch = matches[-1]
-            for cmdinfo in matches:
-                self.printcommand(cmdinfo, showcommand=False)
-                if usedivider and (cmdinfo != lastmatch):
-                    print('-' * 40)
+        """ Searches aliases for aliasname (regex), and prints results
+            as they are found.
+        """
+        matchcount = 0
+        for cmdinfo in self.itersearch(aliasname):
+            if matchcount:
+                print('-' * 40)
+            self.printcommand(cmdinfo, showcommand=False)
+            matchcount += 1
+        return self.printsearch_total(aliasname, matchcount)
+
+    @staticmethod
+    def printsearch_total(aliasname, matchcount):
+        """ Print the number of search matches, and return an exit code.
+        """
+        if matchcount:
             print('\nFound {} matches for: {}\n'.format(
-                str(len(matches)), aliasname))
+                str(matchcount), aliasname))
             return 0
         else:
             print('\nNo aliases found matching: {}\n'.format(aliasname))
             return 1
 
-    def searchalias(self, aliasname, names_only=False):
-        """ Searches and retrieves all aliases matching aliasname (regex) """
+    def itersearch(self, aliasname, names_only=False):
+        """ Searches aliases for aliasname (regex), yielding matches while
+            the alias file is parsed.
+        """
 
         try:
-            repat = re.compile(aliasname, flags=re.IGNORECASE)
+            get_match = self.search_matcher(aliasname, names_only=names_only)
         except re.error:
             print('\nInvalid alias name given!: {}\n'.format(aliasname))
-            return []
-
+            return
+
+        for cmd in self.iter_commands():
+            if get_match(cmd):
+                yield cmd
+
+    @staticmethod
+    def search_matcher(aliasname, names_only=False):
+        """ Return a function that matches Command() objects against
+            aliasname (regex). Raises re.error for a bad regex.
+        """
+        repat = re.compile(aliasname, flags=re.IGNORECASE)
         if names_only:
             def get_match(cmd):
                 """ Match on name only. """
@@ -242,87 +644,95 @@ class CmdLine():
                         cmd.exported
                     )
                 )
-        return filter(get_match, self.commands)
+        return get_match
+
+    def searchalias(self, aliasname, names_only=False):
+        """ Searches and retrieves all aliases matching aliasname (regex) """
+        return list(self.itersearch(aliasname, names_only=names_only))
 
     def printaliases(self, sarg):
-        """ Print aliases in current file """
-
-        # Get the length of the longest command name for formatting.
-        maxcmdlength = len(max(self.commands, key=lambda c: len(c.name)).name)
-        if self.commands:
-            # Print in alphabetical order.
-            for itm in sorted(self.commands, key=lambda c: c.name):
-                # Comments?
-                if len(itm.comment) > 0:
-                    # Add Comment
-                    scomment = itm.comment
-                else:
-                    scomment = "(No Comment)"
-                # Exported?
-                sexport = itm.exported
-                # Print Name
-                if "s" in sarg:
-                    # printing short version, names only
-                    sfinalname = (itm.name)
-                elif "c" in sarg:
-                    # print comment version, names/comments only
-                    sfinalname = '{} : {}'.format(
-                        itm.name.ljust(maxcmdlength),
-                        scomment)
-                else:
-                    # printing normal (p), or full version (px)
-                    sfinalname = '\n'.join((
-                        '{}:',
-                        '    Comment: {}',
-                        '     Export: {}')).format(itm.name, scomment, sexport)
-                    # Function, show full cmd list?
-                    if itm.isfunction():
-                        # Function, show all commands?
-                        if "x" in sarg:
-                            # Build full command items string
-                            scmd = '\n'.join((
-                                '    Command:',
-                                '            {}\n'.format(
-                                    '\n            '.join(itm.cmd))))
-                        else:
-                            # Only show first line of function
-                            scmd = '\n'.join((
-                                '    Command:',
-                                '            {} (more lines...)\n')).format(
-                                itm.cmd[0])
+        """ Print aliases in current file, in file order, as they are parsed.
+            The name column for -pc grows with the longest name printed so
+            far, so nothing waits for the whole file to be parsed.
+        """
+
+        # Length of the longest command name so far, for formatting.
+        maxcmdlength = 0
+        itemcount = 0
+        for itm in self.iter_commands():
+            itemcount += 1
+            # Print all/aliases/functions
+            if "a" in sarg:
+                # Aliases only (also empty commands)
+                if itm.isfunction():
+                    continue
+            elif "f" in sarg:
+                # Functions only
+                if not itm.isfunction():
+                    continue
+            maxcmdlength = max(maxcmdlength, len(itm.name))
+            # Comments?
+            if len(itm.comment) > 0:
+                # Add Comment
+                scomment = itm.comment
+            else:
+                scomment = "(No Comment)"
+            # Exported?
+            sexport = itm.exported
+            # Print Name
+            if "s" in sarg:
+                # printing short version, names only
+                sfinalname = (itm.name)
+            elif "c" in sarg:
+                # print comment version, names/comments only
+                sfinalname = '{} : {}'.format(
+                    itm.name.ljust(maxcmdlength),
+                    scomment)
+            else:
+                # printing normal (p), or full version (px)
+                sfinalname = '\n'.join((
+                    '{}:',
+                    '    Comment: {}',
+                    '     Export: {}')).format(itm.name, scomment, sexport)
+                # Function, show full cmd list?
+                if itm.isfunction():
+                    # Function, show all commands?
+                    if "x" in sarg:
+                        # Build full command items string
+                        scmd = '\n'.join((
+                            '    Command:',
+                            '            {}\n'.format(
+                                '\n            '.join(itm.cmd))))
                     else:
-                        # Simple 1 liner, alias
+                        # Only show first line of function
                         scmd = '\n'.join((
                             '    Command:',
-                            '            {}\n'.format(itm.cmd[0])
-                        ))
-                    sfinalname = '\n'.join((sfinalname, scmd))
-
-                # Final output built, print all/aliases/functions
-                if "a" in sarg:
-                    # Aliases only (also empty commands)
-                    if not itm.isfunction():
-                        print(sfinalname)
-                elif "f" in sarg:
-                    # Functions only
-                    if itm.isfunction():
-                        print(sfinalname)
+                            '            {} (more lines...)\n')).format(
+                            itm.cmd[0])
                 else:
-                    # All
-                    print(sfinalname)
-        else:
+                    # Simple 1 liner, alias
+                    scmd = '\n'.join((
+                        '    Command:',
+                        '            {}\n'.format(itm.cmd[0])
+                    ))
+                sfinalname = '\n'.join((sfinalname, scmd))
+
+            # Final output built.
+            print(sfinalname)
+        if not itemcount:
             # No items found
             print('\nNo items found in alias file: {}'.format(self.aliasfile))
             return 1
         return 0
 
     def printexports(self):
-        """ Prints exports only """
-        exports = [
-            f.name for f in self.commands if f.exported.lower() == 'yes'
-        ]
-        if exports:
-            print('\n'.join(exports))
+        """ Prints exports only, as they are parsed. """
+        exportcount = 0
+        for cmd in self.iter_commands():
+            if cmd.export == amcore.Command.EXPORT_YES:
+                print(cmd.name)
+                exportcount += 1
+        if exportcount:
             return 0
         else:
             print('\nNo exports found!\n')
@@ -0,0 +1,2043 @@
+'''
+    aliasmgr_core.py
+    Models, parsing, and file reading for Alias Manager.
+    Nothing here depends on the GUI, errors are raised as AliasFileError()
+    and warnings are returned, so the command line never needs gtk.
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import bisect
+import copy
+import mmap
+import re
+import os
+import aliasmgr_cache
+import aliasmgr_settings
+# For changing file mode when scripts are generated.
+from stat import S_IREAD, S_IWRITE, S_IEXEC
+# Shorthand for read, write, and exec.
+S_RWX = S_IREAD | S_IWRITE | S_IEXEC
+
+settings = aliasmgr_settings.get_settings()
+parsecache = aliasmgr_cache.ParseCache()
+
+# Header for saved alias files, see: Serializer()
+FILE_HEADER = """#!/bin/bash
+# Generated by {settings.name} {settings.version}
+# -Christopher Welborn
+
+# Note to user:
+#     If you must edit this file manually please stick to this style:
+#         Use tabs, not spaces.
+#         No tabs before definitons.
+#         Seperate lines for curly braces.
+#         Use 1 tab depth for start of code block in functions.
+#         Function description is first comment in code block.
+#         Alias description is comment right side of alias definition.
+#
+#     ...if you use a different style it may or may not
+#        break the program and I can't help you.
+"""
+
+
+class AliasFileError(EnvironmentError):
+
+    """ Raised when an alias file can't be found or read.
+        The message is suitable for showing to the user.
+    """
+    pass
+
+
+# Command/Alias Object ------------------------------------
+class Command(object):
+
+    """ An alias or function definition.
+        Instances are slotted, there may be a lot of them loaded at once.
+    """
+
+    # Export states, see: exported
+    EXPORT_NEW = 0
+    EXPORT_YES = 1
+    EXPORT_NO = 2
+    EXPORT_NA = 3
+    # Display strings for each export state.
+    export_names = ('New', 'Yes', 'No', '[n/a]')
+    # Export states for lowercase strings (old values are still accepted).
+    export_states = {
+        'new': EXPORT_NEW,
+        'yes': EXPORT_YES,
+        'no': EXPORT_NO,
+        '[n/a]': EXPORT_NA,
+        'n/a': EXPORT_NA,
+    }
+    # Shared by all commands.
+    shebang = '#!/bin/bash'
+
+    __slots__ = ('name', '_cmd', 'comment', 'export', 'span', 'offsets',
+                 'parsed')
+
+    def __init__(self, name=None, cmd=None, comment=None, exported=None):
+        # set defaults.
+        # Names are repeated in exports and lookups, they are interned.
+        self.name = intern(name) if isinstance(name, str) else (name or '')
+        self.cmd = cmd if cmd else ()
+        self.comment = comment if comment else ''
+        self.exported = exported if exported else Command.EXPORT_NEW
+        # Line span (start, end) and byte offsets (start, end) in the file,
+        # for parsed commands. The end line is exclusive.
+        self.span = None
+        self.offsets = None
+        # Info as parsed from the file, see: set_parsed()
+        self.parsed = None
+
+    @property
+    def cmd(self):
+        """ Command lines, stored as a tuple. """
+        return self._cmd
+
+    @cmd.setter
+    def cmd(self, lines):
+        self._cmd = tuple(lines)
+
+    @property
+    def exported(self):
+        """ Display string for the export state ('New', 'Yes', 'No', or
+            '[n/a]' for aliases).
+            It can be set with one of these strings (case-insensitive),
+            'N/A', or one of the Command.EXPORT_* states.
+        """
+        return Command.export_names[self.export]
+
+    @exported.setter
+    def exported(self, value):
+        if hasattr(value, 'lower'):
+            state = Command.export_states.get(value.lower(), None)
+            if state is None:
+                raise ValueError('Invalid export state: {!r}'.format(value))
+            self.export = state
+        elif value in (
+                Command.EXPORT_NEW,
+                Command.EXPORT_YES,
+                Command.EXPORT_NO,
+                Command.EXPORT_NA):
+            self.export = value
+        else:
+            raise ValueError('Invalid export state: {!r}'.format(value))
+
+    def __repr__(self):
+        """ return string representation of this command. """
+
+        commentstr = self.comment if self.comment else '(No Comment)'
+        return '{} : {} \n'.format(self.name, commentstr)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def to_scriptfile(self, filepath=None, overwrite=False):
+        """ Convert a function/alias to its own script file. """
+        if not self.name:
+            raise ValueError('Cannot convert a command with no name.')
+        elif not self.cmd:
+            raise ValueError('Cannot convert a command with no content.')
+
+        # Ensure a full path is built.
+        if filepath:
+            basedir, filename = os.path.split(filepath)
+            if not basedir:
+                basedir = os.getcwd()
+            if not filename:
+                filename = '{}.sh'.format(self.name)
+        else:
+            basedir = os.getcwd()
+            filename = '{}.sh'.format(self.name)
+
+        # Don't clobber existing scripts.
+        if not overwrite:
+            uniqueid = 2
+            while os.path.exists(filename):
+                filename = '{}{}.sh'.format(self.name, uniqueid)
+                uniqueid += 1
+
+        # Build the full path.
+        filepath = os.path.join(basedir, filename)
+        desctype = 'a function' if self.isfunction() else 'an alias'
+        descfile = settings.get('aliasfile', 'an alias file.')
+        desclines = [
+            '# Script generated with {}:'.format(settings.versionstr),
+            '# Original code was {} in {}.'.format(desctype, descfile),
+        ]
+        desc = '{}\n'.format('\n'.join(desclines))
+        content = '\n{}\n'.format(self.to_function())
+
+        if not content.endswith('\n'):
+            content = '{}\n'.format(content)
+        with open(filepath, 'w') as f:
+            f.write('{}\n\n'.format(self.shebang))
+            f.write(desc)
+            f.write(content)
+            f.write('\n# Call the function when this script runs.\n')
+            f.write('{} $@\n'.format(self.name))
+
+            f.flush()
+
+        # Chmod to allow execution by the user.
+        os.chmod(filepath, S_RWX)
+
+        return filepath
+
+    @classmethod
+    def from_parsed(cls, cmd, exported=None):
+        """ Create a fresh Command() from another command's parsed info,
+            with the same span/offsets.
+            If exported is given, it overrides the parsed exported state.
+        """
+        name, cmdlines, comment, parsedexport = cmd.parsed
+        newcmd = cls(
+            name=name,
+            cmd=cmdlines,
+            comment=comment,
+            exported=parsedexport if exported is None else exported)
+        newcmd.span = cmd.span
+        newcmd.offsets = cmd.offsets
+        newcmd.set_parsed()
+        return newcmd
+
+    def ismodified(self):
+        """ Returns True if this command was changed since it was parsed,
+            or was never parsed from a file.
+        """
+        return (self.parsed is None) or (self.parsed != (
+            self.name, self._cmd, self.comment, self.export))
+
+    def set_parsed(self):
+        """ Save the current info as the parsed info, for ismodified(). """
+        self.parsed = (self.name, self._cmd, self.comment, self.export)
+
+    def isfunction(self):
+        """ Returns true/false depending on linecount """
+        return (len(self.cmd) > 1)
+
+    def isexported(self):
+        return self.export in (Command.EXPORT_YES, Command.EXPORT_NEW)
+
+    def setexport(self, bexported, bnew=False):
+        """ Sets the appropriate export state for cmd.exported using booleans,
+            Note: String values were used at first for automatic pretty
+                  printing in command line output, but later used to determine
+                  if an alias was new or not, therefore 'automagically'
+                  exporting new functions.
+            **Aliases are never exported no matter what the export value is**
+        """
+        if bnew:
+            self.export = Command.EXPORT_NEW
+        else:
+            if bexported:
+                self.export = Command.EXPORT_YES
+            else:
+                self.export = Command.EXPORT_NO
+
+    def to_function(self):
+        """ Return a string containing a function definition for this cmd """
+        if not (self.name and self.cmd):
+            return ''
+
+        if self.isfunction():
+            cmdlines = ['    {}'.format(l) for l in self.cmd]
+        else:
+            cmdlines = ['    {} $@'.format(self.cmd[0])]
+
+        content = ['function {} {{'.format(self.name)]
+        if self.comment:
+            content.append('    # {}\n'.format(self.comment))
+        content.extend(cmdlines)
+        content.append('}')
+        return '\n'.join(content)
+
+
+# Command Collection --------------------------------------------------
+class CommandCollection(object):
+
+    """ A list of Command() objects, in file order, with views for quick
+        lookups: a name index (first occurrence wins, like a list search),
+        sorted names, alias/function partitions, and exported names.
+        Views are built once when first needed. They are rebuilt after
+        append(), remove(), and rename(), or after invalidate() is called
+        when commands are edited in place.
+
+        usage:
+            commands = CommandCollection(parser.commands())
+            cmd = commands.get('myalias')
+            for name in commands.sortednames():
+                print(commands.get(name).comment)
+    """
+
+    def __init__(self, commands=None, warnings=None):
+        self.commands = list(commands) if commands else []
+        # Warning messages from parsing, see: parse_warnings()
+        self.warnings = warnings or []
+        # Name column (file order), and name -> positions index.
+        self._names = None
+        self._index = None
+        # Other views, built on demand.
+        self._views = {}
+
+    def __contains__(self, name):
+        """ Name lookup, like: 'myalias' in commands """
+        return name in self.index()
+
+    def __getitem__(self, position):
+        return self.commands[position]
+
+    def __iter__(self):
+        return iter(self.commands)
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __repr__(self):
+        return 'CommandCollection({} commands)'.format(len(self.commands))
+
+    def aliases(self):
+        """ Return a list of alias Command() objects, in file order. """
+        self._partition()
+        return self._views['aliases']
+
+    def append(self, cmd):
+        """ Add a Command() to the end of the collection. """
+        self.commands.append(cmd)
+        self.invalidate()
+
+    def exported(self):
+        """ Return a list of exported Command() objects, in file order. """
+        if 'exported' not in self._views:
+            self._views['exported'] = [
+                cmd
+                for cmd in self.commands
+                if cmd.export == Command.EXPORT_YES
+            ]
+        return self._views['exported']
+
+    def exports(self):
+        """ Return a set of exported names. """
+        if 'exports' not in self._views:
+            self._views['exports'] = frozenset(
+                cmd.name for cmd in self.exported())
+        return self._views['exports']
+
+    def find(self, name):
+        """ Return the position of the first command with this name,
+            or -1 if it doesn't exist.
+        """
+        positions = self.index().get(name, None)
+        return positions[0] if positions else -1
+
+    def functions(self):
+        """ Return a list of function Command() objects, in file order. """
+        self._partition()
+        return self._views['functions']
+
+    def get(self, name, default=None):
+        """ Return the first Command() with this name, or default. """
+        positions = self.index().get(name, None)
+        return self.commands[positions[0]] if positions else default
+
+    def getall(self, name):
+        """ Return a list of all Command() objects with this name. """
+        return [self.commands[i] for i in self.index().get(name, ())]
+
+    def getnocase(self, name, default=None):
+        """ Return the first Command() with this name (ignoring case),
+            or default.
+        """
+        if 'lowerindex' not in self._views:
+            lowerindex = {}
+            for position, cmdname in enumerate(self.names()):
+                lowerindex.setdefault(cmdname.lower(), position)
+            self._views['lowerindex'] = lowerindex
+        position = self._views['lowerindex'].get(name.lower(), None)
+        return default if position is None else self.commands[position]
+
+    def index(self):
+        """ Return the name index, {name: [positions]}. """
+        if self._index is None:
+            index = {}
+            for position, name in enumerate(self.names()):
+                positions = index.get(name, None)
+                if positions is None:
+                    index[name] = [position]
+                else:
+                    positions.append(position)
+            self._index = index
+        return self._index
+
+    def invalidate(self):
+        """ Rebuild all views when they are needed next.
+            This must be called when commands are modified in place.
+        """
+        self._names = None
+        self._index = None
+        self._views = {}
+
+    def names(self):
+        """ Return the name column, a list of names in file order. """
+        if self._names is None:
+            self._names = [cmd.name for cmd in self.commands]
+        return self._names
+
+    def remove(self, cmd):
+        """ Remove a Command() from the collection. """
+        self.commands.remove(cmd)
+        self.invalidate()
+
+    def rename(self, cmd, name):
+        """ Rename a Command() in the collection. """
+        cmd.name = name
+        self.invalidate()
+
+    def sortednames(self):
+        """ Return a sorted list of unique names. """
+        if 'sortednames' not in self._views:
+            self._views['sortednames'] = sorted(self.index())
+        return self._views['sortednames']
+
+    def _partition(self):
+        """ Build the alias/function partitions. """
+        if 'functions' in self._views:
+            return None
+        aliases = []
+        functions = []
+        for cmd in self.commands:
+            if cmd.isfunction():
+                functions.append(cmd)
+            else:
+                aliases.append(cmd)
+        self._views['aliases'] = aliases
+        self._views['functions'] = functions
+
+
+# Memory-mapped files ----------------------------------
+class MappedFile(object):
+
+    """ Read-only memory map of a file, iterated as lines (without the
+        trailing newlines), like contents.split('\\n') would be.
+        Lines are sliced out of the map one at a time using byte offsets,
+        so the whole file is never held in memory as a string or list.
+        It can be iterated more than once.
+
+        usage:
+            with MappedFile(filename) as mapped:
+                for line in mapped:
+                    print(line)
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        # mmap can't map empty files, they have no data.
+        self.data = None
+        with open(filename, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size:
+                self.data = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, tb):
+        self.close()
+        return False
+
+    def __iter__(self):
+        for offset, line in self.iter_offsets():
+            yield line
+
+    def close(self):
+        """ Close the memory map. """
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def iter_offsets(self):
+        """ Yield (byte offset, line) for each line in the file. """
+        data = self.data
+        if data is None:
+            yield 0, ''
+            return
+        find = data.find
+        start = 0
+        while True:
+            end = find('\n', start)
+            if end == -1:
+                yield start, data[start:self.size]
+                return
+            yield start, data[start:end]
+            start = end + 1
+
+
+# Functions ----------------------------------------
+
+
+def get_def_count(contents, defword):
+    """ Counts lines beginning with 'defword',
+        to retrieve actual 'alias' and 'function' defs in
+        the file. contents can be a string or an iterable of lines.
+        returns: count (Integer)
+    """
+
+    if not hasattr(contents, 'lower'):
+        # Already an iterable of lines (like MappedFile()).
+        lines = contents
+    elif '\n' in contents:
+        lines = contents.split('\n')
+    else:
+        lines = [contents]
+
+    cnt = 0
+    for line in lines:
+        if line.startswith(defword):
+            cnt += 1
+    return cnt
+
+
+def getfilecontents(aliasfile=None):
+    """ Return alias files raw content (string)
+        Raises AliasFileError if the file can't be found or read.
+    """
+    if aliasfile is None:
+        aliasfile = settings.get("aliasfile")
+
+    if not os.path.isfile(aliasfile):
+        raise AliasFileError('Alias file not found!:\n{}'.format(aliasfile))
+
+    # Load file
+    try:
+        with open(aliasfile, 'r') as fread:
+            filecontent = fread.read()
+        return filecontent
+    except (IOError, OSError) as exio:
+        raise AliasFileError(
+            'Unable to read file:\n{}\n{}'.format(aliasfile, str(exio)))
+
+
+def getfilemapped(aliasfile=None):
+    """ Return a MappedFile() for the alias file, for reading large files
+        without loading them into memory.
+        Raises AliasFileError if the file can't be found or read.
+    """
+    if aliasfile is None:
+        aliasfile = settings.get("aliasfile")
+
+    if not os.path.isfile(aliasfile):
+        raise AliasFileError('Alias file not found!:\n{}'.format(aliasfile))
+
+    try:
+        return MappedFile(aliasfile)
+    except EnvironmentError as exio:
+        raise AliasFileError(
+            'Unable to read file:\n{}\n{}'.format(aliasfile, str(exio)))
+
+
+def parsealiasline_old(sline):
+    """ old deprecated method of parsing alias info from a line. """
+    # Detect Alias --------------------------------
+    if (sline.startswith("alias")):
+        # Replace TABS/NEWLINE
+        sline = sline.replace('\t', '').replace('\n', '')
+
+        # Trim 'alias'
+        sbuf = sline.replace("alias ", "")
+
+        # Trim Comments
+        if "#" in sbuf:
+            sbuf = sbuf[:sbuf.index("#")]
+            # Get comment
+            scomment = sline[sline.index("#") + 1:]
+            # Trim leading space
+            scomment = scomment.strip(' ')
+        else:
+            # No Comment
+            scomment = ""
+
+        # Retrieve name and command, without quotes.
+        aliasparts = sbuf.split('=')
+        sname = aliasparts[0].strip(" ")
+        scommand = aliasparts[1].strip(" ").strip('"').strip("'")
+        # Add command to list (Name, Command, Comment, Exported)
+        # [Exported not needed for alias])
+        return Command(name=sname,
+                       cmd=[scommand],
+                       comment=scomment)
+    return None
+
+
+def parse_aliases(filecontents):
+    """ parse all aliases from file, return a list of Command() objects
+        filecontents can be a string or an iterable of lines.
+    """
+
+    # this one handles quotes inside of commands better...
+    name_pat = re.compile(r'alias[ ]?(?P<name>[\d\w_\-]+)=(?P<cmdinfo>.+)')
+    cmd_comment_pat = re.compile(r'(?P<command>.+)[#](?P<comment>.+)?')
+    cmd_nocomment_pat = re.compile(r'(?P<command>.+)')
+
+    lst_commands = []
+    # Get all alias lines, with (name, raw command and comment)
+    if hasattr(filecontents, 'lower'):
+        aliases = name_pat.findall(filecontents)
+    else:
+        aliases = (
+            m.groups()
+            for m in (name_pat.search(l) for l in filecontents)
+            if m)
+    for name, rawcmd in aliases:
+        # use regex for separating comments from command.
+        if '#' in rawcmd:
+            cmdmatch = cmd_comment_pat.search(rawcmd)
+        else:
+            # use normal regex.
+            cmdmatch = cmd_nocomment_pat.search(rawcmd)
+        if cmdmatch:
+            groups = cmdmatch.groupdict()
+            command = groups['command']
+            comment = groups.get('comment', '')
+
+        # Add alias to list as a Command() object...
+        lst_commands.append(
+            Command(
+                name=stripchars(name, ' \t\n'),
+                cmd=[stripquotes(stripchars(command, ' \t\n'))],
+                comment=stripchars(comment, '# \t\n'),
+                exported='[n/a]'))
+    return lst_commands
+
+
+def parse_exports(filecontents):
+    """ parse all exports from file contents, return a list of exported names.
+        filecontents can be a string or an iterable of lines.
+    """
+
+    exportpat = re.compile(r'export[ ]+?(?P<export>.+)', flags=re.MULTILINE)
+    if hasattr(filecontents, 'lower'):
+        exports = exportpat.findall(filecontents)
+    else:
+        exports = [
+            m.group(1)
+            for m in (exportpat.search(l) for l in filecontents)
+            if m]
+    if exports:
+        exports = [stripchars(e, ' \t\n') for e in exports]
+    return exports
+
+
+def parse_functions(filecontents):  # noqa
+    """ parse all functions from the alias file.
+        filecontents can be a string or an iterable of lines.
+    """
+
+    # Get all exports from the file
+    exports = parse_exports(filecontents)
+
+    # Parse all functions from the file.
+    # Flag for setting if we are inside a function
+    bfunction = False
+    # Flag for setting if we found function comments
+    bcomment = False
+    scomment = ''
+    # List of parsed Command() objects...
+    commands = []
+    # Temporary list for raw function contents
+    lst_contents = []
+
+    # Initialize Tab Depths
+    tabdepth = 0
+    spacedepth = 0
+
+    if hasattr(filecontents, 'lower'):
+        lines = filecontents.split('\n')
+    else:
+        lines = filecontents
+
+    for sline in lines:
+
+        # Detect Function -------------------------------
+        if sline.replace('\t', '').replace(' ', '').startswith("function"):
+            # Grab function name
+            ssplit = sline.split(" ")
+            sname = ssplit[1].replace('\n', '').replace("()", "")
+
+            # Find initial tab/space depth
+            if tabdepth == 0:
+                if sline.startswith('\t'):
+                    sbuf = sline
+                    tabdepth, sbuf = trimcount(sbuf, '\t')
+
+            if spacedepth == 0:
+                if sline.startswith(" "):
+                    sbuf = sline
+                    spacedepth, sbuf = trimcount(sbuf, ' ')
+
+            # We are now inside a function
+            bfunction = True
+        # Inside Function ----------------------------------
+        if bfunction:
+            # Detect comment
+            if sline.replace('\t', '').replace(' ', '').startswith("#"):
+                # First comment only
+                if not bcomment:
+                    # Found comment
+                    scomment = sline.replace('\t', '').replace('\n', '')[1:]
+                    scomment = scomment.strip(' ')
+                    # Set flag
+                    bcomment = True
+
+            # Add raw contents
+            # Skip over function definition if multi-line function
+            if not sline.strip(" ").replace('\n', '').endswith("()"):
+                lst_contents.append(sline.replace('\n', ''))
+
+            # Found end of function (could be a single line though)
+            # Parse contents, decide which to keep
+            if ((sline.strip().replace('\n', '').endswith(" }")) or
+                    (sline.replace('\n', '')
+                        .replace('\t', '').replace(' ', '') == "}")):
+                # End of function
+                bfunction = False
+                # Reset comment finder
+                bcomment = False
+
+                # Keep function contents
+                lst_keep = []
+                for itm in lst_contents:
+                    # Save trimmed version of line
+                    strim = itm.replace('\t', '').replace(
+                        ' ', '').replace('\n', '')
+                    snotabs = itm.replace('\t', '').replace('\n', '')
+                    # Figure out which contents to keep. No Braces.
+                    # and (not strim.startswith("#")):
+                    if (strim != "{") and (strim != "}"):
+                        # Trim single line definition
+                        if "()" in itm:
+                            itm = itm[itm.index("()") + 2:]
+                            snotabs = itm.replace('\t', '').replace('\n', '')
+                            strim = snotabs.replace(' ', '')
+                            if strim.startswith("{"):
+                                snotabs = snotabs[snotabs.index("{") + 1:]
+                                if snotabs.endswith("}"):
+                                    snotabs = snotabs[:snotabs.index("}")]
+                                itm = snotabs
+                        # Trim leading { and following }...
+                        if snotabs.startswith("{"):
+                            snotabs = snotabs[1:]
+                            if snotabs.endswith("}"):
+                                snotabs = snotabs[:len(snotabs) - 1]
+                            itm = snotabs
+                        # Trim initial tabdepth from itm
+                        if itm.startswith('\t'):
+
+                            itm = itm[tabdepth:]
+                            # Trim one more tab depth
+                            if itm.startswith('\t'):
+                                itm = itm[1:]
+
+                        # Append Function Contents, don't add initial coment
+                        is_initcomment = (
+                            itm.startswith("#") and (scomment in itm)
+                        )
+
+                        if (scomment and not is_initcomment):
+                            lst_keep.append(itm)
+                        elif scomment == "":
+                            lst_keep.append(itm)
+
+                # Append function name/contents/comment /exported [set with
+                # fixexports()]
+                sexported = 'Yes' if (sname in exports) else 'No'
+                commands.append(Command(name=sname,
+                                        cmd=lst_keep,
+                                        comment=scomment,
+                                        exported=sexported))
+
+                # Reset comment string
+                scomment = ''
+                # Reset contents finder list
+                lst_contents = []
+    # Return finished list
+    return commands
+
+
+class AliasParser(object):
+
+    """ Single-pass parser for alias files.
+        Each line is classified once, collecting aliases, functions,
+        exports, and the 'alias'/'function' definition line counts together.
+        The Command() lists produced are identical to the ones from
+        parse_aliases() and parse_functions().
+        Each Command() gets its line span and byte offsets in the file.
+
+        usage:
+            parser = AliasParser().parse(filecontents.split('\\n'))
+            commands = parser.commands()
+
+        With snapshot=True, the contents are kept so the file can be
+        re-parsed incrementally with reparse(). The contents are not
+        pickled with the results (see: ParseCache), they are read from the
+        file again when needed.
+        With keep=False, commands are only yielded by iter_parse(), and not
+        collected (for streaming huge files).
+    """
+
+    # Same patterns used by parse_aliases() and parse_exports().
+    alias_pat = re.compile(r'alias[ ]?(?P<name>[\d\w_\-]+)=(?P<cmdinfo>.+)')
+    export_pat = re.compile(r'export[ ]+?(?P<export>.+)')
+
+    def __init__(self, snapshot=False, keep=True):
+        # Collect commands, or only yield them (see: iter_parse()).
+        self.keep = keep
+        # Absolute path for the parsed file, if it came from a file.
+        self.filename = None
+        # Original contents, when a snapshot is kept for reparse().
+        self._contents = None
+        # (mtime, size) of the file when it was read, see: parse_file()
+        self.filestat = None
+        self.snapshot = snapshot
+        # Parsed Command() objects, in file order.
+        self.aliases = []
+        self.functions = []
+        # Exported names, and the line they were found on, in file order.
+        self.exports = []
+        self.exportlines = []
+        # Lines starting with 'alias' and 'function' (for validation).
+        self.aliascount = 0
+        self.functioncount = 0
+        # Current line number and byte offset.
+        self.lineno = 0
+        self.offset = 0
+        # Commands completed by the current line, used by iter_parse().
+        self._completed = None
+
+        # Last alias command/comment, reused when a command can't be split
+        # from its comment (like parse_aliases() does).
+        self._lastalias = None
+        # Function parsing state.
+        self._infunction = False
+        self._hascomment = False
+        self._funcname = ''
+        self._funccomment = ''
+        self._funclines = []
+        self._funcstart = None
+        self._tabdepth = 0
+        self._spacedepth = 0
+        # Line numbers where the tab/space depths were set.
+        self._tabline = None
+        self._spaceline = None
+
+    def __getstate__(self):
+        """ Pickle without the contents, they are read again on demand. """
+        state = self.__dict__.copy()
+        state['_contents'] = None
+        return state
+
+    def commands(self):
+        """ Return all parsed Command() objects, aliases first. """
+        return self.aliases + self.functions
+
+    @property
+    def contents(self):
+        """ Original contents, when a snapshot is kept.
+            For results loaded from the parse cache, the file is read again
+            on first use. None if it changed since it was parsed.
+        """
+        if (self._contents is None) and self.snapshot and (
+                self.filename and self.filestat):
+            try:
+                filecontents = getfilecontents(aliasfile=self.filename)
+                st = os.stat(self.filename)
+            except (AliasFileError, IOError, OSError):
+                return None
+            if (stat_key(st) == self.filestat) and (
+                    len(filecontents) == st.st_size):
+                self._contents = filecontents
+        return self._contents
+
+    @contents.setter
+    def contents(self, value):
+        self._contents = value
+
+    def feed(self, sline):
+        """ Parse a single line (without the trailing newline). """
+        if sline.startswith('alias'):
+            self.aliascount += 1
+        elif sline.startswith('function'):
+            self.functioncount += 1
+        if 'alias' in sline:
+            self._parse_alias(sline)
+        if 'export' in sline:
+            exportmatch = self.export_pat.search(sline)
+            if exportmatch:
+                self.exports.append(exportmatch.group(1).strip(' \t\n'))
+                self.exportlines.append(self.lineno)
+        # Only function definitions and function content need more parsing.
+        snotabs = sline.lstrip(' \t')
+        if self._infunction or snotabs.startswith('f'):
+            self._parse_function(sline, snotabs)
+        self.lineno += 1
+        self.offset += len(sline) + 1
+
+    def finish(self):
+        """ Set the exported state for all parsed functions.
+            This can't be done until all exports have been seen.
+            Returns this parser, for chaining.
+        """
+        exports = set(self.exports)
+        for cmd in self.functions:
+            cmd.export = (
+                Command.EXPORT_YES if (cmd.name in exports)
+                else Command.EXPORT_NO)
+            if self.snapshot:
+                cmd.set_parsed()
+        return self
+
+    def keep_snapshot(self):
+        """ Keep a snapshot for results that were parsed without one
+            (like parse cache entries from the command line), so changes
+            can be found with ismodified(). The contents are read when
+            they are needed.
+        """
+        if self.snapshot:
+            return None
+        self.snapshot = True
+        for cmd in self.commands():
+            cmd.set_parsed()
+
+    def iter_parse(self, lines, exports=None):
+        """ Parse an iterable of lines, yielding Command() objects as they
+            are completed. finish() must be called when this is exhausted
+            to set the exported state for functions, unless a set of
+            exported names is given (see: scan_exports()). In that case
+            functions have their exported state set before they are yielded.
+        """
+        completed = self._completed = []
+        try:
+            for sline in lines:
+                self.feed(sline)
+                if not completed:
+                    continue
+                for cmd in completed:
+                    if (exports is not None) and (
+                            cmd.export != Command.EXPORT_NA):
+                        cmd.export = (
+                            Command.EXPORT_YES if (cmd.name in exports)
+                            else Command.EXPORT_NO)
+                    yield cmd
+                del completed[:]
+        finally:
+            self._completed = None
+
+    def parse(self, lines):
+        """ Parse an iterable of lines, and finish.
+            Returns this parser, for chaining.
+        """
+        for sline in lines:
+            self.feed(sline)
+        return self.finish()
+
+    def parse_contents(self, filecontents):
+        """ Parse a string of file contents, and finish.
+            The contents are kept if this parser keeps a snapshot.
+            Returns this parser, for chaining.
+        """
+        if self.snapshot:
+            self.contents = filecontents
+        return self.parse(filecontents.split('\n'))
+
+    def reparse(self, filecontents):
+        """ Parse new contents for the same file, re-tokenizing only the
+            changed region. Definitions outside of it, and definitions
+            that came out the same, are reused (same Command() objects,
+            with updated spans).
+            Commands modified since they were parsed are never reused.
+            Reused commands are moved, this parser shouldn't be used after.
+            Returns a new finished AliasParser(), or this one if the
+            contents and commands are the same.
+        """
+        if filecontents == self.contents:
+            if not any(cmd.ismodified() for cmd in self.commands()):
+                return self
+            # Same file, but some commands were changed and not saved.
+            parser = copy.copy(self)
+            parser.contents = filecontents
+            parser.aliases = self._reuse(self.aliases, 0, 0, None)
+            parser.functions = self._reuse(self.functions, 0, 0, None)
+            return parser
+        if self.contents is None:
+            parser = AliasParser(snapshot=True)
+            parser.filename = self.filename
+            return parser.parse_contents(filecontents)
+
+        oldlines = self.contents.split('\n')
+        newlines = filecontents.split('\n')
+        # Find the changed lines, [start, newend) in the new lines.
+        maxsame = min(len(oldlines), len(newlines))
+        start = 0
+        while (start < maxsame) and (oldlines[start] == newlines[start]):
+            start += 1
+        samecnt = 0
+        while ((samecnt < (maxsame - start)) and
+               (oldlines[-1 - samecnt] == newlines[-1 - samecnt])):
+            samecnt += 1
+        newend = len(newlines) - samecnt
+        linedelta = len(newlines) - len(oldlines)
+
+        # Restart at the beginning of the function holding the first change.
+        functionstarts = [c.span[0] for c in self.functions]
+        restart = start
+        index = bisect.bisect_right(functionstarts, start - 1) - 1
+        if (index > -1) and (self.functions[index].span[1] > start):
+            restart = functionstarts[index]
+        if (self._funcstart is not None) and (self._funcstart[0] < restart):
+            # Unfinished function at the end of the old file.
+            restart = self._funcstart[0]
+
+        parser = AliasParser(snapshot=True)
+        parser.filename = self.filename
+        parser.contents = filecontents
+        parser._restore(self, restart, oldlines)
+
+        aliasstarts = [c.span[0] for c in self.aliases]
+        # Feed changed lines until the parser state matches the old state
+        # at the same place in the unchanged lines.
+        oldresume = None
+        for lineno in xrange(restart, len(newlines)):
+            if lineno >= newend:
+                oldlineno = lineno - linedelta
+                if self._can_resume(parser, oldlineno, oldlines,
+                                    functionstarts, aliasstarts):
+                    oldresume = oldlineno
+                    break
+            parser.feed(newlines[lineno])
+
+        # Definition line counts, minus the old lines that were replaced.
+        for sline in oldlines[restart:oldresume]:
+            if sline.startswith('alias'):
+                parser.aliascount -= 1
+            elif sline.startswith('function'):
+                parser.functioncount -= 1
+        parser.aliascount += self.aliascount
+        parser.functioncount += self.functioncount
+
+        # Definitions that came out the same can be reused.
+        olddefs = {}
+        for cmd in self._definitions(restart, oldresume):
+            if not cmd.ismodified():
+                olddefs.setdefault(cmd.parsed, []).append(cmd)
+        exportnames = set(self.exports[:bisect.bisect_left(
+            self.exportlines, restart)])
+        exportnames.update(parser.exports)
+        if oldresume is not None:
+            exportindex = bisect.bisect_left(self.exportlines, oldresume)
+            exportnames.update(self.exports[exportindex:])
+        for cmds, isfunction in ((parser.aliases, False),
+                                 (parser.functions, True)):
+            for i, cmd in enumerate(cmds):
+                if isfunction:
+                    cmd.export = (
+                        Command.EXPORT_YES if (cmd.name in exportnames)
+                        else Command.EXPORT_NO)
+                cmd.set_parsed()
+                matches = olddefs.get(cmd.parsed, None)
+                if matches:
+                    oldcmd = matches.pop(0)
+                    oldcmd.span, oldcmd.offsets = cmd.span, cmd.offsets
+                    cmds[i] = oldcmd
+
+        # Assemble old definitions before and after the changed region.
+        offsetdelta = (len(filecontents) - len(self.contents))
+        if oldresume is None:
+            suffix = ([], [])
+        else:
+            suffix = (
+                self.aliases[bisect.bisect_left(aliasstarts, oldresume):],
+                self.functions[bisect.bisect_left(functionstarts, oldresume):])
+            parser._resume(self, oldresume, linedelta, offsetdelta)
+        prefix = (
+            self.aliases[:bisect.bisect_left(aliasstarts, restart)],
+            self.functions[:bisect.bisect_left(functionstarts, restart)])
+        parser.aliases = self._reuse(
+            prefix[0], 0, 0, None) + parser.aliases + self._reuse(
+            suffix[0], linedelta, offsetdelta, None)
+        parser.functions = self._reuse(
+            prefix[1], 0, 0, exportnames) + parser.functions + self._reuse(
+            suffix[1], linedelta, offsetdelta, exportnames)
+        return parser
+
+    def _can_resume(
+            self, parser, oldlineno, oldlines, functionstarts, aliasstarts):
+        """ Returns True if the old parser state before line 'oldlineno'
+            matches the state of a new parser, so the rest of the old
+            definitions can be reused.
+        """
+        if parser._infunction:
+            return False
+        if (self._funcstart is not None) and (
+                self._funcstart[0] < oldlineno):
+            return False
+        index = bisect.bisect_right(functionstarts, oldlineno - 1) - 1
+        if (index > -1) and (self.functions[index].span[1] > oldlineno):
+            # Inside of an old function.
+            return False
+        tabdepth = self._tabdepth if (
+            (self._tabline is not None) and
+            (self._tabline < oldlineno)) else 0
+        spacedepth = self._spacedepth if (
+            (self._spaceline is not None) and
+            (self._spaceline < oldlineno)) else 0
+        if (tabdepth, spacedepth) != (parser._tabdepth, parser._spacedepth):
+            return False
+        index = bisect.bisect_left(aliasstarts, oldlineno)
+        lastalias = None
+        if index > 0:
+            name, cmd, comment, exported = self.aliases[index - 1].parsed
+            lastalias = (cmd[0], comment)
+        if (lastalias == parser._lastalias) or (index == len(aliasstarts)):
+            return True
+        # The last alias only matters if the next one falls back to it.
+        return not self._alias_fallback(oldlines[aliasstarts[index]])
+
+    def _alias_fallback(self, sline):
+        """ Returns True if the alias on this line can't be split from its
+            comment, and uses the last alias command/comment instead.
+        """
+        name, rawcmd = self.alias_pat.search(sline).groups()
+        return ('#' in rawcmd) and (rawcmd.rindex('#') == 0)
+
+    def _definitions(self, start, end):
+        """ Return old Command() objects starting in lines [start, end).
+            If end is None, all commands after start are returned.
+        """
+        return [
+            cmd
+            for cmd in self.aliases + self.functions
+            if (cmd.span[0] >= start) and (
+                (end is None) or (cmd.span[0] < end))
+        ]
+
+    def _restore(self, old, lineno, oldlines):
+        """ Restore parser state from an old parser, as it was before
+            'lineno' was parsed. Only used for lines outside of functions.
+        """
+        self.lineno = lineno
+        self.offset = sum(map(len, oldlines[:lineno])) + lineno
+        if (old._tabline is not None) and (old._tabline < lineno):
+            self._tabdepth, self._tabline = old._tabdepth, old._tabline
+        if (old._spaceline is not None) and (old._spaceline < lineno):
+            self._spacedepth, self._spaceline = (
+                old._spacedepth, old._spaceline)
+        for cmd in reversed(old.aliases):
+            if cmd.span[0] < lineno:
+                name, cmdlines, comment, exported = cmd.parsed
+                self._lastalias = (cmdlines[0], comment)
+                break
+        # Old exports before this line.
+        exportindex = bisect.bisect_left(old.exportlines, lineno)
+        self.exports = old.exports[:exportindex]
+        self.exportlines = old.exportlines[:exportindex]
+
+    def _resume(self, old, oldlineno, linedelta, offsetdelta):
+        """ Copy the old parser's state after 'oldlineno' (where the
+            unchanged lines begin) into this parser.
+        """
+        exportindex = bisect.bisect_left(old.exportlines, oldlineno)
+        self.exports.extend(old.exports[exportindex:])
+        self.exportlines.extend(
+            l + linedelta for l in old.exportlines[exportindex:])
+        if (old._tabline is not None) and (old._tabline >= oldlineno):
+            self._tabdepth = old._tabdepth
+            self._tabline = old._tabline + linedelta
+        if (old._spaceline is not None) and (old._spaceline >= oldlineno):
+            self._spacedepth = old._spacedepth
+            self._spaceline = old._spaceline + linedelta
+        if old.aliases and (old.aliases[-1].span[0] >= oldlineno):
+            self._lastalias = old._lastalias
+        self._infunction = old._infunction
+        self._hascomment = old._hascomment
+        self._funcname = old._funcname
+        self._funccomment = old._funccomment
+        self._funclines = old._funclines[:]
+        if old._funcstart is not None:
+            startline, startoffset = old._funcstart
+            self._funcstart = (
+                startline + linedelta, startoffset + offsetdelta)
+        self.lineno = old.lineno + linedelta
+        self.offset = old.offset + offsetdelta
+
+    @staticmethod
+    def _reuse(cmds, linedelta, offsetdelta, exportnames):
+        """ Reuse old Command() objects, moving their spans.
+            Modified commands are rebuilt from their parsed info,
+            and functions with a changed export status are copied.
+            If exportnames is None, exports are not checked (aliases).
+        """
+        reused = []
+        for cmd in cmds:
+            if cmd.ismodified():
+                cmd = Command.from_parsed(cmd)
+            if exportnames is not None:
+                export = (
+                    Command.EXPORT_YES if (cmd.name in exportnames)
+                    else Command.EXPORT_NO)
+                if export != cmd.export:
+                    cmd = Command.from_parsed(cmd, exported=export)
+            if linedelta or offsetdelta:
+                startline, endline = cmd.span
+                startoffset, endoffset = cmd.offsets
+                cmd.span = (startline + linedelta, endline + linedelta)
+                cmd.offsets = (
+                    startoffset + offsetdelta, endoffset + offsetdelta)
+            reused.append(cmd)
+        return reused
+
+    def _parse_alias(self, sline):
+        """ Parse an alias definition from a line, if there is one. """
+        aliasmatch = self.alias_pat.search(sline)
+        if aliasmatch is None:
+            return None
+        name, rawcmd = aliasmatch.groups()
+        if '#' in rawcmd:
+            # Comment starts at the last '#', but not at the first char.
+            commentindex = rawcmd.rindex('#')
+            if commentindex > 0:
+                self._lastalias = (
+                    stripquotes(rawcmd[:commentindex].strip(' \t\n')),
+                    rawcmd[commentindex + 1:].strip('# \t\n'))
+            elif self._lastalias is None:
+                self._lastalias = (stripquotes(rawcmd.strip(' \t\n')), '')
+        else:
+            self._lastalias = (stripquotes(rawcmd.strip(' \t\n')), '')
+
+        command, comment = self._lastalias
+        cmd = Command(
+            name=name,
+            cmd=[command],
+            comment=comment,
+            exported=Command.EXPORT_NA)
+        cmd.span = (self.lineno, self.lineno + 1)
+        cmd.offsets = (self.offset, self.offset + len(sline))
+        if self.snapshot:
+            cmd.set_parsed()
+        if self.keep:
+            self.aliases.append(cmd)
+        if self._completed is not None:
+            self._completed.append(cmd)
+
+    def _parse_function(self, sline, snotabs):
+        """ Handle function state for a line, see: parse_functions()
+            snotabs is the line without leading spaces/tabs.
+        """
+        # Detect Function
+        if (snotabs.startswith('function') or
+                (snotabs.startswith('f') and
+                 sline.replace('\t', '').replace(' ', '').startswith(
+                     'function'))):
+            self._funcname = sline.split(' ')[1].replace('()', '')
+            # Find initial tab/space depth
+            if (self._tabdepth == 0) and sline.startswith('\t'):
+                self._tabdepth = len(sline) - len(sline.lstrip('\t'))
+                self._tabline = self.lineno
+            if (self._spacedepth == 0) and sline.startswith(' '):
+                self._spacedepth = len(sline) - len(sline.lstrip(' '))
+                self._spaceline = self.lineno
+            if not self._infunction:
+                self._funcstart = (self.lineno, self.offset)
+            self._infunction = True
+
+        if not self._infunction:
+            return None
+
+        # First comment is the function comment.
+        if (not self._hascomment) and snotabs.startswith('#'):
+            self._funccomment = sline.replace('\t', '')[1:].strip(' ')
+            self._hascomment = True
+
+        # Skip over function definition if multi-line function
+        if not sline.strip(' ').endswith('()'):
+            self._funclines.append(sline)
+
+        # Found end of function (could be a single line though)
+        if sline.strip().endswith(' }') or (sline.strip(' \t') == '}'):
+            cmd = Command(name=self._funcname,
+                          cmd=function_body(self._funclines,
+                                            self._tabdepth,
+                                            self._funccomment),
+                          comment=self._funccomment)
+            startline, startoffset = self._funcstart
+            cmd.span = (startline, self.lineno + 1)
+            cmd.offsets = (startoffset, self.offset + len(sline))
+            if self.keep:
+                self.functions.append(cmd)
+            if self._completed is not None:
+                self._completed.append(cmd)
+            self._infunction = False
+            self._hascomment = False
+            self._funccomment = ''
+            self._funclines = []
+            self._funcstart = None
+
+
+def function_body(lines, tabdepth, comment):
+    """ Trim raw function lines down to the function's command lines.
+        Braces, the definition, and the initial comment are removed.
+        Matches the content kept by parse_functions().
+    """
+    body = []
+    for itm in lines:
+        # No Braces.
+        strim = itm.strip(' \t')
+        if (strim == '{') or (strim == '}'):
+            continue
+        if '()' in itm:
+            # Trim single line definition
+            itm = itm[itm.index('()') + 2:]
+            snotabs = itm.replace('\t', '')
+            if snotabs.replace(' ', '').startswith('{'):
+                snotabs = snotabs[snotabs.index('{') + 1:]
+                if snotabs.endswith('}'):
+                    snotabs = snotabs[:snotabs.index('}')]
+                itm = snotabs
+            if snotabs.startswith('{'):
+                snotabs = snotabs[1:]
+                if snotabs.endswith('}'):
+                    snotabs = snotabs[:-1]
+                itm = snotabs
+        elif itm.lstrip('\t').startswith('{'):
+            # Trim leading { and following }...
+            snotabs = itm.replace('\t', '')[1:]
+            if snotabs.endswith('}'):
+                snotabs = snotabs[:-1]
+            itm = snotabs
+        # Trim initial tabdepth, and one more tab depth.
+        if itm.startswith('\t'):
+            itm = itm[tabdepth:]
+            if itm.startswith('\t'):
+                itm = itm[1:]
+        # Don't add initial comment.
+        if (not comment) or not (itm.startswith('#') and (comment in itm)):
+            body.append(itm)
+    return body
+
+
+def parse_contents(filecontents, filename=None):
+    """ Parse aliases, functions, exports, and definition counts from
+        alias file contents in a single pass.
+        The contents are kept with the results, for AliasParser.reparse().
+        Returns a finished AliasParser().
+    """
+    parser = AliasParser(snapshot=True)
+    if filename:
+        parser.filename = os.path.abspath(filename)
+    return parser.parse_contents(filecontents)
+
+
+def scan_exports(mapped):
+    """ Return a set of exported names from a MappedFile(), with one regex
+        scan over the whole map. Names are the same as parse_exports() finds.
+    """
+    if mapped.data is None:
+        return set()
+    return set(
+        m.group(1).strip(' \t\n')
+        for m in AliasParser.export_pat.finditer(mapped.data))
+
+
+def parse_file(aliasfile=None, usecache=None, previous=None, snapshot=True):
+    """ Parse an alias file, using the parse cache when possible.
+        If usecache is None, the 'cache' setting decides.
+        If previous parse results for the same file are given, only the
+        changed part of the file is re-parsed (see AliasParser.reparse()).
+        If snapshot is False, the file is read through a memory map and
+        the contents are not kept (the results can't be re-parsed).
+        Returns a finished AliasParser().
+        Raises AliasFileError if the file can't be found or read.
+    """
+    if aliasfile is None:
+        aliasfile = settings.get("aliasfile")
+    if usecache is None:
+        usecache = (settings.get('cache') != 'false')
+    if (previous is not None) and (
+            previous.filename != os.path.abspath(aliasfile)):
+        previous = None
+
+    try:
+        filest = os.stat(aliasfile)
+    except (IOError, OSError):
+        # getfilecontents() will raise the error.
+        filest = None
+    st = filest if usecache else None
+    if (st is not None) and (previous is None):
+        parsed = parsecache.get(aliasfile, st)
+        if parsed is not None:
+            parsed.filestat = stat_key(filest)
+            if snapshot:
+                parsed.keep_snapshot()
+            return parsed
+    if (not snapshot) and (previous is None):
+        return parse_mapped(aliasfile, st=st)
+
+    filecontents = getfilecontents(aliasfile=aliasfile)
+    if previous is not None:
+        parsed = previous.reparse(filecontents)
+        if (st is not None) and (parsed is not previous):
+            parsecache.put(aliasfile, st, filecontents, parsed)
+    elif st is None:
+        parsed = parse_contents(filecontents, filename=aliasfile)
+    else:
+        # File was touched, but the contents may be the same.
+        parsed = parsecache.get(aliasfile, st, contents=filecontents)
+        if parsed is None:
+            parsed = parse_contents(filecontents, filename=aliasfile)
+            parsecache.put(aliasfile, st, filecontents, parsed)
+        else:
+            parsed.keep_snapshot()
+            parsed.contents = filecontents
+    # Stat info from before the read, a file changed while reading it
+    # won't match later.
+    parsed.filestat = stat_key(filest)
+    return parsed
+
+
+def stat_key(st):
+    """ Return (mtime, size) for os.stat() results, or None. """
+    if st is None:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def iter_commands(aliasfile=None, usecache=None):
+    """ Yield Command() objects from an alias file as they are parsed,
+        in the order they are completed in the file.
+        Function export states come from a quick scan of the file first.
+        If usecache is None, the 'cache' setting decides. A valid cache
+        entry is used instead of parsing, in the same order. Otherwise
+        the commands are kept while streaming, and stored in the cache
+        when the file has been parsed. If the caller stops early, the
+        rest of the file is parsed (without yielding) so the entry is
+        complete. Without the cache, commands are not kept, so memory use
+        stays flat for huge files.
+        Raises AliasFileError if the file can't be found or read.
+    """
+    if aliasfile is None:
+        aliasfile = settings.get("aliasfile")
+    if usecache is None:
+        usecache = (settings.get('cache') != 'false')
+    st = None
+    if usecache:
+        try:
+            st = os.stat(aliasfile)
+        except (IOError, OSError):
+            # getfilemapped() will raise the error.
+            st = None
+        parsed = None if st is None else parsecache.get(aliasfile, st)
+        if parsed is not None:
+            # Aliases come before functions completed on the same line.
+            for cmd in sorted(parsed.commands(), key=lambda c: c.span[1]):
+                yield cmd
+            return
+
+    mapped = getfilemapped(aliasfile=aliasfile)
+    with mapped:
+        # mmap objects can be hashed without copying them.
+        hashable = mapped.data or ''
+        if st is not None:
+            # File was touched, but the contents may be the same.
+            parsed = parsecache.get(aliasfile, st, contents=hashable)
+            if parsed is not None:
+                for cmd in sorted(parsed.commands(), key=lambda c: c.span[1]):
+                    yield cmd
+                return
+        parser = AliasParser(keep=(st is not None))
+        exports = scan_exports(mapped)
+        lines = iter(mapped)
+        commands = parser.iter_parse(lines, exports=exports)
+        try:
+            for cmd in commands:
+                yield cmd
+        except GeneratorExit:
+            if st is None:
+                raise
+            # Stopped early, parse the rest for the cache entry.
+            commands.close()
+            for sline in lines:
+                parser.feed(sline)
+        if st is not None:
+            parser.finish()
+            parser.filename = os.path.abspath(aliasfile)
+            parsecache.put(aliasfile, st, hashable, parser)
+
+
+def parse_mapped(aliasfile, st=None):
+    """ Parse an alias file through a memory map, without reading it into
+        memory. If os.stat() info is given, the parse cache is checked
+        by content hash and updated.
+        Returns a finished AliasParser() (without a snapshot).
+        Raises AliasFileError if the file can't be found or read.
+    """
+    mapped = getfilemapped(aliasfile=aliasfile)
+    with mapped:
+        # mmap objects can be hashed without copying them.
+        hashable = mapped.data or ''
+        if st is not None:
+            parsed = parsecache.get(aliasfile, st, contents=hashable)
+            if parsed is not None:
+                return parsed
+        parsed = AliasParser().parse(mapped)
+        parsed.filename = os.path.abspath(aliasfile)
+        if st is not None:
+            parsecache.put(aliasfile, st, hashable, parsed)
+    return parsed
+
+
+def parse_warnings(parsed):
+    """ Return a list of warning messages for a finished AliasParser(),
+        when some 'alias'/'function' lines could not be parsed.
+    """
+    aliases = parsed.aliases
+    functions = parsed.functions
+    aliaslinecnt = parsed.aliascount
+    functionlinecnt = parsed.functioncount
+    # Validate parsing of aliases/functions
+    warnmsg = []
+    if aliaslinecnt != len(aliases):
+        msg = 'Could not parse all aliases, may be missing some.\n{}\n{}'
+        msg = msg.format('     alias lines: {}'.format(str(aliaslinecnt)),
+                         '  parsed aliases: {}'.format(str(len(aliases))))
+        warnmsg.append(msg)
+    if functionlinecnt != len(functions):
+        msg = 'Could not parse all functions, may be missing some.\n{}\n{}'
+        msg = msg.format('  function lines: {}'.format(str(functionlinecnt)),
+                         'parsed functions: {}'.format(str(len(functions))))
+        warnmsg.append(msg)
+    return warnmsg
+
+
+def readfile(aliasfile=None, usecache=None):
+    """ Read alias/script file, return a CommandCollection() of command()
+        objects, with any parse_warnings() in its warnings attribute.
+        Cached parse results are used when the file hasn't changed.
+        Large files are read through a memory map, see: parse_mapped()
+        Raises AliasFileError if the file can't be found or read.
+    """
+    parsed = parse_file(
+        aliasfile=aliasfile,
+        usecache=usecache,
+        snapshot=False)
+    return CommandCollection(
+        parsed.commands(),
+        warnings=parse_warnings(parsed))
+
+
+def readexports():
+    """ Reads exports only, returns a list of exports """
+    aliasfile = settings.get("aliasfile")
+    with open(aliasfile, 'r') as fread:
+        # Temp list for exports
+        lst_temp = []
+        # Get file contents
+        slines = fread.readlines()
+
+        for sline in slines:
+            snotabs = sline.replace('\t', '').replace('\n', '')
+            if snotabs.startswith("export"):
+                # Found export, retrieve name
+                lst_temp.append(snotabs.split(" ")[1])
+
+        # Finished with file, return list of exports
+        return lst_temp
+
+    return False
+
+
+class Serializer(object):
+
+    """ Writes Command() objects as an alias file, in the format the
+        parser reads. Aliases come first (sorted by line), then functions
+        (sorted by name, file order for duplicate names), then exports.
+        When the commands came from a parsed snapshot of the same file,
+        save() only splices the changed definitions into it instead
+        (see: splice_edits()).
+        usage:
+            Serializer(commands).save(filename)
+            Serializer(commands).save(filename, parsed=parser)
+            Serializer(commands).write(fileobject)
+            contents = Serializer(commands).to_string()
+    """
+
+    # Approximate size of the function chunks from iter_chunks().
+    chunksize = 64 * 1024
+    # Largest change save() will patch into a file in place.
+    patchsize = 4096
+    # Export lines that splice_edits() can remove.
+    export_line_pat = re.compile(
+        r'^[ \t]*export[ \t]+(?P<name>[^\s=;#]+)[ \t]*(?:\n|$)',
+        flags=re.MULTILINE)
+
+    def __init__(self, commands):
+        # Any iterable of Command() objects, like a CommandCollection().
+        self.commands = commands
+        # How the last save() wrote the file:
+        #   'full', 'splice', 'inplace', or 'unchanged'.
+        self.savemode = None
+        # Number of edits spliced by the last save().
+        self.editcount = 0
+        # Contents written by the last save(keep=True), see: saved_parser()
+        self.contents = None
+
+    @staticmethod
+    def alias_line(cmd):
+        """ Return the file line for an alias Command(). """
+        # Fix quotes around command
+        if '"' in cmd.cmd[0]:
+            scmd = "'" + cmd.cmd[0] + "'"
+        else:
+            scmd = '"' + cmd.cmd[0] + '"'
+        scomment = Serializer.comment(cmd)
+        if scomment:
+            scmd = ' '.join((scmd, scomment))
+        return 'alias {}={}\n'.format(cmd.name, scmd)
+
+    def can_splice(self, filename, parsed):
+        """ Returns True if a parsed snapshot is usable for splicing
+            changes into filename. It must be from the same file, and the
+            file can't have changed since it was read.
+        """
+        if (parsed is None) or (parsed.filestat is None) or (
+                parsed.filename != os.path.abspath(filename)):
+            return False
+        try:
+            st = os.stat(filename)
+        except (IOError, OSError):
+            return False
+        if stat_key(st) != parsed.filestat:
+            return False
+        # Cached results read the contents now.
+        return parsed.contents is not None
+
+    @staticmethod
+    def comment(cmd):
+        """ Return a Command()'s comment, with a comment char. """
+        scomment = cmd.comment
+        if scomment and (not scomment.startswith('#')):
+            scomment = ' '.join(('#', scomment))
+        return scomment
+
+    @staticmethod
+    def function_text(cmd):
+        """ Return the file text for a function Command(). """
+        scomment = Serializer.comment(cmd)
+        return ''.join((
+            '\nfunction ',
+            cmd.name,
+            '()\n{\n',
+            '\t{}\n'.format(scomment) if scomment else '',
+            '\t',
+            '\n\t'.join(cmd.cmd),
+            '\n}\n'))
+
+    def iter_chunks(self):
+        """ Yield the file contents in chunks of about chunksize.
+            Commands are sorted once, function text is only built while
+            it's being written.
+        """
+        aliaslines = set()
+        functions = []
+        exports = set()
+        for cmd in sorted(self.commands, key=lambda c: c.name):
+            if len(cmd.cmd) > 1:
+                functions.append(cmd)
+            else:
+                aliaslines.add(self.alias_line(cmd))
+            if cmd.export == Command.EXPORT_YES:
+                exports.add('export {}\n'.format(cmd.name))
+
+        yield FILE_HEADER.format(settings=settings)
+        yield '\n\n# Aliases:\n'
+        yield ''.join(sorted(aliaslines))
+        yield '\n# Functions:'
+        chunk = []
+        chunklen = 0
+        for cmd in functions:
+            text = self.function_text(cmd)
+            chunk.append(text)
+            chunklen += len(text)
+            if chunklen >= self.chunksize:
+                yield ''.join(chunk)
+                chunk = []
+                chunklen = 0
+        yield ''.join(chunk)
+        yield '\n# Exports:\n'
+        yield ''.join(sorted(exports))
+        # add new line because its a shell script, needs to end with \n
+        yield '\n'
+
+    def iter_splice(self, contents, edits):
+        """ Yield the new file contents for edits from splice_edits().
+            Unchanged parts are sliced from the original contents.
+        """
+        pos = 0
+        for start, end, text in edits:
+            yield contents[pos:start]
+            yield text
+            pos = end
+        yield contents[pos:]
+
+    def save(self, filename, backup=True, parsed=None, keep=False,
+             inplace=False):
+        """ Save an alias file atomically (see: fileops.atomic_write()).
+            If the commands came from parsed (a snapshot AliasParser() for
+            the same file, unchanged since), only the changed definitions
+            are written.
+            With inplace, when there is only one change, the same size as
+            the text it replaces and under patchsize bytes, the file is
+            patched in place with a single write instead of rewritten.
+            That isn't atomic, a crash during the write can leave a
+            partly written definition, so it is only done when asked for.
+            Everything else is written atomically, so readers never see a
+            mix of old and new definitions.
+            With backup, an existing file is copied to 'filename~' first,
+            if there isn't a backup already.
+            With keep, the new contents are kept in self.contents,
+            for saved_parser().
+            self.savemode is set to how the file was written.
+            Raises aliasmgr_fileops.FileOpError on failure.
+            Returns the backup file name, if one was created.
+        """
+        # Reading never needs this, keep it out of command line startup.
+        import aliasmgr_fileops
+        self.contents = None
+        edits = None
+        if self.can_splice(filename, parsed):
+            edits = self.splice_edits(parsed)
+        self.editcount = len(edits) if edits else 0
+        if edits == []:
+            self.savemode = 'unchanged'
+            if keep:
+                self.contents = parsed.contents
+            return None
+
+        backupfile = None
+        if backup:
+            backupfile = '{}~'.format(filename)
+            if os.path.isfile(filename) and (not os.path.isfile(backupfile)):
+                aliasmgr_fileops.copy_file(filename, backupfile)
+            else:
+                backupfile = None
+        if inplace and edits and (len(edits) == 1):
+            start, end, text = edits[0]
+            samesize = (len(text) == (end - start))
+            if samesize and (len(text) < self.patchsize) and (
+                    aliasmgr_fileops.patch_file(
+                        filename,
+                        [(start, parsed.contents[start:end], text)])):
+                self.savemode = 'inplace'
+                if keep:
+                    self.contents = ''.join(
+                        self.iter_splice(parsed.contents, edits))
+                return backupfile
+        if edits:
+            chunks = self.iter_splice(parsed.contents, edits)
+        else:
+            chunks = self.iter_chunks()
+        if keep:
+            # Joined once, and written with a single write.
+            self.contents = ''.join(chunks)
+            chunks = (self.contents, )
+        with aliasmgr_fileops.atomic_write(filename) as fwrite:
+            for chunk in chunks:
+                fwrite.write(chunk)
+        self.savemode = 'splice' if edits else 'full'
+        return backupfile
+
+    def saved_parser(self, filename, previous=None):
+        """ Return a snapshot AliasParser() for the file written by the
+            last save(filename, keep=True), without parsing it again.
+            The file is only read to compare its hash with the saved
+            contents, which are re-parsed in memory (only the changed part,
+            when previous is the snapshot the commands were saved from).
+            The parser gets this Serializer's own Command() objects, so the
+            saved commands can be edited and saved again without a reload.
+            Returns None if the file changed after it was saved (its size
+            or content hash doesn't match), or if the contents don't parse
+            back to exactly the saved commands. The file needs to be
+            reloaded then, and
+            previous shouldn't be used for it (see: AliasParser.reparse()).
+        """
+        if self.contents is None:
+            return None
+        try:
+            st = os.stat(filename)
+        except (IOError, OSError):
+            return None
+        if st.st_size != len(self.contents):
+            return None
+        # Same-size edits by something else only show up in the contents.
+        try:
+            with open(filename, 'rb') as f:
+                written = aliasmgr_cache.hash_contents(f.read())
+        except (IOError, OSError):
+            return None
+        if written != aliasmgr_cache.hash_contents(self.contents):
+            return None
+        filename = os.path.abspath(filename)
+        if ((previous is not None) and
+                (previous.contents is not None) and
+                (previous.filename == filename)):
+            parser = previous.reparse(self.contents)
+        else:
+            parser = AliasParser(snapshot=True)
+            parser.filename = filename
+            parser.parse_contents(self.contents)
+
+        # Unchanged definitions were reused by reparse(), the rest are
+        # matched to the saved commands by their info.
+        savedids = set(map(id, self.commands))
+        parsedids = set(map(id, parser.commands()))
+        unmatched = {}
+        for cmd in [c for c in self.commands if id(c) not in parsedids]:
+            info = (cmd.name, cmd.cmd, cmd.comment, cmd.export)
+            unmatched.setdefault(info, []).append(cmd)
+        replacements = []
+        for cmds in (parser.aliases, parser.functions):
+            for index in [
+                    i for i, c in enumerate(cmds) if id(c) not in savedids]:
+                matches = unmatched.get(cmds[index].parsed)
+                if not matches:
+                    return None
+                replacements.append((cmds, index, matches.pop(0)))
+        if any(unmatched.values()):
+            # Some commands weren't written (duplicate alias lines).
+            return None
+        for cmds, index, cmd in replacements:
+            cmd.span = cmds[index].span
+            cmd.offsets = cmds[index].offsets
+            cmd.set_parsed()
+            cmds[index] = cmd
+        parser.filestat = stat_key(st)
+        return parser
+
+    def splice_edits(self, parsed):
+        """ Compare the commands to the ones in a parsed snapshot, and
+            return a sorted list of (start, end, text) edits for the
+            snapshot contents:
+                Modified definitions are replaced where they are.
+                Removed definitions are cut, with their line.
+                New aliases go after the last alias, new functions after
+                the last function, and new export lines after the last
+                export (always after the functions).
+            Returns [] when nothing changed, or None when the changes can't
+            be spliced safely (a full save is needed).
+        """
+        contents = parsed.contents
+        eof = len(contents)
+        current = set(map(id, self.commands))
+        changed = [
+            cmd
+            for cmd in parsed.commands()
+            if (id(cmd) not in current) or cmd.ismodified()
+        ]
+        functionstarts = None
+        aliasindex = None
+
+        def inside_function(cmd):
+            """ Returns True if an alias is in a function's body. """
+            index = bisect.bisect_right(functionstarts, cmd.offsets[0]) - 1
+            return (index > -1) and (
+                parsed.functions[index].offsets[1] > cmd.offsets[0])
+
+        def line_end(offset):
+            """ Offset after the newline at offset, if there is one. """
+            if contents[offset:offset + 1] == '\n':
+                return offset + 1
+            return offset
+
+        def line_offset(lineno):
+            """ Offset for the start of a line, counted from the end of
+                the closest definition before it.
+            """
+            line, offset = 0, 0
+            for cmds in (parsed.aliases, parsed.functions):
+                lo, hi = 0, len(cmds)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if cmds[mid].span[1] <= lineno:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                if lo and (cmds[lo - 1].span[1] > line):
+                    line = cmds[lo - 1].span[1]
+                    offset = cmds[lo - 1].offsets[1] + 1
+            for _ in xrange(lineno - line):
+                offset = contents.index('\n', offset) + 1
+            return offset
+
+        edits = []
+        for cmd in changed:
+            start, end = cmd.offsets
+            removed = id(cmd) not in current
+            if (not removed) and (cmd.parsed[:3] == (
+                    cmd.name, cmd.cmd, cmd.comment)):
+                # Only the export state changed.
+                continue
+            if cmd.parsed[3] == Command.EXPORT_NA:
+                if functionstarts is None:
+                    functionstarts = [c.offsets[0] for c in parsed.functions]
+                    aliasindex = dict(
+                        (id(c), i) for i, c in enumerate(parsed.aliases))
+                if inside_function(cmd):
+                    return None
+                index = aliasindex[id(cmd)] + 1
+                if index < len(parsed.aliases):
+                    # The next alias may use this one's command.
+                    nextstart, nextend = parsed.aliases[index].offsets
+                    if parsed._alias_fallback(contents[nextstart:nextend]):
+                        return None
+            elif removed and (start > 1) and (
+                    contents[start - 2:start] == '\n\n'):
+                # Remove the blank line before a function too.
+                start -= 1
+            if removed:
+                edits.append((start, line_end(end), ''))
+            elif cmd.isfunction():
+                edits.append((start, end, self.function_text(cmd)[1:-1]))
+            else:
+                edits.append((start, end, self.alias_line(cmd)[:-1]))
+
+        original = set(map(id, parsed.commands()))
+        added = sorted(
+            (cmd for cmd in self.commands if id(cmd) not in original),
+            key=lambda c: c.name)
+        newaliases = [cmd for cmd in added if not cmd.isfunction()]
+        newfunctions = [cmd for cmd in added if cmd.isfunction()]
+        functionpos = 0
+        if parsed.functions:
+            functionpos = line_end(parsed.functions[-1].offsets[1])
+        if newaliases:
+            if functionstarts is None:
+                functionstarts = [c.offsets[0] for c in parsed.functions]
+            pos = None
+            for cmd in reversed(parsed.aliases):
+                if not inside_function(cmd):
+                    pos = line_end(cmd.offsets[1])
+                    break
+            if pos is None:
+                pos = parsed.functions[0].offsets[0] if (
+                    parsed.functions) else eof
+            edits.append((pos, pos, ''.join(
+                self.alias_line(cmd) for cmd in newaliases)))
+        if newfunctions:
+            if not parsed.functions:
+                # Functions have to be defined before they are exported.
+                functionpos = line_offset(parsed.exportlines[0]) if (
+                    parsed.exportlines) else eof
+            edits.append((functionpos, functionpos, ''.join(
+                self.function_text(cmd) for cmd in newfunctions)))
+
+        newexports = set([
+            cmd.name
+            for cmd in self.commands
+            if cmd.export == Command.EXPORT_YES
+        ])
+        removeexports = set(
+            cmd.parsed[0]
+            for cmd in parsed.functions
+            if cmd.parsed[3] == Command.EXPORT_YES) - newexports
+        if removeexports:
+            found = set()
+            for name, lineno in zip(parsed.exports, parsed.exportlines):
+                if name not in removeexports:
+                    continue
+                start = line_offset(lineno)
+                exportmatch = self.export_line_pat.match(contents, start)
+                if exportmatch and (exportmatch.group('name') == name):
+                    edits.append((start, exportmatch.end(), ''))
+                    found.add(name)
+            if found != removeexports:
+                # Exported some other way, like 'export name # comment'.
+                return None
+        addexports = sorted(newexports.difference(parsed.exports))
+        if addexports:
+            pos = eof
+            if parsed.exportlines:
+                lineend = contents.find(
+                    '\n',
+                    line_offset(parsed.exportlines[-1]))
+                pos = max(
+                    eof if (lineend == -1) else (lineend + 1),
+                    functionpos)
+            edits.append((pos, pos, ''.join(
+                'export {}\n'.format(name) for name in addexports)))
+
+        if not edits:
+            return []
+        # Stable sort, inserts at the same place keep their order.
+        edits.sort(key=lambda e: (e[0], e[1]))
+        lastend = 0
+        for start, end, text in edits:
+            if start < lastend:
+                # Overlapping edits (an alias inside a function body).
+                return None
+            lastend = end
+        if contents and (not contents.endswith('\n')):
+            # The last line needs a newline before anything is added.
+            for index, (start, end, text) in enumerate(edits):
+                if (start == eof) and text:
+                    edits[index] = (start, end, '\n' + text)
+                    break
+        return edits
+
+    def to_string(self):
+        """ Return the file contents as a string. """
+        return ''.join(self.iter_chunks())
+
+    def write(self, fileobject):
+        """ Write the file contents to a file object. """
+        for chunk in self.iter_chunks():
+            fileobject.write(chunk)
+
+
+def stripchars(original, chars):
+    """ remove chars from beginning and end of string """
+    if hasattr(chars, 'lower'):
+        chars = [c for c in chars]
+
+    if original:
+        while original and (original[0] in chars):
+            original = original[1:]
+    if original:
+        while original and (original[-1] in chars):
+            original = original[:-1]
+
+    return original
+
+
+def stripquotes(original):
+    """ Trims a single quote from the string """
+
+    if ((original.startswith("'") and original.endswith("'")) or
+            (original.startswith('"') and original.endswith('"'))):
+        return original[1:-1]
+    return original
+
+
+def trimcount(originalstring, chartotrim):
+    """ trims a char from the beginning of string,
+        and returns a count and the trimmed string.
+        example:
+            spacecnt, trimmed = trimcount('   no spaces', ' ')
+            # returns: (3, "no spaces")
+    """
+    cnt = 0
+    while originalstring.startswith(chartotrim):
+        cnt += 1
+        originalstring = originalstring[1:]
+    return cnt, originalstring
@@ -0,0 +1,215 @@
+'''
+    aliasmgr_fileops.py
+    In-process file operations (copy, rename, chmod) for Alias Manager.
+    These replace the 'cp' and 'chmod' shell commands, so nothing forks
+    unless root is needed (see: elevated()), and paths with spaces work.
+    Files can be written atomically with atomic_write(), or patched in
+    place with patch_file().
+    Failures raise FileOpError with the operation and paths in the message.
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import errno
+import os
+import stat
+from contextlib import contextmanager
+
+# Elevation commands, the first one found is used. See: find_elevcmd()
+ELEVATION_COMMANDS = ('/usr/bin/kdesudo', '/usr/bin/gksudo')
+# Read/write size for copies.
+CHUNK_SIZE = 64 * 1024
+# Permission bits for 'chmod a+x'.
+S_EXEC_ALL = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+
+
+class FileOpError(EnvironmentError):
+
+    """ Raised when a file operation fails. """
+    pass
+
+
+def printx(sstring):
+    print('aliasmgr_fileops: {}'.format(sstring))
+
+
+@contextmanager
+def atomic_write(filename):
+    """ Context manager that writes a file atomically. It yields a file
+        object for a temp file next to filename, which is synced and
+        renamed over filename when the block finishes without errors.
+        Readers see the old file or the new one, never part of one.
+        An existing file's mode (and owner, for root) is kept.
+        If filename is a symlink, the file it points to is replaced.
+        usage:
+            with atomic_write('aliases.sh') as f:
+                f.write(contents)
+    """
+    # Only saving needs tempfile (and random), startup doesn't.
+    import tempfile
+    filename = os.path.realpath(filename)
+    dirname, basename = os.path.split(filename)
+    try:
+        fd, tmpfile = tempfile.mkstemp(
+            prefix='.{}.'.format(basename),
+            suffix='.tmp',
+            dir=dirname)
+    except EnvironmentError as ex:
+        raise FileOpError('Unable to create temp file for: {}\n{}'.format(
+            filename,
+            error_msg(ex)))
+    try:
+        with os.fdopen(fd, 'w') as fwrite:
+            yield fwrite
+            fwrite.flush()
+            os.fsync(fwrite.fileno())
+        copy_stat(filename, tmpfile)
+        os.rename(tmpfile, filename)
+    except BaseException as ex:
+        try:
+            os.remove(tmpfile)
+        except EnvironmentError:
+            pass
+        if not isinstance(ex, EnvironmentError):
+            raise
+        if isinstance(ex, FileOpError):
+            raise
+        raise FileOpError('Unable to write: {}\n{}'.format(
+            filename,
+            error_msg(ex)))
+
+
+def copy_file(src, dest):
+    """ Copy a file's contents, like 'cp src dest'.
+        An existing dest keeps its mode, a new one gets src's mode.
+    """
+    try:
+        bexisted = os.path.exists(dest)
+        with open(src, 'rb') as fread:
+            with open(dest, 'wb') as fwrite:
+                while True:
+                    chunk = fread.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fwrite.write(chunk)
+        if not bexisted:
+            os.chmod(dest, stat.S_IMODE(os.stat(src).st_mode))
+    except EnvironmentError as ex:
+        raise FileOpError(
+            'Unable to copy: {} -> {}\n{}'.format(src, dest, error_msg(ex)))
+
+
+def copy_stat(filename, tmpfile):
+    """ Give a temp file the mode (and owner, when running as root) of the
+        file it will replace. A temp file for a new file gets the default
+        mode for new files.
+    """
+    try:
+        st = os.stat(filename)
+    except EnvironmentError:
+        # New file, temp files are created private.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmpfile, 0o666 & ~umask)
+        return None
+    os.chmod(tmpfile, stat.S_IMODE(st.st_mode))
+    if os.getuid() == 0:
+        os.chown(tmpfile, st.st_uid, st.st_gid)
+
+
+def elevated(largs):
+    """ Run a command as root with the elevation command (the user is
+        asked for a password). Arguments are passed as-is, no shell.
+    """
+    import subprocess
+    selevcmd = find_elevcmd()
+    if selevcmd is None:
+        raise FileOpError('Unable to find suitable elevation command!')
+    try:
+        ret = subprocess.call([selevcmd] + list(largs))
+    except EnvironmentError as ex:
+        raise FileOpError('Unable to run {}: {}'.format(
+            selevcmd,
+            error_msg(ex)))
+    if ret != 0:
+        raise FileOpError('{} failed ({}): {}'.format(
+            os.path.basename(selevcmd),
+            ret,
+            ' '.join(largs)))
+
+
+def error_msg(ex):
+    """ Return a short message for an EnvironmentError. """
+    return ex.strerror or str(ex)
+
+
+def find_elevcmd():
+    """ Return the path to the elevation command, or None if there isn't
+        one installed.
+    """
+    for selevcmd in ELEVATION_COMMANDS:
+        if os.path.isfile(selevcmd):
+            return selevcmd
+    return None
+
+
+def make_executable(filename):
+    """ Make a file executable for everyone, like 'chmod a+x'.
+        Returns True if the mode was changed, False if it already was.
+    """
+    try:
+        mode = os.stat(filename).st_mode
+        if (mode & S_EXEC_ALL) == S_EXEC_ALL:
+            return False
+        os.chmod(filename, stat.S_IMODE(mode) | S_EXEC_ALL)
+    except EnvironmentError as ex:
+        raise FileOpError(
+            'Unable to chmod: {}\n{}'.format(filename, error_msg(ex)))
+    return True
+
+
+def patch_file(filename, patches):
+    """ Overwrite parts of a file in place, without changing its size.
+        patches is a list of (offset, old text, new text), where the old
+        and new text are the same length. Nothing is written unless the
+        file still has the old text at every offset.
+        Returns True if the file was patched, False if it didn't match.
+    """
+    try:
+        with open(filename, 'r+b') as f:
+            for offset, oldtext, newtext in patches:
+                f.seek(offset)
+                if f.read(len(oldtext)) != oldtext:
+                    return False
+            for offset, oldtext, newtext in patches:
+                f.seek(offset)
+                f.write(newtext)
+            f.flush()
+            os.fsync(f.fileno())
+    except EnvironmentError as ex:
+        raise FileOpError(
+            'Unable to patch: {}\n{}'.format(filename, error_msg(ex)))
+    return True
+
+
+def rename_file(src, dest):
+    """ Move a file, replacing dest, like 'mv src dest'. A rename across
+        file systems falls back to copy_file() and removing src.
+    """
+    try:
+        os.rename(src, dest)
+    except EnvironmentError as ex:
+        if ex.errno != errno.EXDEV:
+            raise FileOpError(
+                'Unable to rename: {} -> {}\n{}'.format(
+                    src,
+                    dest,
+                    error_msg(ex)))
+        # Different file systems, copy it instead.
+        copy_file(src, dest)
+        try:
+            os.remove(src)
+        except EnvironmentError as ex:
+            printx('Unable to remove: {}\n{}'.format(src, error_msg(ex)))
@@ -13,12 +13,13 @@ import gtk
 import pango
 import subprocess
 
+import aliasmgr_fileops
 import aliasmgr_integrator
 import aliasmgr_util as amutil
 
 # Globals.
 settings = amutil.settings
-integrator = aliasmgr_integrator.am_integrator()
+integrator = aliasmgr_integrator.get_integrator()
 dlg = amutil.Dialogs()
 
 # winMain ------------------------------------------
@@ -35,6 +36,8 @@ class winMain():
             os.path.join(sys.path[0], 'aliasmgr_main.glade'))
         # File data
         self.lst_data = None
+        # Last parse results, so reloads only re-parse what changed.
+        self.parsed = None
 
         # Currently selected itm
         self.selname = None
@@ -57,6 +60,10 @@ class winMain():
         self.mnuDeintegrate = self.builder.get_object('mnuDeintegrate')
         self.mnuCheck = self.builder.get_object('mnuCheck')
         self.mnuIntegration = self.builder.get_object('mnuIntegration')
+        self.mnuBundle = self.builder.get_object('mnuBundle')
+        self.mnuAutoload = self.builder.get_object('mnuAutoload')
+        self.mnuTrace = self.builder.get_object('mnuTrace')
+        self.mnuQuiet = self.builder.get_object('mnuQuiet')
         self.mnuListIntegrated = self.builder.get_object('mnuListIntegrated')
 
         self.btnAdd = self.builder.get_object('btnAdd')
@@ -139,6 +146,15 @@ class winMain():
         # Load settings
         self.chkAutosave.set_active('true' in settings.get('autosave'))
         self.mnuIntegration.set_active('true' in settings.get('integration'))
+        self.mnuBundle.set_active(integrator.bundle_enabled())
+        self.mnuAutoload.set_active(integrator.autoload_enabled())
+        self.mnuTrace.set_active(integrator.trace_enabled())
+        self.mnuQuiet.set_active(integrator.quiet_enabled())
+        # Integrated files may have been edited outside of Alias Manager,
+        # only stat'ed here, they are parsed if one changed.
+        if integrator.is_integrated() and integrator.helper_refresh_needed():
+            if integrator.helper_refresh():
+                self.printlog('Startup scripts regenerated.')
 
         # Show window
         self.winMain.show()
@@ -171,11 +187,7 @@ class winMain():
         self.selitem = self.get_item(self.selname)
 
         # get index for this item
-        for itmindex in range(0, len(self.lst_data)):
-            # Found value in main data list?
-            if amutil.trim_markup(itmValue) == self.lst_data[itmindex].name:
-                # Set selected index
-                self.selindex = itmindex
+        self.selindex = self.lst_data.find(self.selname)
 
         # Retrieve command
         cmdlst = self.selitem.cmd
@@ -212,6 +224,7 @@ class winMain():
         if widget.get_active():
             # Toggled!
             self.lst_data[self.selindex].exported = 'Yes'
+            self.lst_data.invalidate()
             if self.selitem.isfunction():
                 # if self.is_function(self.selname):
                 # Set markup
@@ -220,6 +233,7 @@ class winMain():
             self.stat_settext('Item {} is exported.'.format(self.selname))
         else:
             self.lst_data[self.selindex].exported = 'No'
+            self.lst_data.invalidate()
             if self.selitem.isfunction():
                 # if self.is_function(self.selname):
                 # Set markup
@@ -461,8 +475,97 @@ class winMain():
                 sfiles + '\n' + \
                 "<b><u>" + settings.name + " integrated:</u></b>\n" + \
                 shelperfiles
+            if integrator.bundle_enabled():
+                smsg = '\n'.join((smsg, self.bundle_timing_msg()))
             dlg.msgbox(smsg, dlg.info)
 
+    def bundle_timing_msg(self):
+        """ Time bash startup with and without the bundle,
+            and return a message with the time saved.
+        """
+        times = integrator.helper_time_startup()
+        if times is None:
+            return 'Unable to time bash startup.'
+        filestime, bundletime = times
+        return '\n'.join((
+            '<b><u>Startup bundle:</u></b>',
+            '<small><i>{bundle}</i></small>',
+            'One file at a time: {filestime:0.1f}ms',
+            'Bundled: {bundletime:0.1f}ms',
+            'Time saved: <b>{saved:0.1f}ms</b> per shell',
+        )).format(
+            bundle=integrator.helperbundle,
+            filestime=filestime * 1000,
+            bundletime=bundletime * 1000,
+            saved=(filestime - bundletime) * 1000)
+
+    def mnuAutoload_select_cb(self, widget, data=None):
+        self.stat_settext('Define functions on first call, using stubs...')
+
+    def mnuAutoload_toggled_cb(self, widget, data=None):
+        """ Enable/disable autoload stubs for integrated files. """
+        benabled = self.mnuAutoload.get_active()
+        if benabled == integrator.autoload_enabled():
+            return None
+        settings.setsave('autoload', 'true' if benabled else 'false')
+        if not integrator.helper_generate_script():
+            dlg.msgbox('Failed to generate the integration script!',
+                       dlg.error)
+            return None
+        self.stat_settext('Autoload functions {}...'.format(
+            'enabled' if benabled else 'disabled'))
+
+    def mnuQuiet_select_cb(self, widget, data=None):
+        self.stat_settext('Load integrated files without any output...')
+
+    def mnuQuiet_toggled_cb(self, widget, data=None):
+        """ Enable/disable output from the integration script. """
+        benabled = self.mnuQuiet.get_active()
+        if benabled == integrator.quiet_enabled():
+            return None
+        settings.setsave('quiet', 'true' if benabled else 'false')
+        if not integrator.helper_generate_script():
+            dlg.msgbox('Failed to generate the integration script!',
+                       dlg.error)
+            return None
+        self.stat_settext('Quiet startup {}...'.format(
+            'enabled' if benabled else 'disabled'))
+
+    def mnuTrace_select_cb(self, widget, data=None):
+        self.stat_settext('Record load times for integrated files...')
+
+    def mnuTrace_toggled_cb(self, widget, data=None):
+        """ Enable/disable load time tracing for integrated files. """
+        benabled = self.mnuTrace.get_active()
+        if benabled == integrator.trace_enabled():
+            return None
+        settings.setsave('trace', 'true' if benabled else 'false')
+        if not integrator.helper_generate_script():
+            dlg.msgbox('Failed to generate the integration script!',
+                       dlg.error)
+            return None
+        self.stat_settext('Load time tracing {}...'.format(
+            'enabled' if benabled else 'disabled'))
+
+    def mnuBundle_select_cb(self, widget, data=None):
+        self.stat_settext('Source all integrated files from one bundle...')
+
+    def mnuBundle_toggled_cb(self, widget, data=None):
+        """ Enable/disable the startup bundle, show the time saved. """
+        benabled = self.mnuBundle.get_active()
+        if benabled == integrator.bundle_enabled():
+            return None
+        settings.setsave('bundle', 'true' if benabled else 'false')
+        if not integrator.helper_generate_script():
+            dlg.msgbox('Failed to generate the integration script!',
+                       dlg.error)
+            return None
+        if benabled:
+            self.stat_settext('Startup bundle enabled...')
+            dlg.msgbox(self.bundle_timing_msg(), dlg.info)
+        else:
+            self.stat_settext('Startup bundle disabled...')
+
     def mnuIntegration_select_cb(self, widget, data=None):
         self.stat_settext("Enable/Disable easy integration...")
 
@@ -584,7 +687,7 @@ class winMain():
             return False
 
         # Retrieve old command, alter its name.
-        self.lst_data[self.selindex].name = sname
+        self.lst_data.rename(self.lst_data[self.selindex], sname)
         sexported = self.selitem.exported
 
         # Reload aliases from lst_data
@@ -599,6 +702,7 @@ class winMain():
         if self.chkAutosave.get_active():
             if self.selitem.exported != sexported:
                 self.lst_data[self.selindex].exported = sexported
+                self.lst_data.invalidate()
                 self.btnSaveCmd_clicked_cb(widget)
 
     def btnReload_clicked_cb(self, widget):
@@ -610,7 +714,7 @@ class winMain():
     def btnSave_clicked_cb(self, widget):
         self.save_file()
 
-        # Finished, set status text and reload aliases
+        # Finished, set status text
         if widget == self.btnSave:
             self.stat_settext("Saved alias file.")
             dlg.msgbox("Saved alias file to:\n" + settings.get("aliasfile"))
@@ -628,8 +732,9 @@ class winMain():
             sname = self.selname
             # Set text using this commands data
             self.stat_settext(stype + " '" + sname + "' saved in alias file.")
-        # Reload from file
-        self.load_aliases(True)
+        # Reload from file, only if the saved items couldn't be verified.
+        if self.parsed is None:
+            self.load_aliases(True)
 
     def btnRemove_clicked_cb(self, widget):
         """ Remove currently selected item from main data list """
@@ -687,8 +792,8 @@ class winMain():
         if len(slines) > 1:
             # Function
             # Make it auto exported if its a new item
-            if (self.selitem.exported.lower() == "new" or
-                    self.selitem.exported.lower() == "n/a"):
+            if self.selitem.export in (amutil.Command.EXPORT_NEW,
+                                       amutil.Command.EXPORT_NA):
                 self.lst_data[self.selindex].setexport(True)
             stype = "Function"
             smarkup = "<i>" + self.selname + "</i>"
@@ -700,7 +805,7 @@ class winMain():
 
         else:
             # Alias doesn't need export
-            self.lst_data[self.selindex].exported = "N/A"
+            self.lst_data[self.selindex].export = amutil.Command.EXPORT_NA
             stype = "Alias"
             smarkup = self.selname
             self.chkExport.set_active(False)
@@ -714,6 +819,7 @@ class winMain():
 
         # Save command data
         self.lst_data[self.selindex].cmd = slines
+        self.lst_data.invalidate()
         # Correct markup for this command (may have changed
         self.treeAliases_setvalue(smarkup)
 
@@ -1038,156 +1144,52 @@ class winMain():
         )
         return bool(success)
 
-    def save_file(self, sfilename=None):  # noqa
+    def save_file(self, sfilename=None):
         if sfilename is None:
             sfilename = settings.get("aliasfile")
         self.printlog("save_file: saving to: " + sfilename)
 
-        # Setup shell script
-        header = """#!/bin/bash
-# Generated by {settings.name} {settings.version}
-# -Christopher Welborn
-
-# Note to user:
-#     If you must edit this file manually please stick to this style:
-#         Use tabs, not spaces.
-#         No tabs before definitons.
-#         Seperate lines for curly braces.
-#         Use 1 tab depth for start of code block in functions.
-#         Function description is first comment in code block.
-#         Alias description is comment right side of alias definition.
-#
-#     ...if you use a different style it may or may not
-#        break the program and I can't help you.
-""".format(settings=settings)
-
-        # Write Definitions, Cycle thru main data list
-        # lst_lines.append("\n# Definitions:\n")
-
-        # List for aliases (put'em at the top of the file)
-        lst_aliases = []
-        # List for functions (put'em after aliases)
-        lst_functions = []
-        # List for exports (put at bottom of file)
-        lst_exports = []
-
-        # Cycle thru items in treeAliases (alphabetical already)
-        # This extra step makes the functions print in alphbetical order
-        # ...aliases and exports don't need this method, a simple sorted(set())
-        # works because they are single lines. multiline functions can't be
-        # sorted like that.
-        treeitm = self.listAliases.get_iter_first()
-        while (treeitm is not None):
-            # Get value for this item
-            treeval = amutil.trim_markup(
-                self.listAliases.get_value(treeitm, 0))
-            # try to get next item
-            treeitm = self.listAliases.iter_next(treeitm)
-
-            # Search data list for this item, and save data to appropriate
-            # list.
-            for itm in self.lst_data:
-                # Name for alias/function
-                sname = itm.name
-                # Match tree name with data name, and retrieve it's info...
-                if treeval == sname:
-                    # Set type based on command length
-                    if len(itm.cmd) > 1:
-                        bfunction = True
-                    else:
-                        bfunction = False
-
-                    # Comments?
-                    scomment = itm.comment
-                    # Append comment char if needed
-                    if scomment and (not scomment.startswith('#')):
-                        scomment = ' '.join(('#', scomment))
-
-                    # WRITE FUNCTION ITEM
-                    if bfunction:
-                        lst_functions.append('\nfunction {}()\n'.format(sname))
-                        lst_functions.append('{\n')
-                        # comment given?
-                        if scomment:
-                            lst_functions.append('\t{}\n'.format(scomment))
-                        # Write command section
-                        for scmdline in itm.cmd:
-                            lst_functions.append('\t{}\n'.format(scmdline))
-                        lst_functions.append('}\n')
-                    else:
-                        # WRITE ALIAS ITEM
-                        # Fix quotes around command
-                        if '"' in itm.cmd[0]:
-                            scmd = "'" + itm.cmd[0] + "'"
-                        else:
-                            scmd = '"' + itm.cmd[0] + '"'
-                        # Comment given?
-                        if len(scomment) > 0:
-                            scmd = ' '.join((scmd, scomment))
-                        lst_aliases.append('alias {}={}\n'.format(sname, scmd))
-
-        # Save Exports, cycle thru main data list
-        # lst_lines.append("\n# Exports\n")
-        for itm in self.lst_data:
-            if (itm.exported.lower() == 'yes'):
-                lst_exports.append('export {}\n'.format(itm.name))
-
-        # Sort lines
-        lst_aliases = sorted(set(lst_aliases))
-        lst_exports = sorted(set(lst_exports))
-
-        # Write file
-        # save temp file to home dir
-        aliasfiletmp = os.path.join(integrator.home, '.aliasmanager.tmp')
-
-        btmp = False  # @UnusedVariable
-        with open(aliasfiletmp, 'w') as fwrite:
-            fwrite.write(header)
-            fwrite.write("\n\n# Aliases:\n")
-            fwrite.writelines(lst_aliases)
-            fwrite.write("\n# Functions:")
-            fwrite.writelines(lst_functions)
-            fwrite.write("\n# Exports:\n")
-            fwrite.writelines(lst_exports)
-            # add new line because its a shell script, needs to end with \n
-            fwrite.write('\n')
-            # self.printlog("Temporary file written: " + aliasfiletmp)
-            btmp = True
-
-        if not btmp:
-            self.stat_text('Unable to write temp file: {}'.format(
-                           amutil.filename_safe(aliasfiletmp)))
-            self.printlog('Unable to write temp file: {}'.format(
-                          aliasfiletmp))
-            # Temp file didn't write, there is no reason to continue.
-            return False
-
+        serializer = amutil.Serializer(self.lst_data)
+        # Saving the loaded file, its snapshot is updated after.
+        bloaded = (self.parsed is not None) and (
+            self.parsed.filename == os.path.abspath(sfilename))
         try:
-            # Backup destination file if it doesn't exist
-            backupfile = '{}~'.format(sfilename)
-            if (os.path.isfile(sfilename) and
-                    (not os.path.isfile(backupfile))):
-                backupcmd = 'cp {} {}'.format(sfilename, backupfile)
-                os.system(backupcmd)
+            # Only changed definitions are written when the file hasn't
+            # changed since it was loaded. Shells starting while it's
+            # written (and a failed save) see the old file.
+            # Same-size edits are only patched in place when asked for,
+            # that write isn't atomic.
+            if serializer.save(
+                    sfilename,
+                    parsed=self.parsed,
+                    keep=bloaded,
+                    inplace=(settings.get('inplacesave') == 'true')):
                 self.printlog('Backup created.')
-            # Copy temp file to destination,,,
-            copycmd = 'cp {} {}'.format(aliasfiletmp, sfilename)
-            os.system(copycmd)
-        except Exception as ex:
-            self.stat_settext('Unable to copy to destination: {}'.format(
+        except aliasmgr_fileops.FileOpError as ex:
+            self.stat_settext('Unable to save file: {}'.format(
                               amutil.filename_safe(sfilename)))
-            self.printlog('Unable to copy to destination!')
+            self.printlog('Unable to save file!')
             self.printlog('Error: {}'.format(ex))
             return False
-            dlg.msgbox(
-                'Unable to copy to destination: {}'.format(
-                    amutil.filename_safe(sfilename)),
-                dlg.error)
-        self.printlog('Temp file copied to destination: {}'.format(sfilename))
+        self.printlog('File saved ({}, {} edits): {}'.format(
+            serializer.savemode,
+            serializer.editcount,
+            sfilename))
+        if bloaded:
+            # The items in memory are what was saved, unless the file
+            # was changed by something else (see: btnSave_clicked_cb()).
+            self.parsed = serializer.saved_parser(
+                sfilename,
+                previous=self.parsed)
+            if self.parsed is None:
+                self.printlog('Saved file needs to be reloaded.')
 
         # chmod +x if needed
         schmod_result = amutil.chmod_file(sfilename)
         self.printlog(schmod_result)
+        # Autoload stubs/startup bundle are out of date if it's integrated.
+        if integrator.helper_refresh():
+            self.printlog('Startup scripts regenerated.')
 
         # Success
         return True
@@ -1200,7 +1202,12 @@ class winMain():
 
         # Get file contents aliases/functions, fix Export info
         if from_file:
-            self.lst_data = amutil.readfile()
+            self.parsed = amutil.readfile_parsed(previous=self.parsed)
+            if self.parsed is None:
+                self.lst_data = amutil.CommandCollection()
+            else:
+                self.lst_data = amutil.CommandCollection(
+                    self.parsed.commands())
 
         # failed to load list
         if not self.lst_data:
@@ -1221,14 +1228,8 @@ class winMain():
 
         # Have aliases to load...
         if self.lst_data:
-            # Get sorted names list
-            lst_names = []
-            for itm in self.lst_data:
-                lst_names.append(itm.name)
-            lst_names = sorted(set(lst_names))
-
-            # Cycle thru aliases
-            for itmname in lst_names:
+            # Cycle thru aliases, sorted by name
+            for itmname in self.lst_data.sortednames():
                 # Actual item
                 itm = self.get_item(itmname)
                 itemname = '{}'
@@ -1259,12 +1260,11 @@ class winMain():
 
     def item_exists(self, sname):
         """ Item already exists/bad name? """
-        for itm in self.lst_data:
-            if sname == itm.name:
-                self.stat_settext("Item already exists!: " + sname)
-                self.printlog("Item already exists!: " + sname)
-                dlg.msgbox("Item already exists!: " + sname, dlg.error)
-                return True
+        if sname in self.lst_data:
+            self.stat_settext("Item already exists!: " + sname)
+            self.printlog("Item already exists!: " + sname)
+            dlg.msgbox("Item already exists!: " + sname, dlg.error)
+            return True
         return False
 
     def item_badname(self, sname):
@@ -1282,16 +1282,8 @@ class winMain():
         if self.lst_data is None:
             return False
 
-        for itm in self.lst_data:
-            sdataname = itm.name
-            if sdataname == sname:
-                # Found item by name, return the data
-                return itm
-
-        # Failed to find it for some reason
-        # Return empty command
-        cmd = amutil.Command()
-        return cmd
+        # Return empty command if it's not found for some reason.
+        return self.lst_data.get(sname, amutil.Command())
 
     def set_filename(self, sfilename):
         """ Sets current filename in lblFilename """
@@ -8,22 +8,69 @@ Created on Jan 16, 2013
 '''
 import sys
 import os.path
+import stat
+import hashlib
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import aliasmgr_cache
+import aliasmgr_core
+import aliasmgr_fileops
 import aliasmgr_settings
+import aliasmgr_trace
+# Process-wide integrator instance, see: get_integrator()
+_integrator = None
+# Bump this when the format of saved bashrc scans changes.
+SCAN_VERSION = 1
 
 def printx(sstring):
     print("aliasmgr_integrator: " + sstring)
+
+def shell_quote(sarg):
+    """ Quote a string for use as one word in a shell script. """
+    return "'" + sarg.replace("'", "'\"'\"'") + "'"
+
+def get_integrator():
+    """ Return the am_integrator() instance shared by all modules.
+        It is created on first use, and remembers the bashrc it finds,
+        so bashrc is only probed once per process.
+    """
+    global _integrator
+    if _integrator is None:
+        _integrator = am_integrator()
+    return _integrator
     
 class am_integrator():
     """ validates and integrates alias file into bash.bashrc
           saliasfile = alias file to integrate into bashrc
     """
     def __init__(self):
-        self.settings = aliasmgr_settings.am_settings()
+        self.settings = aliasmgr_settings.get_settings()
         self.user = None
         self.home = None
         self.bashrc = None
+        # last bashrc scan, see: get_integrated_files()
+        self.bashrcscan = None
+        # stat info from find_bashrc(), used once by get_integrated_files()
+        self.bashrcstat = None
+        self.bashrcscanfile = os.path.join(
+            aliasmgr_cache.get_cachedir(), "bashrc.scan")
         self.helperfiles = os.path.join(sys.path[0], "integrated.lst")
         self.helperscript = os.path.join(sys.path[0], "aliasmgr_scripts.sh")
+        # all integrated files in one file, see: helper_generate_bundle()
+        self.helperbundle = os.path.join(sys.path[0], "aliasmgr_bundle.sh")
+        # bundle header lines that list the source files, and the
+        # options that change the bundle contents.
+        self.bundlemarker = "# source: "
+        self.bundleoptions = "# options: "
+        # definitions that non-interactive shells load, marked by comment.
+        self.helpernoninteractive = os.path.join(
+            sys.path[0], "aliasmgr_noninteractive.sh")
+        self.noninteractivemarker = "@noninteractive"
+        # function stubs/bodies for each file, see: helper_generate_autoload()
+        self.helperautoload = os.path.join(sys.path[0], "autoload")
         
         self.headerlist = "# Alias Manager Integration Files\n" + \
                           "# A script is generated using these filenames,\n" + \
@@ -36,6 +83,17 @@ class am_integrator():
                             "# called on BASH startup.\n" + \
                             "# Alias Manager will over-write any changes\n" + \
                             "# you make to this file.\n"
+        self.headernoninteractive = \
+            "# Alias Manager Non-Interactive Definitions\n" + \
+            "# Aliases/functions marked with @noninteractive in a\n" + \
+            "# comment, for shells that aren't interactive (scp, cron).\n" + \
+            "# Alias Manager will over-write any changes\n" + \
+            "# you make to this file.\n"
+        self.headerbundle = \
+            "# Alias Manager Startup Bundle\n" + \
+            "# All integrated scripts in one file, so bash\n" + \
+            "# only sources one file on startup. It is\n" + \
+            "# regenerated when any of these change:\n"
                             
         # load user info  
         self.get_userinfo()
@@ -58,8 +116,12 @@ class am_integrator():
         # success
         return True
   
-    def find_bashrc(self):
-        """ find bashrc file automagically """
+    def find_bashrc(self, bcached=True):
+        """ find bashrc file automagically
+            The bashrc found last time is used if it still exists,
+            bcached=False probes all of them (a new bashrc may take
+            precedence over the cached one).
+        """
     
         # try user home first?
         btryuser = True
@@ -73,6 +135,15 @@ class am_integrator():
         if self.home == None:
             btryuser = False
         
+        # bashrc found last time? (one stat instead of probing them all)
+        scan = self.bashrc_scan_load() if bcached else None
+        if scan:
+            st = self.bashrc_stat(scan['bashrc'])
+            if st is not None:
+                self.bashrc = scan['bashrc']
+                self.bashrcstat = st
+                return self.bashrc
+
         # acceptable bashrc filenames
         lst_bashrc = ["bash.bashrc", ".bashrc"]
         for sbashrc in lst_bashrc:
@@ -88,6 +159,72 @@ class am_integrator():
         # Failure
         return False
         
+    def bashrc_stat(self, sfilename):
+        """ Return os.stat() info for a bashrc file,
+            or None if it is missing or not a regular file.
+        """
+        try:
+            st = os.stat(sfilename)
+        except (IOError, OSError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return st
+
+    def bashrc_scan_load(self):
+        """ Returns the last bashrc scan (saved by get_integrated_files()),
+            or None if there isn't a usable one for this user.
+            Scans are dicts with: version, home, bashrc, mtime, size, files
+        """
+        if self.bashrcscan is None:
+            try:
+                with open(self.bashrcscanfile, 'rb') as fread:
+                    self.bashrcscan = pickle.load(fread)
+            except Exception:
+                # missing or corrupt, bashrc will be scanned again.
+                self.bashrcscan = {}
+        scan = self.bashrcscan
+        if ((not scan) or
+            (scan.get('version') != SCAN_VERSION) or
+            (scan.get('home') != self.home)):
+            return None
+        return scan
+
+    def bashrc_scan_save(self, st, lst_integrated):
+        """ Remember a bashrc scan, in this process and for the next run.
+            Failure to save it is not an error, bashrc will just be scanned
+            again next time. Returns True on success.
+        """
+        mtime = st.st_mtime
+        if (time.time() - mtime) < aliasmgr_cache.RACY_SECONDS:
+            # bashrc may change again without a visible mtime change,
+            # don't trust the stat info (it will be scanned next time).
+            mtime = None
+        self.bashrcscan = {'version': SCAN_VERSION,
+                           'home': self.home,
+                           'bashrc': self.bashrc,
+                           'mtime': mtime,
+                           'size': st.st_size,
+                           'files': list(lst_integrated),
+                           }
+        stmpfile = self.bashrcscanfile + "." + str(os.getpid()) + ".tmp"
+        try:
+            scachedir = os.path.dirname(self.bashrcscanfile)
+            if not os.path.isdir(scachedir):
+                os.makedirs(scachedir)
+            with open(stmpfile, 'wb') as fwrite:
+                pickle.dump(self.bashrcscan, fwrite, pickle.HIGHEST_PROTOCOL)
+            os.rename(stmpfile, self.bashrcscanfile)
+        except Exception as ex:
+            printx("bashrc_scan_save: unable to save bashrc scan: " +
+                   self.bashrcscanfile + "\n" + str(ex))
+            try:
+                os.remove(stmpfile)
+            except (IOError, OSError):
+                pass
+            return False
+        return True
+
     def refresh_bashrc(self):
         if not self.find_bashrc():
             printx("refresh_bashrc: Cannot find bashrc file!")
@@ -102,13 +239,13 @@ class am_integrator():
         # good alias filename?
         if sfilename == None:
             sfilename = self.helperscript
+        lst_integrated = self.get_integrated_files()
         if self.bashrc == None:
-            if not self.refresh_bashrc():
-                printx("is_integrated: unable to find bashrc file!")
-                return False
+            printx("is_integrated: unable to find bashrc file!")
+            return False
             
         #printx("testing " + self.bashrc + " for " + sfilename + "...")
-        if sfilename in self.get_integrated_files():
+        if sfilename in lst_integrated:
             return True
         else:
             ### TODO: do a bit deeper search
@@ -121,7 +258,7 @@ class am_integrator():
         if self.is_integrated(self.helperscript):
             return True
         else:
-            if not self.find_bashrc():
+            if not self.find_bashrc(bcached=False):
                 printx("integrate_self: Unable to find bashrc file!")
                 return False
             
@@ -131,7 +268,11 @@ class am_integrator():
             sfile = os.path.join(sys.path[0], "aliasmgr_bashrc.tmp")
             broot = True
             # copy root file to current dir to work with
-            os.system("cp " + self.bashrc + " " + sfile)
+            try:
+                aliasmgr_fileops.copy_file(self.bashrc, sfile)
+            except aliasmgr_fileops.FileOpError as ex:
+                printx(str(ex))
+                return False
         else:
             sfile = self.bashrc
             broot = False
@@ -142,15 +283,12 @@ class am_integrator():
             fwrite.close()
             
             if broot:
-                if os.path.isfile("/usr/bin/kdesudo"):
-                    selevcmd = "kdesudo"
-                elif os.path.isfile("/usr/bin/gksudo"):
-                    selevcmd = "gksudo"
-                else:
-                    printx("Unable to find suitable elevation command!")
+                try:
+                    aliasmgr_fileops.elevated(["cp", sfile, self.bashrc])
+                except aliasmgr_fileops.FileOpError as ex:
+                    printx(str(ex))
                     printx("Integration will have to be done manually.")
                     return False
-                os.system(selevcmd + " cp " + sfile + " " + self.bashrc)
                 printx("Temp file copied to bashrc: " + self.bashrc)
             return True
         
@@ -161,7 +299,7 @@ class am_integrator():
         if not self.is_integrated():
             return True
         else:
-            if not self.find_bashrc():
+            if not self.find_bashrc(bcached=False):
                 printx("deintegrate_self: Unable to find bashrc file!")
                 return False
         
@@ -171,7 +309,11 @@ class am_integrator():
             sfile = os.path.join(sys.path[0], "aliasmgr_bashrc.tmp")
             broot = True
             # copy root file to current dir to work with
-            os.system("cp " + self.bashrc + " " + sfile)
+            try:
+                aliasmgr_fileops.copy_file(self.bashrc, sfile)
+            except aliasmgr_fileops.FileOpError as ex:
+                printx(str(ex))
+                return False
         else:
             sfile = self.bashrc
             broot = False
@@ -192,26 +334,47 @@ class am_integrator():
             fwrite.writelines(slines)
             fwrite.close()
             if broot:
-                if os.path.isfile("/usr/bin/kdesudo"):
-                    selevcmd = "kdesudo"
-                elif os.path.isfile("/usr/bin/gksudo"):
-                    selevcmd = "gksudo"
-                else:
-                    printx("Unable to find suitable elevation command!")
+                try:
+                    aliasmgr_fileops.elevated(["cp", sfile, self.bashrc])
+                except aliasmgr_fileops.FileOpError as ex:
+                    printx(str(ex))
                     printx("DeIntegration will have to be done manually.")
                     return False
-                os.system(selevcmd + " cp " + sfile + " " + self.bashrc)
                 printx("Temp file copied to bashrc: " + self.bashrc)
             return True
         return False
     
                             
     def get_integrated_files(self):
-        """ lists all files integrated into bashrc """
+        """ lists all files integrated into bashrc
+            The scan is cached (see: bashrc_scan_save()), so when bashrc
+            hasn't changed this only costs one stat.
+        """
+        # only use stat info that find_bashrc() gets below.
+        self.bashrcstat = None
         if self.bashrc == None:
             if not self.refresh_bashrc():
                 return []
-         
+
+        st = self.bashrcstat or self.bashrc_stat(self.bashrc)
+        self.bashrcstat = None
+        if st is None:
+            # bashrc is gone, look for it again.
+            self.bashrc = None
+            if not self.refresh_bashrc():
+                return []
+            st = self.bashrcstat or self.bashrc_stat(self.bashrc)
+            self.bashrcstat = None
+            if st is None:
+                return []
+        scan = self.bashrc_scan_load()
+        if (scan and
+            (scan['bashrc'] == self.bashrc) and
+            (scan['mtime'] is not None) and
+            (scan['mtime'] == st.st_mtime) and
+            (scan['size'] == st.st_size)):
+            return list(scan['files'])
+
         lst_integrated = []
         with open(self.bashrc, 'r') as fread:
             slines = fread.readlines()
@@ -232,6 +395,7 @@ class am_integrator():
                     srough = strim[strim.index(smarker) + (len(smarker) -1):]
                     lst_integrated.append(srough[:srough.index(';')])    
             # success
+            self.bashrc_scan_save(st, lst_integrated)
             return lst_integrated
             
         # failed to open file
@@ -285,30 +449,71 @@ class am_integrator():
         """
         if sfilename == "":
             return False
-      
-        if self.helper_createfile():
-            with open(self.helperfiles, 'a') as fwrite:
-                fwrite.write('\n' + sfilename + '\n')
-                fwrite.flush()
-                fwrite.close()
-                return self.helper_generate_script()
-        
-        
-        # Failure
-        return False
-    
+        return self.helper_batch(add=[sfilename])
+
     def helper_removefile(self, sfilename):
         """ Removes a file from the integrated list """
         if sfilename == "":
             return False
-        
-        lst_files = self.helper_getfiles()
-        if sfilename in lst_files:
-            lst_files.remove(sfilename)
-            return self.helper_writelist(lst_files)
-        # failure/file was not in the list
-        return False
-                    
+        if sfilename not in self.helper_getfiles():
+            # failure/file was not in the list
+            return False
+        return self.helper_batch(remove=[sfilename])
+
+    def helper_batch_errors(self, add=None, remove=None, replace=None):
+        """ Validates a batch of integration changes, see: helper_batch()
+            Returns a list of error messages, empty if the batch is good.
+        """
+        lst_errors = []
+        for sfile in (add or []) + (replace or []):
+            if not os.path.isfile(sfile):
+                lst_errors.append("File not found: " + sfile)
+            elif not os.access(sfile, os.R_OK):
+                lst_errors.append("File is not readable: " + sfile)
+        if remove:
+            lst_files = self.helper_getfiles()
+            for sfile in remove:
+                if (sfile not in lst_files) and \
+                        (os.path.abspath(sfile) not in lst_files):
+                    lst_errors.append("File is not integrated: " + sfile)
+        return lst_errors
+
+    def helper_batch(self, add=None, remove=None, replace=None):
+        """ Applies any number of integration changes at once.
+              add     : files to add to the integrated list.
+              remove  : files to remove from the integrated list.
+              replace : files that replace the whole list (before add/remove).
+            Every file is validated first, nothing changes if any of them
+            are bad. The list is written once, and the script is generated
+            once. Returns True on success.
+        """
+        lst_errors = self.helper_batch_errors(
+            add=add, remove=remove, replace=replace)
+        if lst_errors:
+            for serror in lst_errors:
+                printx("helper_batch: " + serror)
+            return False
+
+        lst_old = self.helper_getfiles()
+        if replace is None:
+            lst_files = lst_old[:]
+        else:
+            lst_files = []
+            for sfile in replace:
+                sfile = os.path.abspath(sfile)
+                if sfile not in lst_files:
+                    lst_files.append(sfile)
+        for sfile in (add or []):
+            # Files are stored the way they were added before, if listed.
+            if (sfile not in lst_files) and \
+                    (os.path.abspath(sfile) not in lst_files):
+                lst_files.append(os.path.abspath(sfile))
+        for sfile in (remove or []):
+            for sremove in (sfile, os.path.abspath(sfile)):
+                while sremove in lst_files:
+                    lst_files.remove(sremove)
+        return self.helper_writelist(lst_files)
+
     def helper_checkfile(self, sfilename):
         """ Checks to see if a file is integrated (in integrated.lst) """
         if sfilename == "":
@@ -318,41 +523,169 @@ class am_integrator():
     def helper_writelist(self, lst_files):
         """ Writes a list of filenames to the integrated list """
         if self.helper_createfile():
-            
+            lst_files = [sfile.strip('\n') for sfile in lst_files]
+            if lst_files == self.helper_getfiles():
+                # Nothing to write, the script is only written if changed.
+                return self.helper_generate_script(lst_files)
             with open(self.helperfiles, 'w') as fwrite:
                 fwrite.write(self.headerlist)
-                fwrite.writelines(lst_files)
+                fwrite.writelines(sfile + '\n' for sfile in lst_files)
                 fwrite.flush()
                 fwrite.close()
                 # update the scriptfile
-                return self.helper_generate_script()
+                return self.helper_generate_script(lst_files)
                 
         # failure    
         return False
     
-    def helper_generate_script(self):
-        """ generates the script file that bashrc shells """
-        printx("generate_script: " + str(self.helper_getfiles())) 
+    def helper_script_lines(self, lst_files):
+        """ Returns the script lines that source each file one at a time.
+            With autoload enabled, a file's stubs are sourced instead
+            while they are newer than the file.
+            With tracing enabled, each file's load time is recorded.
+            Nothing is echoed in quiet mode.
+        """
+        bautoload = self.autoload_enabled()
+        btrace = self.trace_enabled()
+        bquiet = self.quiet_enabled()
+        lst_lines = []
+        if len(lst_files) > 0:
+            if not bquiet:
+                lst_lines.append("echo 'Alias Manager loading scripts...'\n")
+            for sfile in lst_files:
+                squoted = shell_quote(sfile)
+                lst_lines.append("if [ -f " + squoted + " ]; then\n")
+                if btrace:
+                    lst_lines.append("    _am_t0=$EPOCHREALTIME\n")
+                if bautoload:
+                    sstubs = shell_quote(self.helper_autoload_stubfile(sfile))
+                    lst_lines.append(
+                        "    if [ -f " + sstubs + " ] && [ ! " + squoted +
+                        " -nt " + sstubs + " ]; then\n")
+                    lst_lines.append("        source " + sstubs + "\n")
+                    lst_lines.append("    else\n")
+                    lst_lines.append("        source " + squoted + "\n")
+                    lst_lines.append("    fi\n")
+                else:
+                    lst_lines.append("    source " + squoted + "\n")
+                if btrace:
+                    lst_lines.append("    " + self.helper_trace_line(sfile))
+                if bquiet:
+                    lst_lines.append("fi\n")
+                    continue
+                lst_lines.append(
+                    "    echo " + shell_quote("    Loaded " + sfile) + "\n")
+                lst_lines.append("else\n")
+                lst_lines.append(
+                    "    echo " +
+                    shell_quote("Alias Manager file not found: " + sfile) +
+                    "\n")
+                lst_lines.append("fi\n")
+                lst_lines.append("echo ' '\n")
+        return lst_lines
+
+    def helper_noninteractive_lines(self, lst_files):
+        """ Returns the script lines for non-interactive shells (scp, rsync,
+            cron...). Nothing is echoed. Only definitions marked with
+            @noninteractive are loaded, from a file generated for them,
+            unless the 'noninteractive' setting is 'all'. When that file
+            is older than any integrated file, the files are sourced
+            (until the next start or save regenerates it, see:
+            helper_refresh_needed()).
+        """
+        lst_sources = []
+        for sfile in lst_files:
+            squoted = shell_quote(sfile)
+            lst_sources.append("[ -f " + squoted + " ] && source " + squoted +
+                               "\n")
+        if self.settings.get("noninteractive") == "all":
+            return lst_sources
+        snoninteractive = shell_quote(self.helpernoninteractive)
+        lst_tests = ["[ -f " + snoninteractive + " ]"]
+        for sfile in lst_files:
+            lst_tests.append(
+                "[ ! " + shell_quote(sfile) + " -nt " + snoninteractive +
+                " ]")
+        lst_lines = ["if " + " && ".join(lst_tests) + "; then\n",
+                     "    source " + snoninteractive + "\n",
+                     "else\n"]
+        for sline in lst_sources:
+            lst_lines.append("    " + sline)
+        lst_lines.append("fi\n")
+        return lst_lines
+
+    def helper_bundle_lines(self, lst_files):
+        """ Returns the script lines that source the bundle,
+            falling back to sourcing each file when the bundle is older
+            than any of them (until Alias Manager regenerates it).
+        """
+        if len(lst_files) == 0:
+            return []
+        # [ -nt ] is a builtin, checking the files doesn't fork anything.
+        sbundle = shell_quote(self.helperbundle)
+        lst_tests = ["[ -f " + sbundle + " ]"]
+        for sfile in lst_files:
+            lst_tests.append(
+                "[ ! " + shell_quote(sfile) + " -nt " + sbundle + " ]")
+        lst_lines = ["if " + " && ".join(lst_tests) + "; then\n",
+                     "    source " + sbundle + "\n"]
+        if not self.quiet_enabled():
+            lst_lines.append("    echo 'Alias Manager loaded " +
+                             str(len(lst_files)) + " scripts (bundled)'\n")
+        lst_lines.append("else\n")
+        for sline in self.helper_script_lines(lst_files):
+            lst_lines.append("    " + sline)
+        lst_lines.append("fi\n")
+        return lst_lines
+
+    def helper_generate_script(self, lst_files=None):
+        """ generates the script file that bashrc shells
+            The integrated list is read once (if lst_files isn't given).
+            The script is built in memory, and only written (and made
+            executable) when its content hash differs from the existing
+            script. Returns True on success, even if nothing changed.
+        """
+        if lst_files is None:
+            lst_files = self.helper_getfiles()
+        printx("generate_script: " + str(lst_files))
         try:
-            with open(self.helperscript, 'w') as fwrite:
-                fwrite.write(self.headerscript)
-                lst_files = self.helper_getfiles()
-                if len(lst_files) > 0:
-                    fwrite.write("echo 'Alias Manager loading scripts...'\n")
-                    for sfile in self.helper_getfiles():
-                        fwrite.write("if [ -f " + sfile + " ]; then\n")
-                        fwrite.write("    source " + sfile + '\n')
-                        fwrite.write("    echo '    Loaded " + sfile + "'\n")
-                        fwrite.write("else\n")
-                        fwrite.write("    echo 'Alias Manager file not found: " + \
-                                     sfile + "'\n")
-                        fwrite.write("fi\n")
-                        fwrite.write("echo ' '\n")    
-                #fwrite.write("echo 'Alias Manager script files loaded.'\n")
-                #fwrite.write("echo ' '\n")
-                fwrite.close()
-            # chmod to script
-            os.system("chmod a+x " + self.helperscript)
+            if self.autoload_enabled():
+                self.helper_refresh_autoload(lst_files)
+            if self.bundle_enabled():
+                if self.helper_bundle_stale(lst_files):
+                    self.helper_generate_bundle(lst_files)
+                lst_lines = self.helper_bundle_lines(lst_files)
+            else:
+                lst_lines = self.helper_script_lines(lst_files)
+            if self.trace_enabled() and lst_lines:
+                lst_lines = (self.helper_trace_header() + lst_lines +
+                             self.helper_trace_footer())
+            if lst_lines:
+                # Non-interactive shells skip everything but marked
+                # definitions, and never see any output.
+                self.helper_refresh_noninteractive(lst_files)
+                lst_noninteractive = self.helper_noninteractive_lines(
+                    lst_files)
+                lst_lines = (
+                    ["if [[ $- == *i* ]]; then\n"] +
+                    ["    " + sline for sline in lst_lines] +
+                    ["else\n"] +
+                    ["    " + sline for sline in lst_noninteractive] +
+                    ["fi\n"])
+            scontents = self.headerscript + "".join(lst_lines)
+            if ((hashlib.sha1(scontents).hexdigest() ==
+                    self.helper_script_hash()) and
+                    os.access(self.helperscript, os.X_OK)):
+                printx("generate_script: Script is up to date.")
+                return True
+            # Shells starting while this is written see the old script,
+            # or the new one.
+            stmpfile = self.helperscript + ".tmp"
+            with open(stmpfile, 'w') as fwrite:
+                fwrite.write(scontents)
+            # chmod to script (a+x)
+            aliasmgr_fileops.make_executable(stmpfile)
+            aliasmgr_fileops.rename_file(stmpfile, self.helperscript)
             return True
         except Exception as ex:
             printx("helper_generate_script: Error:")
@@ -360,4 +693,512 @@ class am_integrator():
             pass
         # Failure
         return False
-        
+
+    def helper_script_hash(self):
+        """ Returns a content hash for the existing helper script,
+            or None if it can't be read.
+        """
+        try:
+            with open(self.helperscript, 'rb') as fread:
+                return hashlib.sha1(fread.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+
+    def bundle_enabled(self):
+        """ Returns True if integrated files are sourced from one bundle. """
+        return (self.settings.get("bundle") == "true")
+
+    def helper_bundle_manifest(self):
+        """ Reads the options and source list from the bundle header.
+            Returns (options, [(filename, mtime, size), ...]),
+            or None if there is no readable bundle.
+        """
+        soptions = None
+        lst_sources = []
+        try:
+            with open(self.helperbundle, 'r') as fread:
+                for sline in fread:
+                    if not sline.startswith("# "):
+                        # End of the header.
+                        break
+                    if sline.startswith(self.bundleoptions):
+                        soptions = sline[len(self.bundleoptions):].rstrip('\n')
+                    elif sline.startswith(self.bundlemarker):
+                        smtime, ssize, sfile = \
+                            sline[len(self.bundlemarker):].rstrip('\n').split(
+                                ' ', 2)
+                        lst_sources.append((sfile, float(smtime), int(ssize)))
+        except (IOError, OSError, ValueError):
+            return None
+        return soptions, lst_sources
+
+    def helper_bundle_options(self):
+        """ Returns the options that change the bundle contents, as written
+            in the bundle header.
+        """
+        return "autoload={} trace={}".format(
+            self.autoload_enabled(),
+            self.trace_enabled())
+
+    def helper_bundle_sources(self, lst_files=None):
+        """ Returns a list of (filename, mtime, size) for existing
+            integrated files, the bundle manifest is compared with this.
+        """
+        if lst_files is None:
+            lst_files = self.helper_getfiles()
+        lst_sources = []
+        for sfile in lst_files:
+            try:
+                st = os.stat(sfile)
+            except (IOError, OSError):
+                # Missing files are reported by the helper script.
+                continue
+            lst_sources.append((sfile, st.st_mtime, st.st_size))
+        return lst_sources
+
+    def helper_bundle_stale(self, lst_files=None):
+        """ Returns True if the bundle is missing, any integrated file
+            was added, removed, or changed since it was generated, or it
+            was generated with different options.
+        """
+        return (self.helper_bundle_manifest() !=
+                (self.helper_bundle_options(),
+                 self.helper_bundle_sources(lst_files)))
+
+    def helper_generate_bundle(self, lst_files=None):
+        """ Concatenates all integrated files into the bundle,
+            so bash sources one file on startup instead of one per script.
+            Contents are normalized (shebangs and CR line endings removed,
+            every file ends with a newline), nothing else is changed.
+            The bundle is replaced atomically, a shell starting at the
+            same time sees the old bundle or the new one.
+        """
+        lst_sources = self.helper_bundle_sources(lst_files)
+        btrace = self.trace_enabled()
+        lst_lines = [self.headerbundle,
+                     self.bundleoptions + self.helper_bundle_options() + "\n"]
+        for sfile, fmtime, isize in lst_sources:
+            lst_lines.append("{}{!r} {} {}\n".format(
+                self.bundlemarker, fmtime, isize, sfile))
+        for sfile, fmtime, isize in lst_sources:
+            try:
+                with open(self.helper_bundle_content(sfile), 'r') as fread:
+                    scontents = fread.read()
+            except (IOError, OSError) as ex:
+                printx("helper_generate_bundle: Unable to read: " + sfile)
+                printx(str(ex))
+                return False
+            scontents = scontents.replace('\r\n', '\n')
+            if scontents.startswith("#!"):
+                scontents = scontents[scontents.find('\n') + 1:]
+            if scontents and (not scontents.endswith('\n')):
+                scontents += '\n'
+            lst_lines.append("\n#### Alias Manager: " + sfile + "\n")
+            if btrace:
+                lst_lines.append("_am_t0=$EPOCHREALTIME\n")
+            lst_lines.append(scontents)
+            if btrace:
+                lst_lines.append(self.helper_trace_line(sfile))
+
+        stmpfile = self.helperbundle + ".tmp"
+        try:
+            with open(stmpfile, 'w') as fwrite:
+                fwrite.writelines(lst_lines)
+            os.rename(stmpfile, self.helperbundle)
+        except (IOError, OSError) as ex:
+            printx("helper_generate_bundle: Error:")
+            printx(str(ex))
+            return False
+        return True
+
+    def helper_bundle_content(self, sfile):
+        """ Returns the file to put in the bundle for an integrated file,
+            its autoload stubs if they are enabled and up to date.
+        """
+        if self.autoload_enabled() and \
+                (not self.helper_autoload_stale(sfile)):
+            return self.helper_autoload_stubfile(sfile)
+        return sfile
+
+    def helper_refresh(self):
+        """ Regenerates the non-interactive definitions, and autoload stubs
+            and the bundle if they are enabled, when any integrated file
+            changed. The helper script is regenerated too, it is only
+            written when its content changed (after a settings change).
+            Returns True if anything was regenerated.
+            This parses every integrated file that changed. It is called
+            after saving one, and when the GUI starts if
+            helper_refresh_needed() says a file was changed outside of
+            Alias Manager.
+        """
+        lst_files = self.helper_getfiles()
+        bchanged = self.helper_refresh_noninteractive(lst_files)
+        if self.autoload_enabled():
+            bchanged = self.helper_refresh_autoload(lst_files) or bchanged
+        # The bundle is stale too if a file changed, stubs go first.
+        bchanged = self.helper_refresh_bundle() or bchanged
+        shash = self.helper_script_hash()
+        if not self.helper_generate_script(lst_files):
+            return bchanged
+        return (self.helper_script_hash() != shash) or bchanged
+
+    def helper_refresh_needed(self, lst_files=None):
+        """ Returns True if the helper script is missing, or the
+            non-interactive definitions, or autoload stubs or the bundle,
+            are older than any integrated file, the same checks the
+            helper script makes before falling back to sourcing the files.
+            Only files are stat'ed, nothing is parsed, so this is cheap
+            enough to run every time the GUI starts.
+        """
+        if lst_files is None:
+            lst_files = self.helper_getfiles()
+        if not os.access(self.helperscript, os.X_OK):
+            return True
+        if (self.settings.get("noninteractive") != "all") and \
+                self.helper_noninteractive_stale(lst_files):
+            return True
+        if self.autoload_enabled():
+            for sfile in lst_files:
+                if os.path.isfile(sfile) and self.helper_autoload_stale(sfile):
+                    return True
+        if self.bundle_enabled():
+            try:
+                fmtime = os.path.getmtime(self.helperbundle)
+            except (IOError, OSError):
+                return True
+            for sfile in lst_files:
+                try:
+                    if os.path.getmtime(sfile) > fmtime:
+                        return True
+                except (IOError, OSError):
+                    continue
+        return False
+
+    def helper_refresh_bundle(self):
+        """ Regenerates the bundle if it is enabled and out of date.
+            Returns True if it was regenerated.
+        """
+        if not self.bundle_enabled():
+            return False
+        lst_files = self.helper_getfiles()
+        if not self.helper_bundle_stale(lst_files):
+            return False
+        return self.helper_generate_bundle(lst_files)
+
+    def helper_time_startup(self, runs=5):
+        """ Times bash sourcing the integrated files one at a time,
+            and through the bundle (generating it first if needed).
+            Returns (seconds per file, seconds bundled), best of 'runs',
+            or None if bash couldn't be run.
+        """
+        # Only needed here, the command line never times anything.
+        import subprocess
+        lst_files = self.helper_getfiles()
+        if self.helper_bundle_stale(lst_files):
+            if not self.helper_generate_bundle(lst_files):
+                return None
+        stmpfile = os.path.join(sys.path[0], "aliasmgr_timing.tmp")
+        try:
+            with open(stmpfile, 'w') as fwrite:
+                fwrite.writelines(self.helper_script_lines(lst_files))
+            lst_times = []
+            for sscript in (stmpfile, self.helperbundle):
+                fbest = None
+                for _ in range(runs):
+                    fstart = time.time()
+                    with open(os.devnull, 'w') as fnull:
+                        subprocess.call(
+                            ["bash", "--norc", "--noprofile", "-c",
+                             'source "$1"', "bash", sscript],
+                            stdout=fnull,
+                            stderr=fnull)
+                    fduration = time.time() - fstart
+                    if (fbest is None) or (fduration < fbest):
+                        fbest = fduration
+                lst_times.append(fbest)
+        except (IOError, OSError) as ex:
+            printx("helper_time_startup: Error:")
+            printx(str(ex))
+            return None
+        finally:
+            if os.path.isfile(stmpfile):
+                os.remove(stmpfile)
+        return tuple(lst_times)
+
+    def autoload_enabled(self):
+        """ Returns True if functions are loaded on first call, through
+            generated stubs.
+        """
+        return (self.settings.get("autoload") == "true")
+
+    def helper_autoload_dir(self, sfile):
+        """ Returns the directory for an integrated file's stubs/bodies. """
+        skey = hashlib.sha1(os.path.abspath(sfile)).hexdigest()[:8]
+        return os.path.join(
+            self.helperautoload,
+            os.path.basename(sfile) + "-" + skey)
+
+    def helper_autoload_stubfile(self, sfile):
+        """ Returns the stub file that is sourced instead of sfile. """
+        return os.path.join(self.helper_autoload_dir(sfile), "stubs.sh")
+
+    def helper_autoload_stale(self, sfile):
+        """ Returns True if the stubs for sfile are missing or older than
+            sfile (the same check the helper script does).
+        """
+        try:
+            return (os.path.getmtime(sfile) >
+                    os.path.getmtime(self.helper_autoload_stubfile(sfile)))
+        except (IOError, OSError):
+            return True
+
+    def helper_generate_autoload(self, sfile):
+        """ Generates autoload stubs for an integrated file.
+            The stub file is sfile with every function definition replaced
+            by a tiny stub, everything else is kept as-is. On the first call
+            a stub sources the real definition from that function's own
+            file (saved exactly as written in sfile), then calls it again.
+            If the stubs can't be generated, or don't pass 'bash -n', the
+            stub file just sources sfile (see: helper_autoload_fallback()).
+            Returns True on success.
+        """
+        sdir = self.helper_autoload_dir(sfile)
+        sstubs = self.helper_autoload_stubfile(sfile)
+        sfuncdir = os.path.join(sdir, "functions")
+        try:
+            with open(sfile, 'r') as fread:
+                scontents = fread.read()
+            parsed = aliasmgr_core.parse_contents(scontents, filename=sfile)
+        except (IOError, OSError) as ex:
+            printx("helper_generate_autoload: Unable to read: " + sfile)
+            printx(str(ex))
+            return self.helper_autoload_fallback(sfile)
+
+        # Redefined functions are left alone, a stub would load the last one.
+        lst_names = [cmd.name for cmd in parsed.functions]
+        lst_functions = [
+            cmd for cmd in parsed.functions
+            if cmd.name and ('/' not in cmd.name) and
+            (lst_names.count(cmd.name) == 1)]
+        lst_parts = []
+        lst_bodies = []
+        ilast = 0
+        for cmd in lst_functions:
+            istart, iend = cmd.offsets
+            sbodyfile = os.path.join(sfuncdir, cmd.name + ".sh")
+            stub = aliasmgr_core.Command(
+                name=cmd.name,
+                cmd=["source " + shell_quote(sbodyfile) + " || return 1",
+                     cmd.name + ' "$@"'])
+            lst_parts.append(scontents[ilast:istart])
+            lst_parts.append(stub.to_function())
+            lst_bodies.append((sbodyfile, scontents[istart:iend] + '\n'))
+            ilast = iend
+        lst_parts.append(scontents[ilast:])
+        sstubcontents = "".join(lst_parts)
+
+        # The parser can misjudge where a function ends, bash can't.
+        if not (self.helper_check_syntax(sstubcontents) and
+                self.helper_check_syntax(
+                    "".join(sbody for _, sbody in lst_bodies))):
+            printx("helper_generate_autoload: Stubs failed syntax check, " +
+                   "using the original file: " + sfile)
+            return self.helper_autoload_fallback(sfile)
+
+        stmpfile = sstubs + ".tmp"
+        try:
+            if not os.path.isdir(sfuncdir):
+                os.makedirs(sfuncdir)
+            lst_keep = []
+            for sbodyfile, sbody in lst_bodies:
+                with open(sbodyfile, 'w') as fwrite:
+                    fwrite.write(sbody)
+                lst_keep.append(os.path.basename(sbodyfile))
+            # Remove functions that don't exist anymore.
+            for sname in os.listdir(sfuncdir):
+                if sname not in lst_keep:
+                    os.remove(os.path.join(sfuncdir, sname))
+            # Bodies are written first, stubs never point to missing files.
+            with open(stmpfile, 'w') as fwrite:
+                fwrite.write(sstubcontents)
+            os.rename(stmpfile, sstubs)
+        except (IOError, OSError) as ex:
+            printx("helper_generate_autoload: Error:")
+            printx(str(ex))
+            return self.helper_autoload_fallback(sfile)
+        return True
+
+    def helper_autoload_fallback(self, sfile):
+        """ Writes a stub file that only sources sfile, so sfile isn't
+            checked again until it changes. If that fails, the stub file
+            is removed and the helper script sources sfile itself.
+            Always returns False (stubs were not generated).
+        """
+        sstubs = self.helper_autoload_stubfile(sfile)
+        try:
+            if not os.path.isdir(os.path.dirname(sstubs)):
+                os.makedirs(os.path.dirname(sstubs))
+            with open(sstubs, 'w') as fwrite:
+                fwrite.write("# No stubs could be generated for this file.\n")
+                fwrite.write("source " + shell_quote(sfile) + "\n")
+        except (IOError, OSError) as ex:
+            printx("helper_autoload_fallback: Error:")
+            printx(str(ex))
+            if os.path.isfile(sstubs):
+                os.remove(sstubs)
+        return False
+
+    def helper_refresh_autoload(self, lst_files=None):
+        """ Regenerates stubs for integrated files that changed.
+            Returns True if any were regenerated.
+        """
+        if lst_files is None:
+            lst_files = self.helper_getfiles()
+        bchanged = False
+        for sfile in lst_files:
+            if os.path.isfile(sfile) and self.helper_autoload_stale(sfile):
+                self.helper_generate_autoload(sfile)
+                bchanged = True
+        return bchanged
+
+    def helper_check_syntax(self, scontents):
+        """ Returns True if 'bash -n' accepts the script contents. """
+        # Only needed here, the command line never checks syntax.
+        import subprocess
+        try:
+            with open(os.devnull, 'w') as fnull:
+                proc = subprocess.Popen(
+                    ["bash", "-n"],
+                    stdin=subprocess.PIPE,
+                    stdout=fnull,
+                    stderr=fnull)
+                proc.communicate(scontents)
+        except (IOError, OSError) as ex:
+            printx("helper_check_syntax: Unable to run bash:")
+            printx(str(ex))
+            return False
+        return (proc.returncode == 0)
+
+    def trace_enabled(self):
+        """ Returns True if the helper script records load times. """
+        return (self.settings.get("trace") == "true")
+
+    def helper_trace_header(self):
+        """ Returns the script lines that start a session trace.
+            Nothing is traced without $EPOCHREALTIME (bash < 5), or when
+            the trace directory doesn't exist.
+        """
+        stracedir = aliasmgr_trace.get_tracedir()
+        if not os.path.isdir(stracedir):
+            try:
+                os.makedirs(stracedir)
+            except (IOError, OSError) as ex:
+                printx("helper_trace_header: Unable to create: " + stracedir)
+                printx(str(ex))
+        squoted = shell_quote(stracedir)
+        return ['_am_trace=""\n',
+                'if [ -n "$EPOCHREALTIME" ] && [ -d ' + squoted +
+                ' ]; then\n',
+                '    _am_trace=' + squoted +
+                '"/${EPOCHREALTIME%[.,]*}-$$' + aliasmgr_trace.TRACE_EXT +
+                '"\n',
+                'fi\n',
+                '_am_start=$EPOCHREALTIME\n']
+
+    def helper_trace_line(self, sfile, sstartvar="_am_t0"):
+        """ Returns the script line that records a load time for sfile,
+            from $sstartvar until now. printf is a builtin, nothing forks.
+        """
+        return ('[ -z "$_am_trace" ] || printf \'%s %s %s\\n\' "$' +
+                sstartvar + '" "$EPOCHREALTIME" ' + shell_quote(sfile) +
+                ' >> "$_am_trace"\n')
+
+    def helper_trace_footer(self):
+        """ Returns the script lines that finish a session trace.
+            When there are more than TRACE_LIMIT trace files, the oldest
+            are removed (glob order is oldest first), leaving TRACE_KEEP.
+            Counting them is a builtin glob, rm only runs when pruning.
+        """
+        stracedir = aliasmgr_trace.get_tracedir()
+        return [self.helper_trace_line(aliasmgr_trace.TOTAL_NAME,
+                                       sstartvar="_am_start"),
+                'if [ -n "$_am_trace" ]; then\n',
+                '    _am_traces=(' + shell_quote(stracedir) + '/*' +
+                aliasmgr_trace.TRACE_EXT + ')\n',
+                '    if [ ${#_am_traces[@]} -gt ' +
+                str(aliasmgr_trace.TRACE_LIMIT) + ' ]; then\n',
+                '        command rm -f -- "${_am_traces[@]:0:' +
+                '${#_am_traces[@]}-' + str(aliasmgr_trace.TRACE_KEEP) +
+                '}"\n',
+                '    fi\n',
+                'fi\n',
+                "unset _am_trace _am_traces _am_start _am_t0\n"]
+
+    def quiet_enabled(self):
+        """ Returns True if the helper script never echoes anything. """
+        return (self.settings.get("quiet") == "true")
+
+    def helper_noninteractive_stale(self, lst_files):
+        """ Returns True if the non-interactive definitions are missing,
+            or older than any integrated file.
+        """
+        try:
+            fmtime = os.path.getmtime(self.helpernoninteractive)
+        except (IOError, OSError):
+            return True
+        for sfile in lst_files:
+            try:
+                if os.path.getmtime(sfile) > fmtime:
+                    return True
+            except (IOError, OSError):
+                continue
+        return False
+
+    def helper_generate_noninteractive(self, lst_files):
+        """ Writes every alias/function marked with @noninteractive (in its
+            comment) to one file, exactly as written in the integrated
+            files, with their exports. Returns True on success.
+        """
+        lst_lines = [self.headernoninteractive]
+        for sfile in lst_files:
+            try:
+                with open(sfile, 'r') as fread:
+                    scontents = fread.read()
+            except (IOError, OSError):
+                # Missing files are reported by the helper script.
+                continue
+            parsed = aliasmgr_core.parse_contents(scontents, filename=sfile)
+            lst_marked = [
+                cmd for cmd in parsed.commands()
+                if self.noninteractivemarker in cmd.comment]
+            if not lst_marked:
+                continue
+            lst_lines.append("\n#### Alias Manager: " + sfile + "\n")
+            for cmd in sorted(lst_marked, key=lambda c: c.offsets[0]):
+                istart, iend = cmd.offsets
+                lst_lines.append(scontents[istart:iend] + "\n")
+                if cmd.export == aliasmgr_core.Command.EXPORT_YES:
+                    lst_lines.append("export " + cmd.name + "\n")
+
+        stmpfile = self.helpernoninteractive + ".tmp"
+        try:
+            with open(stmpfile, 'w') as fwrite:
+                fwrite.writelines(lst_lines)
+            os.rename(stmpfile, self.helpernoninteractive)
+        except (IOError, OSError) as ex:
+            printx("helper_generate_noninteractive: Error:")
+            printx(str(ex))
+            return False
+        return True
+
+    def helper_refresh_noninteractive(self, lst_files=None):
+        """ Regenerates the non-interactive definitions if they are out of
+            date. Returns True if they were regenerated.
+        """
+        if self.settings.get("noninteractive") == "all":
+            return False
+        if lst_files is None:
+            lst_files = self.helper_getfiles()
+        if not self.helper_noninteractive_stale(lst_files):
+            return False
+        return self.helper_generate_noninteractive(lst_files)
@@ -0,0 +1,206 @@
+'''
+    aliasmgr_profile.py
+    Startup profiler for Alias Manager.
+    Records the time spent importing each module, and the wall time for
+    each phase of aliasmgr.main(). Enabled with --profile-startup, like:
+        ./aliasmgr.py --profile-startup -e
+        ./aliasmgr.py --profile-startup=report.json -e
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import json
+import sys
+import time
+from contextlib import contextmanager
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+# Command line flag that enables the profiler, with an optional report file.
+PROFILE_FLAG = '--profile-startup'
+# Report format version, bump it when the report layout changes.
+REPORT_VERSION = 1
+
+
+def printx(sstring):
+    print('aliasmgr_profile: {}'.format(sstring), file=sys.stderr)
+
+
+class StartupProfiler(object):
+
+    """ Records module import times and named phase times.
+        usage:
+            profiler = StartupProfiler()
+            profiler.start()
+            import something
+            with profiler.phase('do work'):
+                do_work()
+            profiler.stop()
+            profiler.print_report()
+    """
+
+    def __init__(self, reportfile=None):
+        # Where to write a JSON report, or None to print a breakdown.
+        self.reportfile = reportfile
+        self.enabled = True
+        self.started = None
+        self.stopped = None
+        # [(module name, inclusive seconds, self seconds, depth), ...]
+        self.imports = []
+        # [(phase name, seconds), ...]
+        self.phases = []
+        self._import = None
+        # Stack of child import time for imports in progress.
+        self._stack = []
+
+    def _timed_import(self, name, *args, **kwargs):
+        """ Replacement for __import__, times modules imported for the
+            first time. Modules that are already loaded are not recorded.
+        """
+        if name in sys.modules:
+            return self._import(name, *args, **kwargs)
+        depth = len(self._stack)
+        self._stack.append(0.0)
+        start = time.time()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            duration = time.time() - start
+            childtime = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += duration
+            # Failed imports (optional modules) are recorded too,
+            # they still cost time.
+            self.imports.append(
+                (name, duration, duration - childtime, depth))
+
+    def elapsed(self):
+        """ Return seconds since start(), up to stop() if it was called. """
+        if self.started is None:
+            return 0.0
+        return (self.stopped or time.time()) - self.started
+
+    @contextmanager
+    def phase(self, name):
+        """ Context manager that records the wall time for a phase. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+
+    def report(self):
+        """ Return the profile as a dict, suitable for json. """
+        return {
+            'version': REPORT_VERSION,
+            'python': sys.version.split()[0],
+            'argv': sys.argv[1:],
+            'total': self.elapsed(),
+            'imports': [
+                {
+                    'module': name,
+                    'inclusive': inclusive,
+                    'self': selftime,
+                    'depth': depth,
+                }
+                for name, inclusive, selftime, depth in self.imports
+            ],
+            'phases': [
+                {'phase': name, 'time': duration}
+                for name, duration in self.phases
+            ],
+        }
+
+    def print_report(self, limit=15):
+        """ Print a breakdown of phase times and the slowest imports
+            to stderr, so normal output isn't mixed with it.
+        """
+        total = self.elapsed()
+        out = sys.stderr
+        print('\nStartup profile: {:0.4f}s total\n'.format(total), file=out)
+        print('Phases:', file=out)
+        for name, duration in self.phases:
+            print('    {:<24} {:0.4f}s {:>5.1f}%'.format(
+                name,
+                duration,
+                (duration / total * 100) if total else 0), file=out)
+        toplevel = sum(i[1] for i in self.imports if i[3] == 0)
+        print(
+            '\nImports: {:0.4f}s for {} modules, '
+            'slowest (self time):'.format(toplevel, len(self.imports)),
+            file=out)
+        slowest = sorted(self.imports, key=lambda i: i[2], reverse=True)
+        for name, inclusive, selftime, _ in slowest[:limit]:
+            print('    {:<24} {:0.4f}s (inclusive: {:0.4f}s)'.format(
+                name,
+                selftime,
+                inclusive), file=out)
+        print('', file=out)
+
+    def finish(self):
+        """ Stop the profiler, and print or write the report.
+            Returns True on success.
+        """
+        self.stop()
+        if not self.reportfile:
+            self.print_report()
+            return True
+        try:
+            with open(self.reportfile, 'w') as f:
+                json.dump(self.report(), f, indent=4, sort_keys=True)
+        except (IOError, OSError) as ex:
+            printx('Unable to write report: {}\n{}'.format(
+                self.reportfile, ex))
+            return False
+        printx('Report written to: {}'.format(self.reportfile))
+        return True
+
+    def start(self):
+        """ Start the clock, and start timing imports. """
+        self.started = time.time()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """ Stop the clock, and stop timing imports. """
+        if self.stopped is None:
+            self.stopped = time.time()
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+
+class NullProfiler(object):
+
+    """ Stand-in used when profiling is disabled, it does nothing. """
+
+    enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def finish(self):
+        return True
+
+
+def from_args(largs):
+    """ Return a started StartupProfiler if the profile flag is in largs,
+        otherwise a NullProfiler(). The flag is removed from largs.
+    """
+    for arg in largs:
+        if arg == PROFILE_FLAG:
+            reportfile = None
+        elif arg.startswith('{}='.format(PROFILE_FLAG)):
+            reportfile = arg.partition('=')[-1] or None
+        else:
+            continue
+        largs.remove(arg)
+        profiler = StartupProfiler(reportfile=reportfile)
+        profiler.start()
+        return profiler
+    return NullProfiler()
@@ -11,6 +11,18 @@ from __future__ import print_function
 import sys
 import os.path
 __VERSION__ = '1.7.9'
+# Process-wide settings instance, see: get_settings()
+_settings = None
+
+
+def get_settings():
+    """ Return the am_settings() instance shared by all modules.
+        The config file is only read the first time this is called.
+    """
+    global _settings
+    if _settings is None:
+        _settings = am_settings()
+    return _settings
 
 
 class am_settings():
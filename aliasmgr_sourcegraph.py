@@ -0,0 +1,450 @@
+'''
+    aliasmgr_sourcegraph.py
+    Source graph for bash startup files.
+    Follows source/. commands from bashrc through the integration script
+    and every integrated alias file, recording the size of each file,
+    files that are sourced more than once, and source cycles.
+    Sources inside function bodies only run when the function is called,
+    they are listed but don't count as startup sources.
+    The source commands found in each file are cached between runs,
+    keyed by mtime and size, so rebuilding an unchanged graph only costs
+    one stat per file.
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import re
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import aliasmgr_cache
+
+# Bump this when the format of cached graph nodes changes.
+GRAPH_VERSION = 2
+# Cache file name, in the cache directory.
+GRAPH_CACHE = 'sourcegraph.cache'
+# Shell words, control operators, and comments.
+TOKEN_PAT = re.compile(
+    r'(?<![^\s;&|()])#.*|;;?|&&|\|\||[;&|()]|'
+    r'(?:"(?:\\.|[^"\\])*"|\'[^\']*\'|\\.|[^\s;&|()"\'\\])+')
+# Words that start a command, the next word is a command too.
+COMMAND_PREFIXES = ('then', 'do', 'else', '{', '!', 'time', 'while', 'until')
+
+
+def printx(sstring):
+    print('aliasmgr_sourcegraph: {}'.format(sstring))
+
+
+def resolve_source(sword, home):
+    """ Resolve the file argument of a source command.
+        Relative paths are relative to home, where new shells start.
+        Returns None if it can't be known without running bash
+        (variables other than $HOME, command substitution, globs).
+    """
+    if (sword[:1] == "'") and (sword.count("'") == 2):
+        sword = sword[1:-1]
+    else:
+        if (sword == '~') or sword.startswith('~/'):
+            sword = home + sword[1:]
+        sword = sword.replace('"', '').replace("'", '')
+        sword = sword.replace('${HOME}', home).replace('$HOME', home)
+        if ('$' in sword) or ('`' in sword) or ('\\' in sword):
+            return None
+    if (not sword) or any(c in sword for c in '*?['):
+        return None
+    return os.path.normpath(os.path.join(home, sword))
+
+
+def exclusive(branches, otherbranches):
+    """ Returns True if two sources in the same file can't both run,
+        because they are in different branches of the same if statement.
+        Branches are from scan_sources().
+    """
+    otherbranch = dict(otherbranches)
+    return any(
+        (ifid in otherbranch) and (otherbranch[ifid] != branch)
+        for ifid, branch in branches
+    )
+
+
+def scan_sources(contents, home):
+    """ Return a list of (line number, filename, source arg, branches, lazy)
+        for each source/. command in a script. filename is None when it
+        can't be resolved (see: resolve_source()).
+        branches is a tuple of (if number, branch number) for each if
+        statement the command is in, see: exclusive()
+        lazy is True when the command is inside a function body, it only
+        runs when the function is called (like autoload stubs do).
+        This is not a full shell parser, it knows just enough to find the
+        commands (and to skip things like: echo source file).
+    """
+    sources = []
+    # [[if number, branch number], ...] for the if statements we're in.
+    ifstack = []
+    ifcount = 0
+    # [True if it's a function body, ...] for the { } groups we're in.
+    bracestack = []
+    # Function definition state: 'name' after 'function', 'funcname' after
+    # 'function name', 'word' after a command word, 'parens' after
+    # 'name (', and 'header' when the next { starts a function body.
+    # A header may be followed by the body on the next line.
+    funcstate = None
+    for lineno, line in enumerate(contents.splitlines(), start=1):
+        commandpos = True
+        sourcing = False
+        if funcstate not in ('funcname', 'header'):
+            funcstate = None
+        for token in TOKEN_PAT.findall(line):
+            if token.startswith('#'):
+                break
+            if token == '(':
+                if funcstate in ('word', 'funcname'):
+                    funcstate = 'parens'
+                else:
+                    funcstate = None
+                commandpos, sourcing = True, False
+                continue
+            elif token == ')':
+                funcstate = 'header' if funcstate == 'parens' else None
+                commandpos, sourcing = True, False
+                continue
+            elif funcstate == 'name':
+                # function name [()] {
+                funcstate = 'funcname'
+                continue
+            elif funcstate == 'funcname':
+                # function name {
+                funcstate = 'header'
+            elif funcstate != 'header':
+                funcstate = None
+
+            if token in (';', ';;', '&&', '||', '&', '|'):
+                commandpos, sourcing = True, False
+            elif sourcing:
+                sources.append((
+                    lineno,
+                    resolve_source(token, home),
+                    token,
+                    tuple(tuple(ifinfo) for ifinfo in ifstack),
+                    any(bracestack)))
+                sourcing = False
+            elif not commandpos:
+                continue
+            elif token == '{':
+                bracestack.append(funcstate == 'header')
+                funcstate = None
+            elif token == '}':
+                if bracestack:
+                    bracestack.pop()
+                commandpos = False
+            elif token == 'function':
+                funcstate = 'name'
+            elif token == 'if':
+                ifcount += 1
+                ifstack.append([ifcount, 0])
+            elif token in ('elif', 'else'):
+                if ifstack:
+                    ifstack[-1][1] += 1
+            elif token == 'fi':
+                if ifstack:
+                    ifstack.pop()
+                commandpos = False
+            elif token in ('source', '.'):
+                commandpos, sourcing = False, True
+            elif not ((token in COMMAND_PREFIXES) or
+                      re.match(r'^\w+=', token)):
+                if funcstate is None:
+                    # Maybe a function name, if ( ) follows.
+                    funcstate = 'word'
+                commandpos = False
+    return sources
+
+
+class SourceGraph(object):
+
+    """ The files bash sources on startup, starting from root files.
+        usage:
+            graph = SourceGraph()
+            graph.build([bashrc, extra_root])
+            for depth, parent, lineno, filename, note in graph.tree:
+                ...
+            duplicates = graph.duplicates()
+    """
+
+    def __init__(self, home=None, cachefile=None):
+        self.home = home or os.path.expanduser('~')
+        self.cachefile = cachefile or os.path.join(
+            aliasmgr_cache.get_cachedir(),
+            GRAPH_CACHE)
+        # {filename: node}, a node is a dict with:
+        #   exists, mtime, size, sources (see: scan_sources()),
+        #   total (size, plus the total for everything it sources)
+        self.nodes = {}
+        # Load order: [(depth, parent, lineno, filename, note), ...]
+        # note is None, or 'duplicate', 'alternative' (in another branch of
+        # an if statement that sources it), 'lazy' (sourced when a function
+        # is called), 'cycle', or 'missing'.
+        self.tree = []
+        # [(parent, lineno, filename, branches, lazy), ...] for every
+        # resolved source, see: scan_sources()
+        # Everything a lazy file sources is lazy too.
+        self.edges = []
+        # [[filename, ..., filename], ...] source chains that loop back.
+        self.cycles = []
+        # [(parent, lineno, source arg), ...] that couldn't be resolved.
+        self.unresolved = []
+        # Roots that weren't sourced by an earlier root.
+        self.unreached = []
+        # Files that have only been reached through lazy sources so far.
+        self.lazyfiles = set()
+        # Number of files read this time (instead of using the cache).
+        self.rescanned = 0
+        self._cached = {}
+
+    def build(self, roots):
+        """ Build the graph by following sources from each root file.
+            Roots after the first are walked only if an earlier root
+            didn't source them (they are listed in self.unreached).
+            Returns self.
+        """
+        self.load_cache()
+        for index, root in enumerate(roots):
+            root = os.path.normpath(os.path.abspath(root))
+            if root in self.nodes:
+                continue
+            if index > 0:
+                self.unreached.append(root)
+            self.walk(root, None, 0, [])
+        if self.rescanned or (set(self._cached) != set(self.nodes)):
+            self.save_cache()
+        return self
+
+    def duplicates(self):
+        """ Return {filename: [(parent, lineno), ...]} for every file that
+            is sourced more than once. Sources in different branches of
+            the same if statement don't count, only one of them runs.
+            Lazy sources don't count either, they don't run on startup.
+        """
+        sites = {}
+        for parent, lineno, filename, branches, lazy in self.edges:
+            if lazy:
+                continue
+            sites.setdefault(filename, []).append((parent, lineno, branches))
+        duplicates = {}
+        for filename, lst_sites in sites.items():
+            for index, site in enumerate(lst_sites):
+                if any(self.repeats(site, other)
+                       for other in lst_sites[index + 1:]):
+                    duplicates[filename] = [
+                        (parent, lineno)
+                        for parent, lineno, _ in lst_sites
+                    ]
+                    break
+        return duplicates
+
+    def load_cache(self):
+        """ Load cached nodes from the last run, if they are usable. """
+        try:
+            with open(self.cachefile, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            # Missing or corrupt, files will be read again.
+            cached = {}
+        if ((cached.get('version') == GRAPH_VERSION) and
+                (cached.get('home') == self.home)):
+            self._cached = cached['nodes']
+        else:
+            self._cached = {}
+        return self._cached
+
+    def node(self, filename):
+        """ Return the node for a file, from the cache if its stat info
+            hasn't changed, otherwise by reading it.
+        """
+        try:
+            st = os.stat(filename)
+        except (IOError, OSError):
+            return {'exists': False, 'mtime': None, 'size': 0, 'sources': []}
+        cached = self._cached.get(filename)
+        if (cached and
+                cached['exists'] and
+                (cached['mtime'] is not None) and
+                (cached['mtime'] == st.st_mtime) and
+                (cached['size'] == st.st_size)):
+            return dict(cached)
+
+        self.rescanned += 1
+        try:
+            with open(filename, 'r') as f:
+                sources = scan_sources(f.read(), self.home)
+        except (IOError, OSError) as ex:
+            printx('Unable to read: {}\n{}'.format(filename, ex))
+            sources = []
+        mtime = st.st_mtime
+        if (time.time() - mtime) < aliasmgr_cache.RACY_SECONDS:
+            # It may change again without a visible mtime change.
+            mtime = None
+        return {
+            'exists': True,
+            'mtime': mtime,
+            'size': st.st_size,
+            'sources': sources,
+        }
+
+    def unlazy(self, filename):
+        """ Mark a lazy file, and the files it sources outside of function
+            bodies, as sourced on startup.
+        """
+        self.lazyfiles.discard(filename)
+        startup = set(
+            (childline, child)
+            for childline, child, _, _, childlazy in
+            self.nodes[filename]['sources']
+            if not childlazy)
+        self.edges = [
+            (edge[0], edge[1], edge[2], edge[3], False)
+            if (edge[0] == filename) and ((edge[1], edge[2]) in startup)
+            else edge
+            for edge in self.edges
+        ]
+        for _, child in startup:
+            if child in self.lazyfiles:
+                self.unlazy(child)
+
+    @staticmethod
+    def repeats(site, othersite):
+        """ Returns True if two (parent, lineno, branches) source sites
+            can both run.
+        """
+        return not (
+            (site[0] == othersite[0]) and exclusive(site[2], othersite[2]))
+
+    def save_cache(self):
+        """ Save the nodes for the next run. Failure to save them is not
+            an error, files will just be read again. Returns True on success.
+        """
+        nodes = {}
+        for filename, node in self.nodes.items():
+            node = dict(node)
+            node.pop('total', None)
+            nodes[filename] = node
+        cached = {'version': GRAPH_VERSION, 'home': self.home, 'nodes': nodes}
+        tmpfile = '{}.{}.tmp'.format(self.cachefile, os.getpid())
+        try:
+            cachedir = os.path.dirname(self.cachefile)
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            with open(tmpfile, 'wb') as f:
+                pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmpfile, self.cachefile)
+        except Exception as ex:
+            printx('Unable to write cache file: {}\n{}'.format(
+                self.cachefile, ex))
+            try:
+                os.remove(tmpfile)
+            except (IOError, OSError):
+                pass
+            return False
+        self._cached = nodes
+        return True
+
+    def total_size(self):
+        """ Return the number of bytes bash reads for all roots,
+            counting files that are sourced more than once each time.
+        """
+        return sum(
+            self.nodes[filename]['total']
+            for depth, _, _, filename, _ in self.tree
+            if depth == 0
+        )
+
+    def unique_size(self):
+        """ Return the size of all files in the graph, counted once. """
+        return sum(node['size'] for node in self.nodes.values())
+
+    def walk(self, filename, parent, lineno, stack, branches=(), lazy=False):
+        """ Add a file and everything it sources to the graph.
+            Files that were already walked are recorded in the tree,
+            but not walked again. Returns the file's total size,
+            or 0 when it is a cycle or only sourced in another branch.
+            Lazy sources (inside a function body, or in a lazy file) are
+            walked too, but never count toward their parent's total.
+        """
+        depth = len(stack)
+        if filename in stack:
+            self.cycles.append(stack[stack.index(filename):] + [filename])
+            self.tree.append((depth, parent, lineno, filename, 'cycle'))
+            return 0
+        if filename in self.nodes:
+            if lazy:
+                self.tree.append((depth, parent, lineno, filename, 'lazy'))
+                return self.nodes[filename].get('total', 0)
+            if filename in self.lazyfiles:
+                # First sourced on startup here, it counts now.
+                self.unlazy(filename)
+                self.tree.append((depth, parent, lineno, filename, None))
+                return self.nodes[filename].get('total', 0)
+            site = (parent, lineno, branches)
+            if any(self.repeats(site, (edge[0], edge[1], edge[3]))
+                   for edge in self.edges[:-1]
+                   if (edge[2] == filename) and (not edge[4])):
+                self.tree.append(
+                    (depth, parent, lineno, filename, 'duplicate'))
+                return self.nodes[filename].get('total', 0)
+            self.tree.append((depth, parent, lineno, filename, 'alternative'))
+            return 0
+
+        node = self.node(filename)
+        self.nodes[filename] = node
+        if lazy:
+            self.lazyfiles.add(filename)
+            note = 'lazy'
+        else:
+            note = None
+        self.tree.append((
+            depth,
+            parent,
+            lineno,
+            filename,
+            note if node['exists'] else 'missing'))
+        stack.append(filename)
+        total = node['size']
+        for childline, child, sword, childbranches, childlazy in \
+                node['sources']:
+            if child is None:
+                self.unresolved.append((filename, childline, sword))
+                continue
+            self.edges.append(
+                (filename, childline, child, childbranches,
+                 lazy or childlazy))
+            childtotal = self.walk(
+                child,
+                filename,
+                childline,
+                stack,
+                branches=childbranches,
+                lazy=lazy or childlazy)
+            if not childlazy:
+                total += childtotal
+        stack.pop()
+        node['total'] = total
+        return total
+
+
+def from_integrator(integrator):
+    """ Build a SourceGraph for an am_integrator(), starting at bashrc.
+        The integration script and integrated files are roots too,
+        so they are analyzed even when bashrc doesn't source them.
+    """
+    roots = []
+    if integrator.bashrc or integrator.find_bashrc():
+        roots.append(integrator.bashrc)
+    roots.append(integrator.helperscript)
+    roots.extend(integrator.helper_getfiles())
+    return SourceGraph(home=integrator.home).build(roots)
@@ -0,0 +1,141 @@
+'''
+    aliasmgr_trace.py
+    Load-time traces for integrated alias files.
+    With tracing enabled, the integration script writes one trace file per
+    shell session, with a line for each file it sources:
+        <start> <end> <filename>
+    Start/end are $EPOCHREALTIME values. A '(total)' line covers the whole
+    script. This module reads them back and ranks files by cost.
+    Trace files are named '<session start>-<pid>.trace', so sorting the
+    names puts the oldest first. Sessions remove the oldest ones when there
+    are more than TRACE_LIMIT, keeping the newest TRACE_KEEP.
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import math
+import os
+
+import aliasmgr_cache
+
+# Extension for trace files.
+TRACE_EXT = '.trace'
+# Name used for the whole integration script in trace files.
+TOTAL_NAME = '(total)'
+# Number of trace files kept when sessions prune them, and the number that
+# triggers pruning (so it doesn't happen on every shell start).
+TRACE_KEEP = 100
+TRACE_LIMIT = 150
+
+
+def printx(sstring):
+    print('aliasmgr_trace: {}'.format(sstring))
+
+
+def get_tracedir():
+    """ Return the directory where shell sessions write trace files. """
+    return os.path.join(aliasmgr_cache.get_cachedir(), 'traces')
+
+
+def percentile(values, percent):
+    """ Return the nearest-rank percentile of a list of numbers. """
+    ordered = sorted(values)
+    rank = int(math.ceil((percent / 100.0) * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def parse_timestamp(stimestamp):
+    """ Parse an $EPOCHREALTIME value, the decimal point depends on the
+        locale. Raises ValueError for bad values.
+    """
+    return float(stimestamp.replace(',', '.'))
+
+
+def trace_files(tracedir=None, limit=None):
+    """ Return a list of trace files, oldest first.
+        With a limit, only the newest 'limit' files are returned.
+    """
+    tracedir = tracedir or get_tracedir()
+    try:
+        names = os.listdir(tracedir)
+    except (IOError, OSError):
+        return []
+    names = sorted(name for name in names if name.endswith(TRACE_EXT))
+    if limit is not None:
+        names = names[-limit:]
+    return [os.path.join(tracedir, name) for name in names]
+
+
+def read_trace(filename):
+    """ Read one session's trace file.
+        Returns a dict of {filename: seconds}. Time is added up for files
+        sourced more than once. Bad lines (from an interrupted shell, or a
+        bash without $EPOCHREALTIME) are skipped.
+    """
+    durations = {}
+    try:
+        with open(filename, 'r') as f:
+            for line in f:
+                parts = line.rstrip('\n').split(' ', 2)
+                if len(parts) != 3:
+                    continue
+                try:
+                    duration = (
+                        parse_timestamp(parts[1]) - parse_timestamp(parts[0]))
+                except ValueError:
+                    continue
+                durations[parts[2]] = durations.get(parts[2], 0) + duration
+    except (IOError, OSError):
+        return {}
+    return durations
+
+
+def summarize(tracedir=None, limit=TRACE_LIMIT):
+    """ Aggregate the newest sessions (up to limit, all of them if limit
+        is None) into a per-file cost ranking.
+        Returns (session count, [info dict, ...]) with the most expensive
+        files first, by mean time. Each info dict has:
+            filename, sessions, mean, median, p95, max, share
+        Times are in seconds, share is the file's part of the mean total.
+        The '(total)' entry is included, it always has a share of 1.
+    """
+    sessions = 0
+    durations = {}
+    for tracefile in trace_files(tracedir, limit=limit):
+        session = read_trace(tracefile)
+        if not session:
+            continue
+        sessions += 1
+        for filename, duration in session.items():
+            durations.setdefault(filename, []).append(duration)
+
+    infos = []
+    for filename, values in durations.items():
+        infos.append({
+            'filename': filename,
+            'sessions': len(values),
+            'mean': sum(values) / len(values),
+            'median': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'max': max(values),
+        })
+    totalinfo = [i for i in infos if i['filename'] == TOTAL_NAME]
+    totalmean = totalinfo[0]['mean'] if totalinfo else 0
+    for info in infos:
+        info['share'] = (info['mean'] / totalmean) if totalmean else 0
+    return sessions, sorted(infos, key=lambda i: i['mean'], reverse=True)
+
+
+def clear(tracedir=None):
+    """ Remove all trace files. Returns the number removed. """
+    removed = 0
+    for tracefile in trace_files(tracedir):
+        try:
+            os.remove(tracefile)
+            removed += 1
+        except (IOError, OSError) as ex:
+            printx('Unable to remove trace file: {}\n{}'.format(
+                tracefile, ex))
+    return removed
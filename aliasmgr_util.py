@@ -5,133 +5,44 @@ Created on Sep 24, 2013
 
 @author: Christopher Welborn
 '''
-import re
 import gtk
 import os
 import sys
+import aliasmgr_core
+import aliasmgr_fileops
 import aliasmgr_integrator
-import aliasmgr_settings
-# For changing file mode when scripts are generated.
-from stat import S_IREAD, S_IWRITE, S_IEXEC
-# Shorthand for read, write, and exec.
-S_RWX = S_IREAD | S_IWRITE | S_IEXEC
-
-settings = aliasmgr_settings.am_settings()
-integrator = aliasmgr_integrator.am_integrator()
-
-
-# Command/Alias Object ------------------------------------
-class Command():
-
-    def __init__(self, name=None, cmd=None, comment=None, exported=None):
-        # set defaults.
-        self.name = name if name else ''
-        self.cmd = cmd if cmd else []
-        self.comment = comment if comment else ''
-        self.exported = exported if exported else 'New'
-        self.shebang = '#!/bin/bash'
-
-    def __repr__(self):
-        """ return string representation of this command. """
-
-        commentstr = self.comment if self.comment else '(No Comment)'
-        return '{} : {} \n'.format(self.name, commentstr)
-
-    def __str__(self):
-        return self.__repr__()
-
-    def to_scriptfile(self, filepath=None, overwrite=False):
-        """ Convert a function/alias to its own script file. """
-        if not self.name:
-            raise ValueError('Cannot convert a command with no name.')
-        elif not self.cmd:
-            raise ValueError('Cannot convert a command with no content.')
-
-        # Ensure a full path is built.
-        if filepath:
-            basedir, filename = os.path.split(filepath)
-            if not basedir:
-                basedir = os.getcwd()
-            if not filename:
-                filename = '{}.sh'.format(self.name)
-        else:
-            basedir = os.getcwd()
-            filename = '{}.sh'.format(self.name)
-
-        # Don't clobber existing scripts.
-        if not overwrite:
-            uniqueid = 2
-            while os.path.exists(filename):
-                filename = '{}{}.sh'.format(self.name, uniqueid)
-                uniqueid += 1
-
-        # Build the full path.
-        filepath = os.path.join(basedir, filename)
-        desctype = 'a function' if self.isfunction() else 'an alias'
-        descfile = settings.get('aliasfile', 'an alias file.')
-        desclines = [
-            '# Script generated with {}:'.format(settings.versionstr),
-            '# Original code was {} in {}.'.format(desctype, descfile),
-        ]
-        desc = '{}\n'.format('\n'.join(desclines))
-        content = '\n{}\n'.format(self.to_function())
-
-        if not content.endswith('\n'):
-            content = '{}\n'.format(content)
-        with open(filepath, 'w') as f:
-            f.write('{}\n\n'.format(self.shebang))
-            f.write(desc)
-            f.write(content)
-            f.write('\n# Call the function when this script runs.\n')
-            f.write('{} $@\n'.format(self.name))
-
-            f.flush()
-
-        # Chmod to allow execution by the user.
-        os.chmod(filepath, S_RWX)
-
-        return filepath
-
-    def isfunction(self):
-        """ Returns true/false depending on linecount """
-        return (len(self.cmd) > 1)
-
-    def isexported(self):
-        lowerexported = self.exported.lower()
-        return ((lowerexported == 'yes') or (lowerexported == 'new'))
-
-    def setexport(self, bexported, bnew=False):
-        """ Sets the appropriate string value for cmd.exported using booleans,
-            Note: String values were used at first for automatic pretty
-                  printing in command line output, but later used to determine
-                  if an alias was new or not, therefore 'automagically'
-                  exporting new functions.
-            **Aliases are never exported no matter what the export value is**
-        """
-        if bnew:
-            self.exported = "New"
-        else:
-            if bexported:
-                self.exported = "Yes"
-            else:
-                self.exported = "No"
+# Models and parsing live in aliasmgr_core (no gtk needed there),
+# they are available here for the GUI.
+from aliasmgr_core import (  # noqa
+    AliasFileError,
+    AliasParser,
+    Command,
+    CommandCollection,
+    MappedFile,
+    S_RWX,
+    Serializer,
+    function_body,
+    get_def_count,
+    iter_commands,
+    parse_aliases,
+    parse_contents,
+    parse_exports,
+    parse_file,
+    parse_functions,
+    parse_mapped,
+    parse_warnings,
+    parsealiasline_old,
+    readexports,
+    scan_exports,
+    stripchars,
+    stripquotes,
+    trimcount,
+)
+
+settings = aliasmgr_core.settings
+integrator = aliasmgr_integrator.get_integrator()
+parsecache = aliasmgr_core.parsecache
 
-    def to_function(self):
-        """ Return a string containing a function definition for this cmd """
-        if not (self.name and self.cmd):
-            return ''
-
-        if self.isfunction():
-            cmdlines = ['    {}'.format(l) for l in self.cmd]
-        else:
-            cmdlines = ['    {} $@'.format(self.cmd[0])]
-
-        content = ['function {} {{'.format(self.name)]
-        if self.comment:
-            content.append('    # {}\n'.format(self.comment))
-        content.extend(cmdlines)
-        content.append('}')
-        return '\n'.join(content)
 
 # Dialog/Msgbox --------------------------------------------------------
 
@@ -295,26 +206,8 @@ class Dialogs():
         self.msgwindow.destroy()
         return response
 
-# Functions ----------------------------------------
 
-
-def get_def_count(contents, defword):
-    """ Counts lines beginning with 'defword',
-        to retrieve actual 'alias' and 'function' defs in
-        the file.
-        returns: count (Integer)
-    """
-
-    if '\n' in contents:
-        lines = contents.split('\n')
-    else:
-        lines = [contents]
-
-    cnt = 0
-    for line in lines:
-        if line.startswith(defword):
-            cnt += 1
-    return cnt
+# Functions ----------------------------------------
 
 
 def getfilecontents(aliasfile=None):
@@ -322,294 +215,75 @@ def getfilecontents(aliasfile=None):
         Shows a message if alias file cannot be found.
         Returns None on failure.
     """
-    if aliasfile is None:
-        aliasfile = settings.get("aliasfile")
-
-    if not os.path.isfile(aliasfile):
-        # print("Alias file not found!: " + aliasfile)
-        dlg = Dialogs()
-        dlg.msgbox('Alias file not found!:\n{}'.format(aliasfile), dlg.error)
-        return None
-
-    # Load file
     try:
-        with open(aliasfile, 'r') as fread:
-            filecontent = fread.read()
-        return filecontent
-    except (IOError, OSError) as exio:
-        msg = 'Unable to read file:\n{}'.format(aliasfile)
-        fullmsg = '{}\n{}'.format(msg, str(exio))
+        return aliasmgr_core.getfilecontents(aliasfile=aliasfile)
+    except AliasFileError as ex:
         dlg = Dialogs()
-        dlg.msgbox(fullmsg, dlg.error)
-        return None
-
-
-def parsealiasline_old(sline):
-    """ old deprecated method of parsing alias info from a line. """
-    # Detect Alias --------------------------------
-    if (sline.startswith("alias")):
-        # Replace TABS/NEWLINE
-        sline = sline.replace('\t', '').replace('\n', '')
-
-        # Trim 'alias'
-        sbuf = sline.replace("alias ", "")
-
-        # Trim Comments
-        if "#" in sbuf:
-            sbuf = sbuf[:sbuf.index("#")]
-            # Get comment
-            scomment = sline[sline.index("#") + 1:]
-            # Trim leading space
-            scomment = scomment.strip(' ')
-        else:
-            # No Comment
-            scomment = ""
-
-        # Retrieve name and command, without quotes.
-        aliasparts = sbuf.split('=')
-        sname = aliasparts[0].strip(" ")
-        scommand = aliasparts[1].strip(" ").strip('"').strip("'")
-        # Add command to list (Name, Command, Comment, Exported)
-        # [Exported not needed for alias])
-        return Command(name=sname,
-                       cmd=[scommand],
-                       comment=scomment)
+        dlg.msgbox(str(ex), dlg.error)
     return None
 
 
-def parse_aliases(filecontents):
-    """ parse all aliases from file, return a list of Command() objects """
+def getfilemapped(aliasfile=None):
+    """ Return a MappedFile() for the alias file, for reading large files
+        without loading them into memory.
+        Shows a message if alias file cannot be found.
+        Returns None on failure.
+    """
+    try:
+        return aliasmgr_core.getfilemapped(aliasfile=aliasfile)
+    except AliasFileError as ex:
+        dlg = Dialogs()
+        dlg.msgbox(str(ex), dlg.error)
+    return None
 
-    # this one handles quotes inside of commands better...
-    name_pat = re.compile(r'alias[ ]?(?P<name>[\d\w_\-]+)=(?P<cmdinfo>.+)')
-    cmd_comment_pat = re.compile(r'(?P<command>.+)[#](?P<comment>.+)?')
-    cmd_nocomment_pat = re.compile(r'(?P<command>.+)')
 
-    lst_commands = []
-    # Get all alias lines, with (name, raw command and comment)
-    aliases = name_pat.findall(filecontents)
-    for name, rawcmd in aliases:
-        # use regex for separating comments from command.
-        if '#' in rawcmd:
-            cmdmatch = cmd_comment_pat.search(rawcmd)
-        else:
-            # use normal regex.
-            cmdmatch = cmd_nocomment_pat.search(rawcmd)
-        if cmdmatch:
-            groups = cmdmatch.groupdict()
-            command = groups['command']
-            comment = groups.get('comment', '')
-
-        # Add alias to list as a Command() object...
-        lst_commands.append(
-            Command(
-                name=stripchars(name, ' \t\n'),
-                cmd=[stripquotes(stripchars(command, ' \t\n'))],
-                comment=stripchars(comment, '# \t\n'),
-                exported='[n/a]'))
-    return lst_commands
-
-
-def parse_exports(filecontents):
-    """ parse all exports from file contents, return a list of exported names.
+def readfile(aliasfile=None, usecache=None):
+    """ Read alias/script file, return a CommandCollection() of command()
+        objects. Errors and missing definitions are shown in dialogs.
+        Returns an empty CommandCollection() on failure.
     """
-
-    exportpat = re.compile(r'export[ ]+?(?P<export>.+)', flags=re.MULTILINE)
-    exports = exportpat.findall(filecontents)
-    if exports:
-        exports = [stripchars(e, ' \t\n') for e in exports]
-    return exports
-
-
-def parse_functions(filecontents):  # noqa
-    """ parse all functions from the alias file. """
-
-    # Get all exports from the file
-    exports = parse_exports(filecontents)
-
-    # Parse all functions from the file.
-    # Flag for setting if we are inside a function
-    bfunction = False
-    # Flag for setting if we found function comments
-    bcomment = False
-    scomment = ''
-    # List of parsed Command() objects...
-    commands = []
-    # Temporary list for raw function contents
-    lst_contents = []
-
-    # Initialize Tab Depths
-    tabdepth = 0
-    spacedepth = 0
-
-    for sline in filecontents.split('\n'):
-
-        # Detect Function -------------------------------
-        if sline.replace('\t', '').replace(' ', '').startswith("function"):
-            # Grab function name
-            ssplit = sline.split(" ")
-            sname = ssplit[1].replace('\n', '').replace("()", "")
-
-            # Find initial tab/space depth
-            if tabdepth == 0:
-                if sline.startswith('\t'):
-                    sbuf = sline
-                    tabdepth, sbuf = trimcount(sbuf, '\t')
-
-            if spacedepth == 0:
-                if sline.startswith(" "):
-                    sbuf = sline
-                    spacedepth, sbuf = trimcount(sbuf, ' ')
-
-            # We are now inside a function
-            bfunction = True
-        # Inside Function ----------------------------------
-        if bfunction:
-            # Detect comment
-            if sline.replace('\t', '').replace(' ', '').startswith("#"):
-                # First comment only
-                if not bcomment:
-                    # Found comment
-                    scomment = sline.replace('\t', '').replace('\n', '')[1:]
-                    scomment = scomment.strip(' ')
-                    # Set flag
-                    bcomment = True
-
-            # Add raw contents
-            # Skip over function definition if multi-line function
-            if not sline.strip(" ").replace('\n', '').endswith("()"):
-                lst_contents.append(sline.replace('\n', ''))
-
-            # Found end of function (could be a single line though)
-            # Parse contents, decide which to keep
-            if ((sline.strip().replace('\n', '').endswith(" }")) or
-                    (sline.replace('\n', '')
-                        .replace('\t', '').replace(' ', '') == "}")):
-                # End of function
-                bfunction = False
-                # Reset comment finder
-                bcomment = False
-
-                # Keep function contents
-                lst_keep = []
-                for itm in lst_contents:
-                    # Save trimmed version of line
-                    strim = itm.replace('\t', '').replace(
-                        ' ', '').replace('\n', '')
-                    snotabs = itm.replace('\t', '').replace('\n', '')
-                    # Figure out which contents to keep. No Braces.
-                    # and (not strim.startswith("#")):
-                    if (strim != "{") and (strim != "}"):
-                        # Trim single line definition
-                        if "()" in itm:
-                            itm = itm[itm.index("()") + 2:]
-                            snotabs = itm.replace('\t', '').replace('\n', '')
-                            strim = snotabs.replace(' ', '')
-                            if strim.startswith("{"):
-                                snotabs = snotabs[snotabs.index("{") + 1:]
-                                if snotabs.endswith("}"):
-                                    snotabs = snotabs[:snotabs.index("}")]
-                                itm = snotabs
-                        # Trim leading { and following }...
-                        if snotabs.startswith("{"):
-                            snotabs = snotabs[1:]
-                            if snotabs.endswith("}"):
-                                snotabs = snotabs[:len(snotabs) - 1]
-                            itm = snotabs
-                        # Trim initial tabdepth from itm
-                        if itm.startswith('\t'):
-
-                            itm = itm[tabdepth:]
-                            # Trim one more tab depth
-                            if itm.startswith('\t'):
-                                itm = itm[1:]
-
-                        # Append Function Contents, don't add initial coment
-                        is_initcomment = (
-                            itm.startswith("#") and (scomment in itm)
-                        )
-
-                        if (scomment and not is_initcomment):
-                            lst_keep.append(itm)
-                        elif scomment == "":
-                            lst_keep.append(itm)
-
-                # Append function name/contents/comment /exported [set with
-                # fixexports()]
-                sexported = 'Yes' if (sname in exports) else 'No'
-                commands.append(Command(name=sname,
-                                        cmd=lst_keep,
-                                        comment=scomment,
-                                        exported=sexported))
-
-                # Reset comment string
-                scomment = ''
-                # Reset contents finder list
-                lst_contents = []
-    # Return finished list
+    try:
+        commands = aliasmgr_core.readfile(
+            aliasfile=aliasfile,
+            usecache=usecache)
+    except AliasFileError as ex:
+        dlg = Dialogs()
+        dlg.msgbox(str(ex), dlg.error)
+        return CommandCollection()
+    show_warnings(commands.warnings)
     return commands
 
 
-def readfile(aliasfile=None):
-    """ Read alias/script file, return a list of command() objects.
-        Returns empty list on failure.
+def readfile_parsed(
+        aliasfile=None, usecache=None, previous=None, snapshot=True):
+    """ Read alias/script file, return a finished AliasParser() with the
+        parsed aliases/functions/exports. Missing definitions are reported.
+        If previous parse results are given, only changes are re-parsed.
+        See aliasmgr_core.parse_file() for the snapshot argument.
+        Returns None on failure.
     """
+    try:
+        parsed = parse_file(
+            aliasfile=aliasfile,
+            usecache=usecache,
+            previous=previous,
+            snapshot=snapshot)
+    except AliasFileError as ex:
+        dlg = Dialogs()
+        dlg.msgbox(str(ex), dlg.error)
+        return None
+    show_warnings(parse_warnings(parsed))
+    return parsed
 
-    # Get alias file contents
-    filecontents = getfilecontents(aliasfile=aliasfile)
-    aliaslinecnt = get_def_count(filecontents, 'alias')
-    functionlinecnt = get_def_count(filecontents, 'function')
-
-    commands = []
-    if filecontents is None:
-        return []
-    # Get all aliases from the file.(also, initialize lst_commands)
-    aliases = parse_aliases(filecontents)
-    commands = commands + aliases
-    # Get all functions form the file (also fills in exported items)
-    functions = parse_functions(filecontents)
-    commands = commands + functions
-    # Validate parsing of aliases/functions
-    warnmsg = []
-    if aliaslinecnt != len(aliases):
-        msg = 'Could not parse all aliases, may be missing some.\n{}\n{}'
-        msg = msg.format('     alias lines: {}'.format(str(aliaslinecnt)),
-                         '  parsed aliases: {}'.format(str(len(aliases))))
-        warnmsg.append(msg)
-    if functionlinecnt != len(functions):
-        msg = 'Could not parse all functions, may be missing some.\n{}\n{}'
-        msg = msg.format('  function lines: {}'.format(str(functionlinecnt)),
-                         'parsed functions: {}'.format(str(len(functions))))
-        warnmsg.append(msg)
+
+def show_warnings(warnmsg):
+    """ Print and show parse warnings, see: parse_warnings() """
     if warnmsg:
         print(
             '\nreadfile: missing aliases/functions: \n{}'.format(
                 '\n'.join(warnmsg)))
         Dialogs().msgbox_warn('\n'.join(warnmsg))
 
-    return commands
-
-
-def readexports():
-    """ Reads exports only, returns a list of exports """
-    aliasfile = settings.get("aliasfile")
-    with open(aliasfile, 'r') as fread:
-        # Temp list for exports
-        lst_temp = []
-        # Get file contents
-        slines = fread.readlines()
-
-        for sline in slines:
-            snotabs = sline.replace('\t', '').replace('\n', '')
-            if snotabs.startswith("export"):
-                # Found export, retrieve name
-                lst_temp.append(snotabs.split(" ")[1])
-
-        # Finished with file, return list of exports
-        return lst_temp
-
-    return False
-
 
 def input_text(message, default=''):
     """
@@ -694,7 +368,6 @@ def pick_aliasfile(saliasfile="", bexit_on_refusal=True):
                 else:
                     return ""
             else:
-                integrator = aliasmgr_integrator.am_integrator()
                 sblankfile = os.path.join(integrator.home, "bash.alias.sh")
                 create_blank_file(sblankfile, True)
     # return good alias filename
@@ -768,60 +441,17 @@ def chmod_file(sfilename):
                 "Would you like to make this script executable?")
             if do_chmod == gtk.RESPONSE_YES:
                 # use elevation command to chmod
-                selevcmd = ''
-                if os.path.isfile('/usr/bin/kdesudo'):
-                    selevcmd = 'kdesudo'
-                elif os.path.isfile('/usr/bin/gksudo'):
-                    selevcmd = 'gksudo'
-                else:
-                    return ("No elevcmd found to use!, can't chmod!")
-
                 try:
-                    os.system(selevcmd + ' chmod a+x ' + sfilename)
-                    return (selevcmd + ' chmod +x ' + sfilename)
-                except Exception:
-                    return "Unable to use elevcmd to chmod!"
+                    aliasmgr_fileops.elevated(['chmod', 'a+x', sfilename])
+                except aliasmgr_fileops.FileOpError as ex:
+                    return 'Unable to use elevcmd to chmod!: {}'.format(ex)
+                return 'chmod +x (elevated) ' + sfilename
             else:
                 return "chmod declined."
         else:
             # doesn't need root, user is or isnt root.
-            os.system('chmod a+x ' + sfilename)
+            try:
+                aliasmgr_fileops.make_executable(sfilename)
+            except aliasmgr_fileops.FileOpError as ex:
+                return str(ex)
             return ('chmod +x ' + sfilename)
-
-
-def stripchars(original, chars):
-    """ remove chars from beginning and end of string """
-    if hasattr(chars, 'lower'):
-        chars = [c for c in chars]
-
-    if original:
-        while original and (original[0] in chars):
-            original = original[1:]
-    if original:
-        while original and (original[-1] in chars):
-            original = original[:-1]
-
-    return original
-
-
-def stripquotes(original):
-    """ Trims a single quote from the string """
-
-    if ((original.startswith("'") and original.endswith("'")) or
-            (original.startswith('"') and original.endswith('"'))):
-        return original[1:-1]
-    return original
-
-
-def trimcount(originalstring, chartotrim):
-    """ trims a char from the beginning of string,
-        and returns a count and the trimmed string.
-        example:
-            spacecnt, trimmed = trimcount('   no spaces', ' ')
-            # returns: (3, "no spaces")
-    """
-    cnt = 0
-    while originalstring.startswith(chartotrim):
-        cnt += 1
-        originalstring = originalstring[1:]
-    return cnt, originalstring
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_cache.py
+    Tests for the on-disk parse cache.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aliasmgr_cache  # noqa
+import aliasmgr_core as amcore  # noqa
+from test_aliasmgr_core import SAMPLE, parse_info  # noqa
+
+
+class CacheTestCase(unittest.TestCase):
+
+    """ Base for tests with a parse cache in a temp directory, used by
+        aliasmgr_core, and an alias file with an old mtime (so entries
+        aren't racy, see: aliasmgr_cache.RACY_SECONDS).
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+        self.write(SAMPLE)
+        self.cache = aliasmgr_cache.ParseCache(
+            cachedir=os.path.join(self.tempdir, 'cache'))
+        self.oldcache = amcore.parsecache
+        amcore.parsecache = self.cache
+
+    def tearDown(self):
+        amcore.parsecache = self.oldcache
+        shutil.rmtree(self.tempdir)
+
+    def write(self, contents, age=60):
+        """ Write the alias file, with an mtime age seconds ago. """
+        with open(self.aliasfile, 'w') as f:
+            f.write(contents)
+        st = os.stat(self.aliasfile)
+        os.utime(self.aliasfile, (st.st_atime, st.st_mtime - age))
+
+
+class ParseCacheTests(CacheTestCase):
+
+    """ Entries are found by stat info, or by content hash. """
+
+    def test_get_put(self):
+        st = os.stat(self.aliasfile)
+        self.assertIsNone(self.cache.get(self.aliasfile, st))
+        parsed = amcore.parse_contents(SAMPLE, filename=self.aliasfile)
+        self.assertTrue(self.cache.put(self.aliasfile, st, SAMPLE, parsed))
+        cached = self.cache.get(self.aliasfile, st)
+        self.assertEqual(parse_info(cached), parse_info(parsed))
+        # Contents aren't stored with the results.
+        self.assertIsNone(cached._contents)
+        self.assertEqual(len(self.cache.entries()), 1)
+        self.assertEqual(self.cache.status(self.cache.entries()[0]), 'valid')
+
+    def test_hash_fallback(self):
+        st = os.stat(self.aliasfile)
+        parsed = amcore.parse_contents(SAMPLE, filename=self.aliasfile)
+        self.cache.put(self.aliasfile, st, SAMPLE, parsed)
+        # Touched, the contents are the same.
+        self.write(SAMPLE, age=30)
+        st = os.stat(self.aliasfile)
+        self.assertIsNone(self.cache.get(self.aliasfile, st))
+        self.assertIsNotNone(
+            self.cache.get(self.aliasfile, st, contents=SAMPLE))
+        # The entry was stamped with the new stat info.
+        self.assertIsNotNone(self.cache.get(self.aliasfile, st))
+        # Changed contents never match, even with the same size.
+        changed = SAMPLE.replace('ls -a', 'ls -A')
+        self.write(changed, age=10)
+        st = os.stat(self.aliasfile)
+        self.assertIsNone(self.cache.get(self.aliasfile, st, contents=changed))
+
+    def test_racy(self):
+        """ Entries for files modified just now are always hash-checked. """
+        self.write(SAMPLE, age=0)
+        st = os.stat(self.aliasfile)
+        parsed = amcore.parse_contents(SAMPLE, filename=self.aliasfile)
+        self.cache.put(self.aliasfile, st, SAMPLE, parsed)
+        self.assertIsNone(self.cache.get(self.aliasfile, st))
+        self.assertEqual(
+            self.cache.status(self.cache.entries()[0]),
+            'unverified')
+
+    def test_other_file(self):
+        st = os.stat(self.aliasfile)
+        parsed = amcore.parse_contents(SAMPLE, filename=self.aliasfile)
+        self.cache.put(self.aliasfile, st, SAMPLE, parsed)
+        otherfile = os.path.join(self.tempdir, 'other.sh')
+        self.assertIsNone(self.cache.get(otherfile, st))
+
+    def test_clear(self):
+        st = os.stat(self.aliasfile)
+        parsed = amcore.parse_contents(SAMPLE, filename=self.aliasfile)
+        self.cache.put(self.aliasfile, st, SAMPLE, parsed)
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertEqual(self.cache.entries(), [])
+
+
+class CoreCacheTests(CacheTestCase):
+
+    """ Every way of reading an alias file fills the cache. """
+
+    def assert_cached(self):
+        """ Fail unless there is a valid entry matching a full parse. """
+        cached = self.cache.get(self.aliasfile, os.stat(self.aliasfile))
+        self.assertIsNotNone(cached)
+        with open(self.aliasfile, 'r') as f:
+            full = amcore.parse_contents(f.read())
+        self.assertEqual(
+            parse_info(cached)['commands'],
+            parse_info(full)['commands'])
+        return cached
+
+    def test_parse_file(self):
+        amcore.parse_file(self.aliasfile, usecache=True)
+        self.assert_cached()
+
+    def test_readfile(self):
+        amcore.readfile(self.aliasfile, usecache=True)
+        self.assert_cached()
+
+    def test_iter_commands(self):
+        names = [
+            cmd.name
+            for cmd in amcore.iter_commands(self.aliasfile, usecache=True)]
+        self.assert_cached()
+        # The next run streams from the cache, in the same order.
+        self.assertEqual(
+            [cmd.name
+             for cmd in amcore.iter_commands(self.aliasfile, usecache=True)],
+            names)
+
+    def test_iter_commands_stopped(self):
+        """ A search that stops early still writes a complete entry. """
+        for cmd in amcore.iter_commands(self.aliasfile, usecache=True):
+            if cmd.name == 'll':
+                break
+        self.assert_cached()
+
+    def test_iter_commands_nocache(self):
+        list(amcore.iter_commands(self.aliasfile, usecache=False))
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_cmdline.py
+    Tests for streaming command line output, and lazy loading.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aliasmgr_core as amcore  # noqa
+from aliasmgr_cmdline import CmdLine  # noqa
+from test_aliasmgr_core import SAMPLE  # noqa
+
+
+class StreamTests(unittest.TestCase):
+
+    """ Listing and searching stream commands in file order, without
+        loading the whole file first.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+        with open(self.aliasfile, 'w') as f:
+            f.write(SAMPLE)
+        # Keep test files out of the parse cache.
+        self.cachesetting = amcore.settings.get('cache', None)
+        amcore.settings.set('cache', 'false')
+        self.cmdline = CmdLine()
+        self.cmdline.aliasfile = self.aliasfile
+        self.cmdline.load_commands = self.fail_load
+
+    def tearDown(self):
+        if self.cachesetting is None:
+            amcore.settings.settings.pop('cache', None)
+        else:
+            amcore.settings.set('cache', self.cachesetting)
+        shutil.rmtree(self.tempdir)
+
+    def fail_load(self):
+        self.fail('The whole file was loaded before printing.')
+
+    def output(self, func, *args):
+        """ Return the lines printed by func(*args). """
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            func(*args)
+            return sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+
+    def test_iter_commands(self):
+        """ iter_commands() yields the same commands as a full parse,
+            in the order they end in the file.
+        """
+        parsed = amcore.parse_file(self.aliasfile, usecache=False)
+        full = sorted(parsed.commands(), key=lambda c: c.span[1])
+        streamed = list(amcore.iter_commands(self.aliasfile, usecache=False))
+        self.assertEqual(
+            [(c.name, c.cmd, c.comment, c.export) for c in streamed],
+            [(c.name, c.cmd, c.comment, c.export) for c in full])
+
+    def test_printaliases(self):
+        self.assertEqual(
+            self.output(self.cmdline.printaliases, 'ps'),
+            ['la', 'll', 'grepi', 'ff', 'mkcd', 'up'])
+        self.assertEqual(
+            self.output(self.cmdline.printaliases, 'psf'),
+            ['ff', 'mkcd', 'up'])
+
+    def test_printaliases_comments(self):
+        """ -pc pads names to the longest name printed so far. """
+        self.assertEqual(
+            self.output(self.cmdline.printaliases, 'pca'),
+            ['la : list all files',
+             'll : long list',
+             'grepi : (No Comment)'])
+
+    def test_printaliases_empty(self):
+        with open(self.aliasfile, 'w') as f:
+            f.write('# Nothing here.\n')
+        lines = self.output(self.cmdline.printaliases, 'p')
+        self.assertIn('No items found', ''.join(lines))
+
+    def stream_output(self):
+        """ Make the command line parse the alias file without the cache,
+            and return {name: output printed before it was parsed}.
+        """
+        printed = {}
+
+        def iter_commands():
+            for cmd in amcore.iter_commands(self.aliasfile, usecache=False):
+                printed[cmd.name] = sys.stdout.getvalue()
+                yield cmd
+        self.cmdline.iter_commands = iter_commands
+        return printed
+
+    def test_search(self):
+        self.assertEqual(
+            [cmd.name for cmd in self.cmdline.itersearch('^m')],
+            ['mkcd'])
+        self.assertEqual(
+            [(cmd.name, exact) for cmd, exact in self.cmdline.findname('LL')],
+            [('la', False), ('ll', True)])
+        self.assertEqual(
+            [(cmd.name, exact) for cmd, exact in self.cmdline.findname('cd')],
+            [('mkcd', False), ('up', False)])
+
+    def test_printsearch(self):
+        """ Each match is printed before the next command is parsed. """
+        printed = self.stream_output()
+        lines = self.output(self.cmdline.printsearch, 'cd')
+        self.assertIn('    Name: mkcd', printed['up'])
+        self.assertIn('    Name: up', lines)
+        self.assertIn('Found 2 matches for: cd', lines)
+
+    def test_printname(self):
+        """ Matches are printed until the name turns up, parsing stops
+            there.
+        """
+        printed = self.stream_output()
+        lines = self.output(self.cmdline.printname, 'll')
+        self.assertIn('    Name: la', printed['ll'])
+        self.assertNotIn('grepi', printed)
+        self.assertEqual(
+            [line for line in lines if line.startswith('    Name:')],
+            ['    Name: la', '    Name: ll'])
+        self.assertIn(
+            'No aliases found matching: nothing',
+            self.output(self.cmdline.printname, 'nothing'))
+
+
+class LoadTests(unittest.TestCase):
+
+    """ Alias files are only read after the args are resolved, once, and
+        only for commands that need them.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.defaultfile = os.path.join(self.tempdir, 'default.sh')
+        self.otherfile = os.path.join(self.tempdir, 'other.sh')
+        for filename in (self.defaultfile, self.otherfile):
+            with open(filename, 'w') as f:
+                f.write(SAMPLE)
+        self.cachesetting = amcore.settings.get('cache', None)
+        amcore.settings.set('cache', 'false')
+        # Every read goes through one of these.
+        self.reads = []
+        self.realreaders = {}
+        for name in ('getfilecontents', 'getfilemapped'):
+            self.realreaders[name] = getattr(amcore, name)
+            setattr(amcore, name, self.counted(self.realreaders[name]))
+        self.cmdline = CmdLine()
+        self.cmdline.aliasfile = self.defaultfile
+
+    def tearDown(self):
+        for name, func in self.realreaders.items():
+            setattr(amcore, name, func)
+        if self.cachesetting is None:
+            amcore.settings.settings.pop('cache', None)
+        else:
+            amcore.settings.set('cache', self.cachesetting)
+        shutil.rmtree(self.tempdir)
+
+    def counted(self, func):
+        """ Wrap a file reader, to record the files it reads. """
+        def reader(aliasfile=None):
+            self.reads.append(aliasfile)
+            return func(aliasfile=aliasfile)
+        return reader
+
+    def run_main(self, *args):
+        """ Run CmdLine.main(args), and return the exit code. """
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            return self.cmdline.main(list(args))
+        finally:
+            sys.stdout = stdout
+
+    def test_help_version(self):
+        for args in (('-h', ), ('--version', ), (self.otherfile, '-h')):
+            self.assertEqual(self.run_main(*args), 0)
+        self.assertEqual(self.reads, [])
+
+    def test_file_arg(self):
+        """ Only the file given is read, and only once. """
+        self.assertEqual(self.run_main(self.otherfile, '-e'), 0)
+        self.assertEqual(self.reads, [self.otherfile])
+        del self.reads[:]
+        # Printing a name returns None (sys.exit() treats it as 0).
+        self.assertIsNone(self.run_main('ll', self.otherfile))
+        self.assertEqual(self.reads, [self.otherfile])
+
+    def test_default_file(self):
+        self.assertEqual(self.run_main('-psa'), 0)
+        self.assertEqual(self.reads, [self.defaultfile])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,762 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_core.py
+    Tests for parsing and saving alias files.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import aliasmgr_core as amcore  # noqa
+
+SAMPLE = '\n'.join((
+    '#!/bin/bash',
+    '# Aliases:',
+    'alias la="ls -a" # list all files',
+    'alias ll="ls -l" # long list',
+    "alias grepi='grep -i \"$@\"'",
+    '',
+    '# Functions:',
+    '',
+    'function ff()',
+    '{',
+    '\t# find file',
+    '\tfind . -name "$1"',
+    '\techo "done"',
+    '}',
+    '',
+    'function mkcd()',
+    '{',
+    '\t# make a dir and cd to it',
+    '\tmkdir -p "$1"',
+    '\tcd "$1"',
+    '}',
+    '',
+    'function up()',
+    '{',
+    '\t# go up n dirs',
+    '\tfor ((i=0; i<${1:-1}; i++)); do',
+    '\t\tcd ..',
+    '\tdone',
+    '}',
+    '',
+    '# Exports:',
+    'export ff',
+    'export up',
+    '',
+))
+
+
+def parse_info(parser):
+    """ Return everything a parser found, for comparing parsers. """
+    return {
+        'commands': [
+            (c.name, c.cmd, c.comment, c.export, c.span, c.offsets)
+            for c in parser.commands()],
+        'exports': parser.exports,
+        'exportlines': parser.exportlines,
+        'aliascount': parser.aliascount,
+        'functioncount': parser.functioncount,
+        'warnings': amcore.parse_warnings(parser),
+    }
+
+
+def command_tuples(commands):
+    """ Return (name, cmd, comment, exported) for Command() objects. """
+    return [(c.name, c.cmd, c.comment, c.exported) for c in commands]
+
+
+class HeadlessTests(unittest.TestCase):
+
+    """ The core and command line modules never need gtk. """
+
+    def test_no_gtk(self):
+        code = '\n'.join((
+            'import sys',
+            'sys.path.insert(0, sys.argv[1])',
+            'import aliasmgr_core, aliasmgr_cmdline',
+            'print(int("gtk" in sys.modules))',
+        ))
+        proc = subprocess.Popen(
+            [sys.executable, '-c', code, os.path.dirname(HERE)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        output, errors = proc.communicate()
+        self.assertEqual(proc.returncode, 0, msg=errors)
+        self.assertEqual(output.strip(), '0')
+
+    def test_errors(self):
+        """ Read errors are exceptions, not dialogs. """
+        missing = os.path.join(HERE, 'missing.sh')
+        for func in (
+                amcore.getfilecontents,
+                amcore.getfilemapped,
+                amcore.readfile,
+                lambda f: list(amcore.iter_commands(f, usecache=False))):
+            with self.assertRaises(amcore.AliasFileError):
+                func(missing)
+
+
+class CommandTests(unittest.TestCase):
+
+    """ Command() objects are slotted, with interned names, tuple command
+        lines, and export states stored as small ints.
+    """
+
+    def test_slots(self):
+        cmd = amcore.Command(name='ll', cmd=['ls -l'])
+        self.assertFalse(hasattr(cmd, '__dict__'))
+        with self.assertRaises(AttributeError):
+            cmd.other = 1
+
+    def test_interned(self):
+        name = ''.join(('my', 'alias'))
+        cmd = amcore.Command(name=name, cmd=['true'])
+        self.assertIs(cmd.name, intern('myalias'))
+        parsed = amcore.parse_contents(SAMPLE).commands()
+        self.assertIs(parsed[0].name, intern('la'))
+
+    def test_cmd_tuple(self):
+        cmd = amcore.Command(name='f', cmd=['echo 1', 'echo 2'])
+        self.assertEqual(cmd.cmd, ('echo 1', 'echo 2'))
+        self.assertTrue(cmd.isfunction())
+        self.assertEqual(amcore.Command().cmd, ())
+
+    def test_exported(self):
+        cmd = amcore.Command(name='f', cmd=['echo 1', 'echo 2'])
+        self.assertEqual(cmd.export, amcore.Command.EXPORT_NEW)
+        self.assertTrue(cmd.isexported())
+        for value, state, name in (
+                ('yes', amcore.Command.EXPORT_YES, 'Yes'),
+                ('No', amcore.Command.EXPORT_NO, 'No'),
+                ('N/A', amcore.Command.EXPORT_NA, '[n/a]'),
+                ('[n/a]', amcore.Command.EXPORT_NA, '[n/a]'),
+                (amcore.Command.EXPORT_NEW, amcore.Command.EXPORT_NEW, 'New')):
+            cmd.exported = value
+            self.assertEqual(cmd.export, state)
+            self.assertEqual(cmd.exported, name)
+        for value in ('maybe', 7):
+            with self.assertRaises(ValueError):
+                cmd.exported = value
+        cmd.setexport(False)
+        self.assertFalse(cmd.isexported())
+
+    def test_modified(self):
+        cmd = amcore.parse_contents(SAMPLE).commands()[0]
+        self.assertFalse(cmd.ismodified())
+        cmd.cmd = ['ls -A']
+        self.assertTrue(cmd.ismodified())
+        self.assertTrue(amcore.Command(name='new').ismodified())
+        fresh = amcore.Command.from_parsed(cmd)
+        self.assertEqual(fresh.cmd, ('ls -a', ))
+        self.assertEqual(fresh.span, cmd.span)
+        self.assertFalse(fresh.ismodified())
+
+
+class CollectionTests(unittest.TestCase):
+
+    """ CommandCollection() views match a search of the command list, and
+        are rebuilt when the collection changes.
+    """
+
+    def setUp(self):
+        self.commands = amcore.CommandCollection(
+            amcore.parse_contents(SAMPLE).commands())
+
+    def test_lookups(self):
+        commands = self.commands
+        self.assertEqual(len(commands), 6)
+        self.assertIn('ll', commands)
+        self.assertNotIn('LL', commands)
+        self.assertIs(commands.get('ll'), commands[1])
+        self.assertEqual(commands.find('ff'), 3)
+        self.assertEqual(commands.find('missing'), -1)
+        self.assertIsNone(commands.get('missing'))
+        self.assertIs(commands.getnocase('LL'), commands[1])
+        self.assertEqual(
+            commands.sortednames(),
+            ['ff', 'grepi', 'la', 'll', 'mkcd', 'up'])
+
+    def test_views(self):
+        commands = self.commands
+        self.assertEqual(
+            [c.name for c in commands.aliases()],
+            ['la', 'll', 'grepi'])
+        self.assertEqual(
+            [c.name for c in commands.functions()],
+            ['ff', 'mkcd', 'up'])
+        self.assertEqual(commands.exports(), frozenset(('ff', 'up')))
+
+    def test_duplicates(self):
+        """ The first command with a name wins, like a list search. """
+        dupe = amcore.Command(name='ll', cmd=['ls -lh'])
+        self.commands.append(dupe)
+        self.assertIsNot(self.commands.get('ll'), dupe)
+        self.assertEqual(self.commands.getall('ll')[-1], dupe)
+        self.assertEqual(self.commands.sortednames().count('ll'), 1)
+
+    def test_changes(self):
+        commands = self.commands
+        commands.sortednames()
+        commands.aliases()
+        commands.rename(commands.get('ll'), 'lh')
+        self.assertNotIn('ll', commands)
+        self.assertEqual(commands.get('lh').cmd, ('ls -l', ))
+        self.assertIn('lh', commands.sortednames())
+        commands.remove(commands.get('la'))
+        self.assertEqual(commands.find('lh'), 0)
+        self.assertEqual(
+            [c.name for c in commands.aliases()],
+            ['lh', 'grepi'])
+        new = amcore.Command(name='new', cmd=['echo 1', 'echo 2'])
+        new.setexport(True)
+        commands.append(new)
+        self.assertIs(commands.get('new'), new)
+        self.assertIn('new', commands.exports())
+
+    def test_invalidate(self):
+        """ Commands edited in place need invalidate(). """
+        commands = self.commands
+        self.assertEqual(commands.exports(), frozenset(('ff', 'up')))
+        commands.get('mkcd').setexport(True)
+        commands.get('ff').name = 'findfile'
+        commands.invalidate()
+        self.assertEqual(
+            commands.exports(),
+            frozenset(('findfile', 'mkcd', 'up')))
+        self.assertIn('findfile', commands)
+        self.assertNotIn('ff', commands)
+
+
+class ParserTests(unittest.TestCase):
+
+    """ The single-pass AliasParser() finds the same commands as the
+        multi-pass parse_aliases(), parse_functions(), and parse_exports().
+    """
+
+    examplefile = os.path.join(
+        os.path.dirname(HERE),
+        'bash.alias.examples.sh')
+
+    def assert_same_as_old(self, contents):
+        parser = amcore.parse_contents(contents)
+        self.assertEqual(
+            command_tuples(parser.aliases),
+            command_tuples(amcore.parse_aliases(contents)))
+        self.assertEqual(
+            command_tuples(parser.functions),
+            command_tuples(amcore.parse_functions(contents)))
+        self.assertEqual(parser.exports, amcore.parse_exports(contents))
+        self.assertEqual(
+            parser.aliascount,
+            amcore.get_def_count(contents, 'alias'))
+        self.assertEqual(
+            parser.functioncount,
+            amcore.get_def_count(contents, 'function'))
+        return parser
+
+    def test_sample(self):
+        parser = self.assert_same_as_old(SAMPLE)
+        self.assertEqual(
+            [c.name for c in parser.commands()],
+            ['la', 'll', 'grepi', 'ff', 'mkcd', 'up'])
+
+    def test_example_file(self):
+        with open(self.examplefile, 'r') as f:
+            self.assert_same_as_old(f.read())
+
+    def test_lines(self):
+        """ Parsing lines, or streaming them, gives the same results. """
+        full = amcore.parse_contents(SAMPLE)
+        parsed = amcore.AliasParser().parse(SAMPLE.split('\n'))
+        self.assertEqual(
+            command_tuples(parsed.commands()),
+            command_tuples(full.commands()))
+        parser = amcore.AliasParser()
+        streamed = list(parser.iter_parse(SAMPLE.split('\n')))
+        parser.finish()
+        self.assertEqual(
+            sorted(command_tuples(streamed)),
+            sorted(command_tuples(full.commands())))
+
+    def test_spans(self):
+        """ Spans and offsets point at each definition in the file. """
+        lines = SAMPLE.split('\n')
+        for cmd in amcore.parse_contents(SAMPLE).commands():
+            start, end = cmd.offsets
+            text = SAMPLE[start:end]
+            self.assertEqual(
+                text.rstrip('\n').split('\n'),
+                lines[cmd.span[0]:cmd.span[1]])
+            self.assertIn(cmd.name, lines[cmd.span[0]])
+
+
+class ReparseTests(unittest.TestCase):
+
+    """ AliasParser.reparse() must give the same results as a full parse. """
+
+    def assert_reparse(self, oldcontents, newcontents):
+        """ Reparse newcontents from a parse of oldcontents, and compare
+            it to a full parse.
+            Returns ({name: old Command()}, reparsed parser).
+        """
+        old = amcore.parse_contents(oldcontents)
+        oldcmds = dict((c.name, c) for c in old.commands())
+        reparsed = old.reparse(newcontents)
+        full = amcore.parse_contents(newcontents)
+        self.assertEqual(parse_info(reparsed), parse_info(full))
+        self.assertEqual(reparsed.contents, newcontents)
+        # Reparsed commands can be reparsed again.
+        for cmd in reparsed.commands():
+            self.assertFalse(cmd.ismodified())
+        return oldcmds, reparsed
+
+    def test_unchanged(self):
+        old = amcore.parse_contents(SAMPLE)
+        self.assertIs(old.reparse(SAMPLE), old)
+
+    def test_edit_alias(self):
+        oldcmds, reparsed = self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace('ls -l', 'ls -lh'))
+        # Definitions outside of the change are reused.
+        self.assertIs(reparsed.commands()[0], oldcmds['la'])
+        self.assertIs(reparsed.functions[-1], oldcmds['up'])
+
+    def test_edit_function(self):
+        oldcmds, reparsed = self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace('\tmkdir -p "$1"', '\tmkdir -pv "$1"'))
+        self.assertIsNot(reparsed.functions[1], oldcmds['mkcd'])
+        self.assertIs(reparsed.functions[0], oldcmds['ff'])
+        self.assertIs(reparsed.functions[2], oldcmds['up'])
+
+    def test_insert_lines(self):
+        self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace(
+                '# Functions:\n',
+                '# Functions:\n\nfunction new()\n{\n\t# new\n\techo 1\n'
+                '\techo 2\n}\n'))
+        self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace(
+                'alias ll=',
+                'alias l1="ls -1"\nalias ll='))
+
+    def test_remove_lines(self):
+        self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace(
+                'function mkcd()\n{\n\t# make a dir and cd to it\n'
+                '\tmkdir -p "$1"\n\tcd "$1"\n}\n\n',
+                ''))
+        self.assert_reparse(SAMPLE, SAMPLE.replace('export ff\n', ''))
+
+    def test_edit_start_and_end(self):
+        self.assert_reparse(SAMPLE, '#!/bin/sh\n' + SAMPLE.split('\n', 1)[1])
+        self.assert_reparse(SAMPLE, SAMPLE + 'export mkcd\n')
+        self.assert_reparse(SAMPLE, SAMPLE.rstrip('\n'))
+
+    def test_exports_change(self):
+        self.assert_reparse(
+            SAMPLE,
+            SAMPLE.replace('export up', 'export mkcd'))
+
+    def test_unfinished_function(self):
+        broken = SAMPLE.replace('\t\tcd ..\n\tdone\n}\n', '\t\tcd ..\n')
+        self.assert_reparse(SAMPLE, broken)
+        self.assert_reparse(broken, SAMPLE)
+
+    def test_many_edits(self):
+        """ Every single-line edit reparses the same as a full parse. """
+        lines = SAMPLE.split('\n')
+        for index in range(len(lines)):
+            for newline in ('', 'alias zz="echo zz"', 'function zz()'):
+                edited = lines[:]
+                edited[index] = newline
+                self.assert_reparse(SAMPLE, '\n'.join(edited))
+
+
+class ParseFileTests(unittest.TestCase):
+
+    """ parse_file() with previous results only re-parses the changes. """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+        with open(self.aliasfile, 'w') as f:
+            f.write(SAMPLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_previous(self):
+        previous = amcore.parse_file(self.aliasfile, usecache=False)
+        with open(self.aliasfile, 'w') as f:
+            f.write(SAMPLE.replace('ls -a', 'ls -A'))
+        parsed = amcore.parse_file(
+            self.aliasfile,
+            usecache=False,
+            previous=previous)
+        full = amcore.parse_file(self.aliasfile, usecache=False)
+        self.assertEqual(parse_info(parsed), parse_info(full))
+        self.assertEqual(parsed.aliases[0].cmd, ('ls -A', ))
+
+
+class MappedFileTests(unittest.TestCase):
+
+    """ MappedFile() lines are the same as contents.split('\\n'), and
+        parsing through a memory map finds the same commands.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, contents):
+        with open(self.aliasfile, 'wb') as f:
+            f.write(contents)
+
+    def test_lines(self):
+        for contents in ('', 'a', 'a\n', '\n\n', 'a\n\nb', SAMPLE):
+            self.write(contents)
+            with amcore.MappedFile(self.aliasfile) as mapped:
+                self.assertEqual(list(mapped), contents.split('\n'))
+                # It can be iterated again.
+                self.assertEqual(list(mapped), contents.split('\n'))
+            self.assertIsNone(mapped.data)
+
+    def test_offsets(self):
+        self.write(SAMPLE)
+        with amcore.MappedFile(self.aliasfile) as mapped:
+            for offset, line in mapped.iter_offsets():
+                self.assertEqual(SAMPLE[offset:offset + len(line)], line)
+                self.assertIn(SAMPLE[offset + len(line):][:1], ('\n', ''))
+
+    def test_parse_mapped(self):
+        self.write(SAMPLE)
+        mapped = amcore.parse_file(
+            self.aliasfile,
+            usecache=False,
+            snapshot=False)
+        self.assertIsNone(mapped.contents)
+        full = amcore.parse_contents(SAMPLE)
+        self.assertEqual(
+            parse_info(mapped)['commands'],
+            parse_info(full)['commands'])
+        with amcore.MappedFile(self.aliasfile) as mapped:
+            self.assertEqual(
+                amcore.scan_exports(mapped),
+                set(amcore.parse_exports(SAMPLE)))
+
+    def test_missing(self):
+        with self.assertRaises(amcore.AliasFileError):
+            amcore.getfilemapped(self.aliasfile)
+
+
+def command_info(commands):
+    """ Return sorted (name, cmd, comment, export) for Command() objects,
+        what an alias file stores for them.
+    """
+    return sorted((c.name, c.cmd, c.comment, c.export) for c in commands)
+
+
+class SerializerTests(unittest.TestCase):
+
+    """ The Serializer writes aliases, then functions, then exports,
+        and reading its output gives back the same commands.
+    """
+
+    def setUp(self):
+        self.commands = amcore.CommandCollection(
+            amcore.parse_contents(SAMPLE).commands())
+
+    def test_order(self):
+        contents = amcore.Serializer(self.commands).to_string()
+        aliases = contents.index('# Aliases:')
+        functions = contents.index('# Functions:')
+        exports = contents.index('# Exports:')
+        self.assertLess(aliases, functions)
+        self.assertLess(functions, exports)
+        self.assertLess(aliases, contents.index('alias la='))
+        self.assertLess(contents.index('alias ll='), functions)
+        self.assertLess(functions, contents.index('function ff()'))
+        self.assertLess(
+            contents.index('function ff()'),
+            contents.index('function mkcd()'))
+        self.assertLess(
+            contents.index('function mkcd()'),
+            contents.index('function up()'))
+        self.assertLess(contents.index('function up()'), exports)
+        self.assertTrue(contents.endswith('export ff\nexport up\n\n'))
+
+    def test_round_trip(self):
+        contents = amcore.Serializer(self.commands).to_string()
+        parsed = amcore.parse_contents(contents)
+        self.assertEqual(
+            command_info(parsed.commands()),
+            command_info(self.commands))
+        self.assertEqual(amcore.parse_warnings(parsed), [])
+
+    def test_exports(self):
+        """ Only functions marked for export are exported. """
+        self.commands.get('up').setexport(False)
+        self.commands.append(amcore.Command(
+            name='new',
+            cmd=['echo 1', 'echo 2'],
+            exported='new'))
+        contents = amcore.Serializer(self.commands).to_string()
+        self.assertIn('export ff\n', contents)
+        self.assertNotIn('export up', contents)
+        self.assertNotIn('export new', contents)
+        self.assertNotIn('export la', contents)
+
+    def test_chunks(self):
+        """ write() and to_string() agree, however the text is chunked. """
+        serializer = amcore.Serializer(self.commands)
+        contents = serializer.to_string()
+        serializer.chunksize = 1
+        chunks = list(serializer.iter_chunks())
+        self.assertEqual(''.join(chunks), contents)
+        written = []
+
+        class FileObject(object):
+            write = written.append
+        serializer.write(FileObject())
+        self.assertEqual(written, chunks)
+
+    def test_duplicate_names(self):
+        """ Functions with the same name keep their order. """
+        for body in ('echo first', 'echo second'):
+            self.commands.append(amcore.Command(
+                name='dupe',
+                cmd=[body, 'true']))
+        contents = amcore.Serializer(self.commands).to_string()
+        self.assertLess(
+            contents.index('echo first'),
+            contents.index('echo second'))
+
+
+class SaveTestCase(unittest.TestCase):
+
+    """ Base for tests that save a parsed copy of SAMPLE. """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+        with open(self.aliasfile, 'w') as f:
+            f.write(SAMPLE)
+        self.parsed = amcore.parse_file(self.aliasfile, usecache=False)
+        self.commands = amcore.CommandCollection(self.parsed.commands())
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assert_save(self, savemode, inplace=False):
+        """ Save self.commands with the snapshot, and check that the file
+            has the same commands a full save would write.
+            Returns the saved contents.
+        """
+        serializer = amcore.Serializer(self.commands)
+        serializer.save(
+            self.aliasfile,
+            backup=False,
+            parsed=self.parsed,
+            inplace=inplace)
+        self.assertEqual(serializer.savemode, savemode)
+        with open(self.aliasfile, 'r') as f:
+            contents = f.read()
+        full = amcore.parse_contents(
+            amcore.Serializer(self.commands).to_string())
+        saved = amcore.parse_contents(contents)
+        self.assertEqual(
+            command_info(saved.commands()),
+            command_info(full.commands()))
+        self.assertEqual(amcore.parse_warnings(saved), [])
+        return contents
+
+
+class SaveTests(SaveTestCase):
+
+    """ Serializer.save() with a parsed snapshot only writes the changed
+        definitions, and must store the same commands as a full save.
+    """
+
+    def test_unchanged(self):
+        self.assertEqual(self.assert_save('unchanged'), SAMPLE)
+
+    def test_samesize(self):
+        """ Same-size edits are written atomically unless asked for. """
+        self.commands.get('ll').cmd = ['ls -L']
+        contents = self.assert_save('splice')
+        self.assertEqual(contents, SAMPLE.replace('ls -l', 'ls -L'))
+
+    def test_inplace(self):
+        self.commands.get('ll').cmd = ['ls -L']
+        contents = self.assert_save('inplace', inplace=True)
+        self.assertEqual(contents, SAMPLE.replace('ls -l', 'ls -L'))
+
+    def test_modify(self):
+        self.commands.get('ll').cmd = ['ls -lh']
+        mkcd = self.commands.get('mkcd')
+        mkcd.cmd = list(mkcd.cmd) + ['ls']
+        contents = self.assert_save('splice')
+        # Everything else is kept as written, not reformatted.
+        self.assertTrue(contents.startswith('#!/bin/bash\n# Aliases:\n'))
+        self.assertIn("alias grepi='grep -i \"$@\"'\n", contents)
+        self.assertIn('\t\tcd ..\n\tdone\n}\n', contents)
+
+    def test_remove(self):
+        self.commands.remove(self.commands.get('ff'))
+        self.commands.remove(self.commands.get('la'))
+        contents = self.assert_save('splice')
+        self.assertNotIn('export ff', contents)
+        self.assertNotIn('alias la=', contents)
+
+    def test_add(self):
+        self.commands.append(amcore.Command(
+            name='lt',
+            cmd=['ls -t'],
+            comment='by time',
+            exported='n/a'))
+        self.commands.append(amcore.Command(
+            name='new',
+            cmd=['echo 1', 'echo 2'],
+            comment='new function',
+            exported='yes'))
+        contents = self.assert_save('splice')
+        self.assertIn('export new\n', contents)
+        # Functions are defined before they are exported.
+        self.assertLess(
+            contents.index('function new()'),
+            contents.index('export new'))
+
+    def test_exports(self):
+        self.commands.get('up').setexport(False)
+        self.commands.get('mkcd').setexport(True)
+        contents = self.assert_save('splice')
+        self.assertNotIn('export up', contents)
+        self.assertIn('export mkcd', contents)
+
+    def test_replaced(self):
+        """ Saves replace the file atomically, keeping its mode. """
+        os.chmod(self.aliasfile, 0o750)
+        oldino = os.stat(self.aliasfile).st_ino
+        self.commands.get('ll').cmd = ['ls -lh']
+        self.assert_save('splice')
+        st = os.stat(self.aliasfile)
+        self.assertNotEqual(st.st_ino, oldino)
+        self.assertEqual(st.st_mode & 0o777, 0o750)
+        self.assertEqual(os.listdir(self.tempdir), ['aliases.sh'])
+
+    def test_changed_file(self):
+        """ A file changed since it was parsed gets a full save. """
+        with open(self.aliasfile, 'a') as f:
+            f.write('alias other="true"\n')
+        self.commands.get('ll').cmd = ['ls -lh']
+        self.assert_save('full')
+
+
+class SavedParserTests(SaveTestCase):
+
+    """ Serializer.saved_parser() gives a snapshot for the saved file
+        without reading it again, so it can be edited and saved again.
+    """
+
+    def save_again(self, inplace=False):
+        """ Save self.commands with keep=True, and return the serializer and
+            its saved_parser().
+        """
+        serializer = amcore.Serializer(self.commands)
+        serializer.save(
+            self.aliasfile,
+            backup=False,
+            parsed=self.parsed,
+            keep=True,
+            inplace=inplace)
+        return serializer, serializer.saved_parser(
+            self.aliasfile,
+            previous=self.parsed)
+
+    def assert_saved_parser(self, inplace=False):
+        """ Save, and check the saved parser against a full parse of the
+            file. Returns the saved parser.
+        """
+        serializer, parser = self.save_again(inplace=inplace)
+        self.assertIsNotNone(parser)
+        full = amcore.parse_file(self.aliasfile, usecache=False)
+        self.assertEqual(parse_info(parser), parse_info(full))
+        # The saved commands are the parser's commands.
+        self.assertEqual(
+            sorted(map(id, parser.commands())),
+            sorted(map(id, self.commands)))
+        for cmd in parser.commands():
+            self.assertFalse(cmd.ismodified())
+        return parser
+
+    def test_save_twice(self):
+        self.commands.get('ll').cmd = ['ls -lh']
+        self.commands.remove(self.commands.get('mkcd'))
+        self.parsed = self.assert_saved_parser()
+        # Edit the same commands, and save again without a reload.
+        self.commands.get('ll').comment = 'long list, human sizes'
+        self.commands.append(amcore.Command(
+            name='new',
+            cmd=['echo 1', 'echo 2'],
+            exported='yes'))
+        self.parsed = self.assert_saved_parser()
+        self.assert_save('unchanged')
+
+    def test_inplace(self):
+        self.commands.get('ll').cmd = ['ls -L']
+        self.assert_saved_parser(inplace=True)
+
+    def test_changed_after_save(self):
+        """ A file changed after saving needs a reload. """
+        serializer = amcore.Serializer(self.commands)
+        self.commands.get('ll').cmd = ['ls -lh']
+        serializer.save(
+            self.aliasfile,
+            backup=False,
+            parsed=self.parsed,
+            keep=True)
+        with open(self.aliasfile, 'a') as f:
+            f.write('alias other="true"\n')
+        self.assertIsNone(serializer.saved_parser(
+            self.aliasfile,
+            previous=self.parsed))
+
+    def test_changed_same_size(self):
+        """ A same-size change after saving needs a reload too. """
+        serializer = amcore.Serializer(self.commands)
+        self.commands.get('ll').cmd = ['ls -lh']
+        serializer.save(
+            self.aliasfile,
+            backup=False,
+            parsed=self.parsed,
+            keep=True)
+        with open(self.aliasfile, 'w') as f:
+            f.write(serializer.contents.replace('ls -lh', 'ls -LH'))
+        self.assertIsNone(serializer.saved_parser(
+            self.aliasfile,
+            previous=self.parsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
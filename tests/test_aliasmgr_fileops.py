@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_fileops.py
+    Tests for the in-process file operations.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import errno
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aliasmgr_fileops  # noqa
+from aliasmgr_fileops import FileOpError  # noqa
+
+
+class FileOpsTestCase(unittest.TestCase):
+
+    """ Base for tests that work on files in a temp directory with spaces
+        and quotes in its path.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.filedir = os.path.join(self.tempdir, "my dir's $HOME")
+        os.mkdir(self.filedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def mode(self, filename):
+        return stat.S_IMODE(os.stat(filename).st_mode)
+
+    def path(self, filename):
+        return os.path.join(self.filedir, filename)
+
+    @staticmethod
+    def read(filename):
+        with open(filename, 'r') as f:
+            return f.read()
+
+    @staticmethod
+    def write(filename, contents, mode=None):
+        with open(filename, 'w') as f:
+            f.write(contents)
+        if mode is not None:
+            os.chmod(filename, mode)
+
+
+class FileOpsTests(FileOpsTestCase):
+
+    """ copy/rename/chmod work like cp/mv/chmod, without a shell. """
+
+    def test_copy(self):
+        src = self.path('src file.sh')
+        self.write(src, 'alias a=b\n', mode=0o750)
+        dest = self.path('new file.sh')
+        aliasmgr_fileops.copy_file(src, dest)
+        self.assertEqual(self.read(dest), 'alias a=b\n')
+        # New files get the source mode, existing files keep theirs.
+        self.assertEqual(self.mode(dest), 0o750)
+        os.chmod(dest, 0o600)
+        self.write(src, 'alias c=d\n')
+        aliasmgr_fileops.copy_file(src, dest)
+        self.assertEqual(self.read(dest), 'alias c=d\n')
+        self.assertEqual(self.mode(dest), 0o600)
+
+    def test_copy_error(self):
+        src = self.path('missing.sh')
+        with self.assertRaises(FileOpError) as ctx:
+            aliasmgr_fileops.copy_file(src, self.path('dest.sh'))
+        self.assertIn(src, str(ctx.exception))
+        self.assertFalse(os.path.exists(self.path('dest.sh')))
+
+    def test_make_executable(self):
+        filename = self.path('script.sh')
+        self.write(filename, 'true\n', mode=0o640)
+        self.assertTrue(aliasmgr_fileops.make_executable(filename))
+        self.assertEqual(self.mode(filename), 0o751)
+        self.assertFalse(aliasmgr_fileops.make_executable(filename))
+        with self.assertRaises(FileOpError):
+            aliasmgr_fileops.make_executable(self.path('missing.sh'))
+
+    def test_rename(self):
+        src = self.path('src.sh')
+        dest = self.path('dest.sh')
+        self.write(src, 'new\n')
+        self.write(dest, 'old\n')
+        aliasmgr_fileops.rename_file(src, dest)
+        self.assertEqual(self.read(dest), 'new\n')
+        self.assertFalse(os.path.exists(src))
+        with self.assertRaises(FileOpError):
+            aliasmgr_fileops.rename_file(src, dest)
+
+    def test_rename_across_devices(self):
+        """ A rename to another file system is a copy and a remove. """
+        src = self.path('src.sh')
+        dest = self.path('dest.sh')
+        self.write(src, 'new\n', mode=0o700)
+        realrename = os.rename
+
+        def rename(src, dest):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        os.rename = rename
+        try:
+            aliasmgr_fileops.rename_file(src, dest)
+        finally:
+            os.rename = realrename
+        self.assertEqual(self.read(dest), 'new\n')
+        self.assertEqual(self.mode(dest), 0o700)
+        self.assertFalse(os.path.exists(src))
+
+    def test_patch(self):
+        filename = self.path('aliases.sh')
+        self.write(filename, 'alias ll="ls -l"\n')
+        self.assertTrue(aliasmgr_fileops.patch_file(
+            filename,
+            [(13, '-l', '-L')]))
+        self.assertEqual(self.read(filename), 'alias ll="ls -L"\n')
+        # Nothing is written when the old text doesn't match.
+        self.assertFalse(aliasmgr_fileops.patch_file(
+            filename,
+            [(6, 'll', 'LL'), (13, '-l', '-h')]))
+        self.assertEqual(self.read(filename), 'alias ll="ls -L"\n')
+
+
+class AtomicWriteTests(FileOpsTestCase):
+
+    """ atomic_write() replaces a file in one rename, keeping its mode,
+        and leaves nothing behind on failure.
+    """
+
+    def assert_no_tempfiles(self):
+        self.assertEqual(
+            [n for n in os.listdir(self.filedir) if n.endswith('.tmp')],
+            [])
+
+    def atomic_write(self, filename, contents):
+        with aliasmgr_fileops.atomic_write(filename) as f:
+            f.write(contents)
+
+    def test_new_file(self):
+        filename = self.path('aliases.sh')
+        self.atomic_write(filename, 'alias a=b\n')
+        self.assertEqual(self.read(filename), 'alias a=b\n')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(self.mode(filename), 0o666 & ~umask)
+        self.assert_no_tempfiles()
+
+    def test_replace(self):
+        filename = self.path('aliases.sh')
+        self.write(filename, 'old\n', mode=0o750)
+        oldino = os.stat(filename).st_ino
+        self.atomic_write(filename, 'new\n')
+        self.assertEqual(self.read(filename), 'new\n')
+        self.assertEqual(self.mode(filename), 0o750)
+        # Replaced, not rewritten.
+        self.assertNotEqual(os.stat(filename).st_ino, oldino)
+        self.assert_no_tempfiles()
+
+    def test_symlink(self):
+        """ The file a symlink points to is replaced, not the link. """
+        target = self.path('target.sh')
+        link = self.path('link.sh')
+        self.write(target, 'old\n', mode=0o700)
+        os.symlink(target, link)
+        self.atomic_write(link, 'new\n')
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(os.readlink(link), target)
+        self.assertEqual(self.read(target), 'new\n')
+        self.assertEqual(self.mode(target), 0o700)
+        self.assert_no_tempfiles()
+
+    def test_failure(self):
+        """ An error while writing leaves the old file. """
+        filename = self.path('aliases.sh')
+        self.write(filename, 'old\n')
+        with self.assertRaises(ValueError):
+            with aliasmgr_fileops.atomic_write(filename) as f:
+                f.write('partial')
+                raise ValueError('failed')
+        self.assertEqual(self.read(filename), 'old\n')
+        self.assert_no_tempfiles()
+
+    def test_unwritable_dir(self):
+        filename = os.path.join(self.path('missing'), 'aliases.sh')
+        with self.assertRaises(FileOpError) as ctx:
+            self.atomic_write(filename, 'new\n')
+        self.assertIn(filename, str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,628 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_integrator.py
+    Tests for the generated integration script, autoload stubs, startup
+    bundle, and non-interactive definitions. bash is needed.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aliasmgr_integrator  # noqa
+import aliasmgr_settings  # noqa
+import aliasmgr_trace  # noqa
+
+ALIASES = '\n'.join((
+    '#!/bin/bash',
+    'alias hello="echo hello" # @noninteractive greeting',
+    '',
+    'function greet()',
+    '{',
+    '\t# @noninteractive say hi',
+    '\techo "hi $1"',
+    '\techo "bye $1"',
+    '}',
+    '',
+    'function twice()',
+    '{',
+    '\t# run a command twice',
+    '\t"$@"',
+    '\t"$@"',
+    '}',
+    '',
+    'export greet',
+    '',
+))
+
+SPACED = '\n'.join((
+    '#!/bin/bash',
+    'function spaced()',
+    '{',
+    '\t# in a path with spaces and quotes',
+    '\techo "spaced"',
+    '\techo "$1"',
+    '}',
+    '',
+))
+
+
+class IntegratorTestCase(unittest.TestCase):
+
+    """ Base for tests with an integrator that writes everything to a
+        temp directory, and two integrated files. One of them has spaces
+        and quotes in its path.
+    """
+
+    # Settings for the integrator, see: aliasmgr_settings
+    settings = {}
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.aliasfile = os.path.join(self.tempdir, 'aliases.sh')
+        spaceddir = os.path.join(self.tempdir, "my dir's $HOME")
+        os.mkdir(spaceddir)
+        self.spacedfile = os.path.join(spaceddir, 'more aliases.sh')
+        self.write(self.aliasfile, ALIASES)
+        self.write(self.spacedfile, SPACED)
+        self.files = [self.aliasfile, self.spacedfile]
+
+        integrator = aliasmgr_integrator.am_integrator()
+        integrator.settings = aliasmgr_settings.am_settings()
+        integrator.settings.settings = dict(self.settings)
+        integrator.helperfiles = self.temppath('integrated.lst')
+        integrator.helperscript = self.temppath('aliasmgr_scripts.sh')
+        integrator.helperbundle = self.temppath('aliasmgr_bundle.sh')
+        integrator.helpernoninteractive = self.temppath(
+            'aliasmgr_noninteractive.sh')
+        integrator.helperautoload = self.temppath('autoload')
+        self.integrator = integrator
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def bash(self, script, interactive=True):
+        """ Run a bash script after sourcing the integration script.
+            Returns the output lines. Fails if bash fails.
+        """
+        args = ['bash', '--norc', '--noprofile']
+        if interactive:
+            args.append('-i')
+        args.extend((
+            '-c', 'source "$1" || exit 1\n' + script,
+            'bash', self.integrator.helperscript))
+        with open(os.devnull, 'w') as fnull:
+            proc = subprocess.Popen(
+                args,
+                stdin=fnull,
+                stdout=subprocess.PIPE,
+                stderr=fnull)
+            output = proc.communicate()[0]
+        self.assertEqual(proc.returncode, 0, msg='bash failed: ' + output)
+        return output.splitlines()
+
+    def edit(self, filename, contents):
+        """ Change a file outside of Alias Manager, later than anything
+            was generated for it (everything else is made 10s older).
+        """
+        for dirpath, dirnames, filenames in os.walk(self.tempdir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                st = os.stat(path)
+                os.utime(path, (st.st_atime, st.st_mtime - 10))
+        self.write(filename, contents)
+
+    def integrate(self):
+        """ Integrate the test files, and check the script syntax. """
+        self.assertTrue(self.integrator.helper_writelist(self.files))
+        self.assert_syntax(self.integrator.helperscript)
+
+    def assert_syntax(self, filename):
+        """ Fail if 'bash -n' rejects a file. """
+        with open(filename, 'r') as f:
+            contents = f.read()
+        self.assertTrue(
+            self.integrator.helper_check_syntax(contents),
+            msg='bash -n failed for: ' + filename)
+
+    def temppath(self, filename):
+        return os.path.join(self.tempdir, filename)
+
+    @staticmethod
+    def write(filename, contents):
+        with open(filename, 'w') as f:
+            f.write(contents)
+
+
+class ScriptTests(IntegratorTestCase):
+
+    """ The plain integration script sources every file. """
+
+    def test_script(self):
+        self.integrate()
+        output = self.bash('greet you; twice echo x; spaced "a b"')
+        self.assertIn('    Loaded ' + self.spacedfile, output)
+        self.assertEqual(
+            output[-6:],
+            ['hi you', 'bye you', 'x', 'x', 'spaced', 'a b'])
+
+    def test_quoted_paths(self):
+        """ Every path in the script is one shell word. """
+        self.integrate()
+        with open(self.integrator.helperscript, 'r') as f:
+            contents = f.read()
+        self.assertNotIn(' ' + self.spacedfile, contents)
+        self.assertIn(
+            aliasmgr_integrator.shell_quote(self.spacedfile),
+            contents)
+
+    def test_refresh(self):
+        """ A refresh regenerates the script, only when it changed. """
+        self.integrate()
+        self.assertFalse(self.integrator.helper_refresh())
+        self.integrator.settings.set('quiet', 'true')
+        self.assertTrue(self.integrator.helper_refresh())
+        self.assertNotIn('    Loaded ' + self.spacedfile, self.bash('true'))
+        self.assertFalse(self.integrator.helper_refresh())
+        os.remove(self.integrator.helperscript)
+        self.assertTrue(self.integrator.helper_refresh_needed())
+        self.assertTrue(self.integrator.helper_refresh())
+        self.assertFalse(self.integrator.helper_refresh_needed())
+
+    def test_missing_file(self):
+        self.files.append(self.temppath('missing.sh'))
+        self.integrate()
+        self.assertIn(
+            'Alias Manager file not found: ' + self.temppath('missing.sh'),
+            self.bash('true'))
+
+
+class GenerateTests(IntegratorTestCase):
+
+    """ The script is only written when its contents change, from one read
+        of the integrated list, without forking anything.
+    """
+
+    def setUp(self):
+        IntegratorTestCase.setUp(self)
+        self.integrate()
+        # Older than anything written by the tests.
+        st = os.stat(self.integrator.helperscript)
+        os.utime(
+            self.integrator.helperscript,
+            (st.st_atime, st.st_mtime - 10))
+        self.scriptstat = os.stat(self.integrator.helperscript)
+
+    def assert_written(self, written=True):
+        st = os.stat(self.integrator.helperscript)
+        if written:
+            self.assertNotEqual(st.st_mtime, self.scriptstat.st_mtime)
+        else:
+            self.assertEqual(st.st_mtime, self.scriptstat.st_mtime)
+            self.assertEqual(st.st_ino, self.scriptstat.st_ino)
+        self.assertTrue(os.access(self.integrator.helperscript, os.X_OK))
+
+    def test_unchanged(self):
+        self.assertTrue(self.integrator.helper_generate_script())
+        self.assertTrue(self.integrator.helper_writelist(self.files))
+        self.assert_written(False)
+
+    def test_changed(self):
+        self.assertTrue(self.integrator.helper_writelist(self.files[:1]))
+        self.assert_written()
+        with open(self.integrator.helperscript, 'r') as f:
+            self.assertNotIn(
+                aliasmgr_integrator.shell_quote(self.spacedfile),
+                f.read())
+
+    def test_not_executable(self):
+        os.chmod(self.integrator.helperscript, 0o644)
+        self.assertTrue(self.integrator.helper_generate_script())
+        self.assert_written()
+
+    def test_one_read(self):
+        reads = []
+        getfiles = self.integrator.helper_getfiles
+
+        def counted():
+            reads.append(True)
+            return getfiles()
+        self.integrator.helper_getfiles = counted
+        self.integrator.settings.set('quiet', 'true')
+        self.assertTrue(self.integrator.helper_generate_script())
+        self.assertEqual(len(reads), 1)
+        self.assert_written()
+
+    def test_no_fork(self):
+        def fork(*args, **kwargs):
+            self.fail('A process was started.')
+        realsystem = os.system
+        realpopen = subprocess.Popen
+        os.system = subprocess.Popen = fork
+        try:
+            self.integrator.settings.set('quiet', 'true')
+            self.assertTrue(self.integrator.helper_generate_script())
+        finally:
+            os.system = realsystem
+            subprocess.Popen = realpopen
+        self.assert_written()
+
+
+class BatchTests(IntegratorTestCase):
+
+    """ Batches of integration changes are validated first, and applied
+        with one list write and one script generation.
+    """
+
+    def setUp(self):
+        IntegratorTestCase.setUp(self)
+        self.otherfile = self.temppath('other.sh')
+        self.write(self.otherfile, ALIASES)
+        self.generated = []
+        generate = self.integrator.helper_generate_script
+
+        def counted(lst_files=None):
+            self.generated.append(lst_files)
+            return generate(lst_files)
+        self.integrator.helper_generate_script = counted
+
+    def test_add_remove(self):
+        self.assertTrue(self.integrator.helper_batch(add=self.files))
+        self.assertEqual(self.integrator.helper_getfiles(), self.files)
+        self.assertEqual(len(self.generated), 1)
+        self.assertTrue(self.integrator.helper_batch(
+            add=[self.otherfile],
+            remove=[self.aliasfile]))
+        self.assertEqual(
+            self.integrator.helper_getfiles(),
+            [self.spacedfile, self.otherfile])
+        self.assertEqual(len(self.generated), 2)
+
+    def test_replace(self):
+        self.assertTrue(self.integrator.helper_batch(add=self.files))
+        self.assertTrue(self.integrator.helper_batch(
+            replace=[self.otherfile, self.otherfile],
+            add=[self.aliasfile]))
+        self.assertEqual(
+            self.integrator.helper_getfiles(),
+            [self.otherfile, self.aliasfile])
+
+    def test_relative(self):
+        """ Files are stored once, with absolute paths. """
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            self.assertTrue(self.integrator.helper_batch(
+                add=['other.sh', self.otherfile]))
+            self.assertEqual(
+                self.integrator.helper_getfiles(),
+                [self.otherfile])
+            self.assertTrue(self.integrator.helper_batch(remove=['other.sh']))
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(self.integrator.helper_getfiles(), [])
+
+    def test_errors(self):
+        """ Nothing changes when any file in the batch is bad. """
+        self.assertTrue(self.integrator.helper_batch(add=self.files[:1]))
+        del self.generated[:]
+        missing = self.temppath('missing.sh')
+        self.assertEqual(
+            self.integrator.helper_batch_errors(
+                add=[self.otherfile, missing],
+                remove=[self.spacedfile]),
+            ['File not found: ' + missing,
+             'File is not integrated: ' + self.spacedfile])
+        self.assertFalse(self.integrator.helper_batch(
+            add=[self.otherfile, missing]))
+        self.assertFalse(self.integrator.helper_batch(
+            replace=[self.otherfile],
+            remove=[self.spacedfile]))
+        self.assertEqual(self.integrator.helper_getfiles(), self.files[:1])
+        self.assertEqual(self.generated, [])
+
+    def test_cmdline(self):
+        from aliasmgr_cmdline import CmdLine
+        realintegrator = aliasmgr_integrator._integrator
+        aliasmgr_integrator._integrator = self.integrator
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            cmdline = CmdLine()
+            self.assertEqual(cmdline.main(['--integrate']), 1)
+            self.assertEqual(
+                cmdline.main(['--integrate', self.aliasfile, '-p']),
+                1)
+            self.assertEqual(
+                cmdline.main(['--integrate', self.temppath('missing.sh')]),
+                1)
+            self.assertEqual(self.generated, [])
+            self.assertEqual(cmdline.main(['--integrate'] + self.files), 0)
+            self.assertEqual(
+                cmdline.main(
+                    ['--integrate', self.otherfile,
+                     '--deintegrate', self.aliasfile]),
+                0)
+        finally:
+            sys.stdout = stdout
+            aliasmgr_integrator._integrator = realintegrator
+        self.assertEqual(
+            self.integrator.helper_getfiles(),
+            [self.spacedfile, self.otherfile])
+        self.assertEqual(len(self.generated), 2)
+
+
+class BashrcScanTests(IntegratorTestCase):
+
+    """ bashrc scans are cached, and used while bashrc has the same mtime
+        and size.
+    """
+
+    def setUp(self):
+        IntegratorTestCase.setUp(self)
+        # bash.bashrc in home is found before /etc/bash.bashrc.
+        self.bashrc = self.temppath('bash.bashrc')
+        self.integrationline = 'if [ -f {0} ]; then source {0}; fi\n'.format(
+            self.integrator.helperscript)
+        self.write_bashrc('# bashrc\n' + self.integrationline)
+        self.reads = []
+
+    def tearDown(self):
+        aliasmgr_integrator.__dict__.pop('open', None)
+        IntegratorTestCase.tearDown(self)
+
+    def new_integrator(self):
+        """ Return an integrator like a new process would have, that
+            records the bashrc reads.
+        """
+        integrator = aliasmgr_integrator.am_integrator()
+        integrator.home = self.tempdir
+        integrator.helperscript = self.integrator.helperscript
+        integrator.bashrcscanfile = self.temppath('bashrc.scan')
+        reads = self.reads
+
+        def counted(filename, *args):
+            if filename == self.bashrc:
+                reads.append(filename)
+            return open(filename, *args)
+        aliasmgr_integrator.open = counted
+        return integrator
+
+    def write_bashrc(self, contents, age=60):
+        self.write(self.bashrc, contents)
+        st = os.stat(self.bashrc)
+        os.utime(self.bashrc, (st.st_atime, st.st_mtime - age))
+
+    def test_cached(self):
+        integrator = self.new_integrator()
+        self.assertTrue(integrator.is_integrated())
+        self.assertEqual(integrator.bashrc, self.bashrc)
+        self.assertTrue(integrator.is_integrated())
+        self.assertEqual(len(self.reads), 1)
+        # The next run uses the saved scan.
+        self.assertTrue(self.new_integrator().is_integrated())
+        self.assertEqual(len(self.reads), 1)
+
+    def test_changed_size(self):
+        self.assertTrue(self.new_integrator().is_integrated())
+        self.write_bashrc('# bashrc\n', age=30)
+        self.assertFalse(self.new_integrator().is_integrated())
+        self.assertEqual(len(self.reads), 2)
+
+    def test_changed_mtime(self):
+        """ Same-size edits are found by mtime. """
+        self.assertTrue(self.new_integrator().is_integrated())
+        self.write_bashrc(
+            '# bashrc\n' + self.integrationline.replace('if', '#f', 1),
+            age=30)
+        self.assertFalse(self.new_integrator().is_integrated())
+        self.assertEqual(len(self.reads), 2)
+
+    def test_racy(self):
+        """ A bashrc modified just now is scanned every time. """
+        self.write_bashrc('# bashrc\n' + self.integrationline, age=0)
+        integrator = self.new_integrator()
+        self.assertTrue(integrator.is_integrated())
+        self.assertTrue(integrator.is_integrated())
+        self.assertEqual(len(self.reads), 2)
+
+
+class TraceTests(IntegratorTestCase):
+
+    """ Traced sessions write a trace file, wherever the cache is. """
+
+    settings = {'trace': 'true', 'quiet': 'true'}
+
+    def setUp(self):
+        IntegratorTestCase.setUp(self)
+        self.cachehome = os.environ.get('XDG_CACHE_HOME', None)
+        os.environ['XDG_CACHE_HOME'] = self.temppath("cache's $HOME")
+
+    def tearDown(self):
+        if self.cachehome is None:
+            os.environ.pop('XDG_CACHE_HOME', None)
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cachehome
+        IntegratorTestCase.tearDown(self)
+
+    def test_trace(self):
+        self.integrate()
+        tracedir = aliasmgr_trace.get_tracedir()
+        self.assertIn("cache's $HOME", tracedir)
+        if int(self.bash('echo "$BASH_VERSINFO"')[-1]) < 5:
+            self.skipTest('bash 5 is needed for $EPOCHREALTIME.')
+        tracefiles = os.listdir(tracedir)
+        self.assertEqual(len(tracefiles), 1)
+        with open(os.path.join(tracedir, tracefiles[0]), 'r') as f:
+            traced = [line.split(' ', 2)[-1] for line in f.read().splitlines()]
+        self.assertEqual(
+            traced,
+            self.files + [aliasmgr_trace.TOTAL_NAME])
+
+
+class AutoloadTests(IntegratorTestCase):
+
+    """ Autoload stubs load function bodies on the first call. """
+
+    settings = {'autoload': 'true', 'quiet': 'true'}
+
+    def test_stubs(self):
+        self.integrate()
+        for sfile in self.files:
+            stubfile = self.integrator.helper_autoload_stubfile(sfile)
+            self.assert_syntax(stubfile)
+            with open(stubfile, 'r') as f:
+                stubs = f.read()
+            # Bodies are not in the stubs.
+            self.assertNotIn('echo "spaced"', stubs)
+            self.assertNotIn('echo "bye $1"', stubs)
+            funcdir = os.path.join(
+                self.integrator.helper_autoload_dir(sfile),
+                'functions')
+            for bodyfile in os.listdir(funcdir):
+                self.assert_syntax(os.path.join(funcdir, bodyfile))
+        self.assertEqual(
+            self.bash(
+                'greet you; greet again; twice echo x; spaced "a b"; '
+                'type -t hello'),
+            ['hi you', 'bye you', 'hi again', 'bye again', 'x', 'x',
+             'spaced', 'a b', 'alias'])
+
+    def test_stale_stubs(self):
+        """ A changed file is sourced directly until stubs are refreshed.
+        """
+        self.integrate()
+        self.edit(self.aliasfile, ALIASES.replace('hi $1', 'hello $1'))
+        self.assertEqual(self.bash('greet you'), ['hello you', 'bye you'])
+        self.assertTrue(self.integrator.helper_refresh_needed())
+        self.assertTrue(self.integrator.helper_refresh())
+        self.assertFalse(self.integrator.helper_refresh_needed())
+        self.assertEqual(self.bash('greet you'), ['hello you', 'bye you'])
+
+    def test_fallback(self):
+        """ A file that fails the stub syntax check is sourced as-is. """
+        self.write(self.spacedfile, SPACED + 'if true; then\n')
+        self.integrate()
+        stubfile = self.integrator.helper_autoload_stubfile(self.spacedfile)
+        self.assert_syntax(stubfile)
+        with open(stubfile, 'r') as f:
+            self.assertIn(
+                'source ' + aliasmgr_integrator.shell_quote(self.spacedfile),
+                f.read())
+
+
+class BundleTests(IntegratorTestCase):
+
+    """ The bundle holds every integrated file, and is regenerated when
+        one of them changes outside of Alias Manager.
+    """
+
+    settings = {'bundle': 'true'}
+
+    def test_bundle(self):
+        self.integrate()
+        self.assert_syntax(self.integrator.helperbundle)
+        self.assertFalse(self.integrator.helper_bundle_stale())
+        self.assertFalse(self.integrator.helper_refresh_needed())
+        output = self.bash('greet you; spaced "a b"')
+        self.assertIn('Alias Manager loaded 2 scripts (bundled)', output)
+        self.assertEqual(output[-4:], ['hi you', 'bye you', 'spaced', 'a b'])
+
+    def test_external_edit(self):
+        """ A stale bundle falls back to sourcing the files, until a
+            startup refresh regenerates it.
+        """
+        self.integrate()
+        self.edit(self.spacedfile, SPACED.replace('"spaced"', '"edited"'))
+        output = self.bash('spaced')
+        self.assertNotIn('Alias Manager loaded 2 scripts (bundled)', output)
+        self.assertEqual(output[-2], 'edited')
+
+        self.assertTrue(self.integrator.helper_refresh_needed())
+        self.assertTrue(self.integrator.helper_refresh())
+        self.assertFalse(self.integrator.helper_refresh_needed())
+        self.assertFalse(self.integrator.helper_refresh())
+        output = self.bash('spaced')
+        self.assertIn('Alias Manager loaded 2 scripts (bundled)', output)
+        self.assertEqual(output[-2], 'edited')
+
+    def test_autoload_bundle(self):
+        """ Autoload stubs are bundled instead of the files. """
+        self.integrator.settings.set('autoload', 'true')
+        self.integrate()
+        self.assert_syntax(self.integrator.helperbundle)
+        with open(self.integrator.helperbundle, 'r') as f:
+            self.assertNotIn('echo "bye $1"', f.read())
+        self.assertEqual(
+            self.bash('greet you')[-2:],
+            ['hi you', 'bye you'])
+
+
+class NoninteractiveTests(IntegratorTestCase):
+
+    """ Non-interactive shells only load definitions marked with
+        @noninteractive, and never see any output.
+    """
+
+    # Defined or not: hello, greet, twice, spaced
+    # (type doesn't show aliases when they aren't expanded).
+    check = '\n'.join((
+        'alias hello > /dev/null 2>&1 && echo alias || echo -',
+        'for n in greet twice spaced; do type -t $n || echo -; done'))
+
+    def test_marked_only(self):
+        self.integrate()
+        self.assert_syntax(self.integrator.helpernoninteractive)
+        self.assertEqual(
+            self.bash(self.check, interactive=False),
+            ['alias', 'function', '-', '-'])
+        self.assertEqual(
+            self.bash('greet you', interactive=False),
+            ['hi you', 'bye you'])
+
+    def test_all(self):
+        self.integrator.settings.set('noninteractive', 'all')
+        self.integrate()
+        self.assertFalse(os.path.exists(self.integrator.helpernoninteractive))
+        self.assertEqual(
+            self.bash(self.check, interactive=False),
+            ['alias', 'function', 'function', 'function'])
+
+    def test_external_edit(self):
+        """ Stale definitions fall back to sourcing every file, until a
+            startup refresh regenerates them.
+        """
+        self.integrate()
+        self.edit(
+            self.spacedfile,
+            SPACED.replace('in a path', '@noninteractive in a path'))
+        self.assertEqual(
+            self.bash(self.check, interactive=False),
+            ['alias', 'function', 'function', 'function'])
+
+        self.assertTrue(self.integrator.helper_refresh_needed())
+        self.assertTrue(self.integrator.helper_refresh())
+        self.assertFalse(self.integrator.helper_refresh_needed())
+        self.assertEqual(
+            self.bash(self.check, interactive=False),
+            ['alias', 'function', '-', 'function'])
+
+
+if __name__ == '__main__':
+    unittest.main()
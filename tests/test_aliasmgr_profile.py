@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_profile.py
+    Tests for the startup profiler.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aliasmgr_profile  # noqa
+
+
+class ArgsTests(unittest.TestCase):
+
+    """ The profile flag enables the profiler, and is removed. """
+
+    def test_disabled(self):
+        largs = ['aliasmgr.py', '-e']
+        profiler = aliasmgr_profile.from_args(largs)
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(largs, ['aliasmgr.py', '-e'])
+        with profiler.phase('nothing'):
+            pass
+        self.assertTrue(profiler.finish())
+
+    def test_enabled(self):
+        for flag, reportfile in (
+                ('--profile-startup', None),
+                ('--profile-startup=', None),
+                ('--profile-startup=report.json', 'report.json')):
+            largs = ['aliasmgr.py', flag, '-e']
+            profiler = aliasmgr_profile.from_args(largs)
+            profiler.stop()
+            self.assertTrue(profiler.enabled)
+            self.assertEqual(profiler.reportfile, reportfile)
+            self.assertEqual(largs, ['aliasmgr.py', '-e'])
+
+
+class ProfilerTests(unittest.TestCase):
+
+    """ Imports and phases are timed, and reported as json. """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+        self.realimport = builtins.__import__
+        # Imported during the tests, they must not be loaded yet.
+        for name in ('colorsys', 'aliasmgr_missing_module'):
+            sys.modules.pop(name, None)
+
+    def tearDown(self):
+        builtins.__import__ = self.realimport
+        shutil.rmtree(self.tempdir)
+
+    def test_imports(self):
+        profiler = aliasmgr_profile.StartupProfiler()
+        profiler.start()
+        try:
+            import colorsys  # noqa
+            import json  # noqa
+            with self.assertRaises(ImportError):
+                import aliasmgr_missing_module  # noqa
+        finally:
+            profiler.stop()
+        self.assertIs(builtins.__import__, self.realimport)
+        names = [name for name, _, _, _ in profiler.imports]
+        self.assertIn('colorsys', names)
+        # Failed imports are recorded, loaded modules aren't.
+        self.assertIn('aliasmgr_missing_module', names)
+        self.assertNotIn('json', names)
+        for name, inclusive, selftime, depth in profiler.imports:
+            self.assertGreaterEqual(inclusive, selftime)
+
+    def test_report(self):
+        reportfile = os.path.join(self.tempdir, 'report.json')
+        profiler = aliasmgr_profile.StartupProfiler(reportfile=reportfile)
+        profiler.start()
+        with profiler.phase('first'):
+            import colorsys  # noqa
+        with profiler.phase('second'):
+            pass
+        self.assertTrue(profiler.finish())
+        self.assertIs(builtins.__import__, self.realimport)
+        with open(reportfile, 'r') as f:
+            report = json.load(f)
+        self.assertEqual(report['version'], aliasmgr_profile.REPORT_VERSION)
+        self.assertEqual(
+            [p['phase'] for p in report['phases']],
+            ['first', 'second'])
+        self.assertIn('colorsys', [i['module'] for i in report['imports']])
+        self.assertGreaterEqual(
+            report['total'],
+            sum(p['time'] for p in report['phases']))
+
+
+if __name__ == '__main__':
+    unittest.main()
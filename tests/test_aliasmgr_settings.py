@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_settings.py
+    Tests for the shared settings and integrator instances.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import unittest
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+import aliasmgr_core as amcore  # noqa
+import aliasmgr_integrator  # noqa
+import aliasmgr_settings  # noqa
+
+
+class SharedTests(unittest.TestCase):
+
+    """ Every module uses one settings instance and one integrator, so
+        the config file is only read once per process.
+    """
+
+    def test_instances(self):
+        settings = aliasmgr_settings.get_settings()
+        self.assertIs(aliasmgr_settings.get_settings(), settings)
+        self.assertIs(amcore.settings, settings)
+        integrator = aliasmgr_integrator.get_integrator()
+        self.assertIs(aliasmgr_integrator.get_integrator(), integrator)
+        self.assertIs(integrator.settings, settings)
+
+    def test_one_read(self):
+        """ Loading the command line reads the config file once. """
+        code = '\n'.join((
+            'import sys',
+            'sys.path.insert(0, sys.argv[1])',
+            'import aliasmgr_settings',
+            'reads = []',
+            'read_file = aliasmgr_settings.am_settings.read_file',
+            'def counted(self, sfile=None):',
+            '    reads.append(sfile)',
+            '    return read_file(self, sfile=sfile)',
+            'aliasmgr_settings.am_settings.read_file = counted',
+            'import aliasmgr_core, aliasmgr_integrator',
+            'from aliasmgr_cmdline import CmdLine',
+            'aliasmgr_integrator.get_integrator()',
+            'CmdLine()',
+            'print(len(reads))',
+        ))
+        proc = subprocess.Popen(
+            [sys.executable, '-c', code, TOPDIR],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        output, errors = proc.communicate()
+        self.assertEqual(proc.returncode, 0, msg=errors)
+        self.assertEqual(output.strip(), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
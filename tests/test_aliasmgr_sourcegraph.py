@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+'''
+    test_aliasmgr_sourcegraph.py
+    Tests for finding source commands in bash startup files.
+    Run from the top directory:
+        python -m unittest discover -s tests
+
+Created on Oct 18, 2026
+
+@author: Christopher Welborn
+'''
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliasmgr_sourcegraph import (  # noqa
+    exclusive,
+    scan_sources,
+    SourceGraph,
+)
+
+HOME = '/home/user'
+
+
+def scanned(contents):
+    """ Return (line, source arg, lazy) for each source in contents. """
+    return [
+        (lineno, sword, lazy)
+        for lineno, _, sword, _, lazy in scan_sources(contents, HOME)
+    ]
+
+
+class ScanTests(unittest.TestCase):
+
+    """ scan_sources() finds source commands, and knows which ones run
+        on startup.
+    """
+
+    def test_commands(self):
+        self.assertEqual(
+            scanned('\n'.join((
+                'source a.sh',
+                '. b.sh; source c.sh && . d.sh',
+                'echo source e.sh',
+                '# source f.sh',
+                'X=1 source g.sh  # source h.sh',
+                '[ -f i.sh ] && source i.sh',
+            ))),
+            [(1, 'a.sh', False),
+             (2, 'b.sh', False),
+             (2, 'c.sh', False),
+             (2, 'd.sh', False),
+             (5, 'g.sh', False),
+             (6, 'i.sh', False)])
+
+    def test_resolve(self):
+        sources = scan_sources(
+            'source ~/a.sh\n. "$HOME/b c.sh"\n'
+            "source '/x/$y.sh'\nsource $OTHER/d.sh\n",
+            HOME)
+        self.assertEqual(
+            [filename for _, filename, _, _, _ in sources],
+            ['/home/user/a.sh', '/home/user/b c.sh', '/x/$y.sh', None])
+
+    def test_if_branches(self):
+        sources = scan_sources('\n'.join((
+            'if [ -f a.sh ]; then',
+            '    source a.sh',
+            'elif [ -f b.sh ]; then',
+            '    source b.sh',
+            'else',
+            '    if true; then source c.sh; fi',
+            'fi',
+            'source d.sh',
+        )), HOME)
+        branches = dict((sword, info) for _, _, sword, info, _ in sources)
+        self.assertEqual(branches['a.sh'], ((1, 0), ))
+        self.assertEqual(branches['b.sh'], ((1, 1), ))
+        self.assertEqual(branches['c.sh'], ((1, 2), (2, 0)))
+        self.assertEqual(branches['d.sh'], ())
+        self.assertTrue(exclusive(branches['a.sh'], branches['b.sh']))
+        self.assertTrue(exclusive(branches['b.sh'], branches['c.sh']))
+        self.assertFalse(exclusive(branches['a.sh'], branches['d.sh']))
+
+    def test_function_bodies(self):
+        """ Sources in function bodies are lazy, other groups aren't. """
+        self.assertEqual(
+            scanned('\n'.join((
+                'a() { source a.sh; }',
+                'function b {',
+                '    source b.sh',
+                '}',
+                'function c() {',
+                '    if true; then',
+                '        { source c.sh; }',
+                '    fi',
+                '}',
+                'd ()',
+                '{',
+                "    source 'd.sh' || return 1",
+                '    d "$@"',
+                '}',
+                'function e',
+                '{',
+                '    source e.sh',
+                '}',
+                '{ source group.sh; }',
+                'if true; then { source group2.sh; }; fi',
+                'source after.sh',
+                'echo ( source sub.sh )',
+                '( source sub2.sh )',
+            ))),
+            [(1, 'a.sh', True),
+             (3, 'b.sh', True),
+             (7, 'c.sh', True),
+             (12, "'d.sh'", True),
+             (17, 'e.sh', True),
+             (19, 'group.sh', False),
+             (20, 'group2.sh', False),
+             (21, 'after.sh', False),
+             (22, 'sub.sh', False),
+             (23, 'sub2.sh', False)])
+
+    def test_autoload_stubs(self):
+        """ Autoload stubs source their bodies lazily. """
+        self.assertEqual(
+            scanned('\n'.join((
+                'alias x="echo x"',
+                'function greet {',
+                "    source '/autoload/greet.sh' || return 1",
+                '    greet "$@"',
+                '}',
+                'export greet',
+            ))),
+            [(3, "'/autoload/greet.sh'", True)])
+
+
+class GraphTests(unittest.TestCase):
+
+    """ SourceGraph totals and duplicates only count startup sources. """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='aliasmgr_test')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def build(self, files):
+        """ Write {name: contents} files, and build a graph from 'rc'. """
+        for name, contents in files.items():
+            with open(os.path.join(self.tempdir, name), 'w') as f:
+                f.write(contents)
+        graph = SourceGraph(
+            home=self.tempdir,
+            cachefile=os.path.join(self.tempdir, 'graph.cache'))
+        return graph.build([os.path.join(self.tempdir, 'rc')])
+
+    def size(self, *names):
+        return sum(
+            os.path.getsize(os.path.join(self.tempdir, name))
+            for name in names)
+
+    def test_lazy(self):
+        graph = self.build({
+            'rc': 'source bundle.sh\nsource stubs.sh\n',
+            'bundle.sh': 'f() {\n    source body.sh || return 1\n}\n',
+            'stubs.sh': 'f() {\n    source body.sh || return 1\n}\n',
+            'body.sh': 'f() { echo f; }\nsource inner.sh\n',
+            'inner.sh': 'alias x=y\n',
+        })
+        self.assertEqual(graph.duplicates(), {})
+        self.assertEqual(
+            graph.total_size(),
+            self.size('rc', 'bundle.sh', 'stubs.sh'))
+        notes = dict(
+            (os.path.basename(filename), note)
+            for _, _, _, filename, note in graph.tree)
+        self.assertEqual(notes['body.sh'], 'lazy')
+        self.assertEqual(notes['inner.sh'], 'lazy')
+
+    def test_duplicates(self):
+        graph = self.build({
+            'rc': '\n'.join((
+                'source a.sh',
+                'if true; then source b.sh; else source b.sh; fi',
+                'f() { source a.sh; }',
+                'source a.sh',
+                '',
+            )),
+            'a.sh': 'alias a=b\n',
+            'b.sh': 'alias b=c\n',
+        })
+        rc = os.path.join(self.tempdir, 'rc')
+        self.assertEqual(
+            graph.duplicates(),
+            {os.path.join(self.tempdir, 'a.sh'): [(rc, 1), (rc, 4)]})
+        self.assertEqual(
+            graph.total_size(),
+            self.size('rc', 'a.sh', 'b.sh', 'a.sh'))
+
+    def test_lazy_then_startup(self):
+        """ A file reached lazily first still counts when it is sourced
+            on startup later.
+        """
+        graph = self.build({
+            'rc': 'f() { source a.sh; }\nsource a.sh\n',
+            'a.sh': 'source b.sh\n',
+            'b.sh': 'alias b=c\n',
+        })
+        self.assertEqual(graph.duplicates(), {})
+        self.assertEqual(graph.total_size(), self.size('rc', 'a.sh', 'b.sh'))
+
+
+if __name__ == '__main__':
+    unittest.main()